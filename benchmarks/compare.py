@@ -0,0 +1,47 @@
+"""Compare two benchmark runs saved as JSON.
+
+    python -m benchmarks.compare before.json after.json [threshold %]
+
+Cases whose p95 got slower, or whose query count grew, by more than the
+threshold (default 10%) are marked and make the exit status 1.
+"""
+import json
+import sys
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main(before_path, after_path, threshold):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}\n")
+    print(f"{'case':<32} {'p50 ms':>16} {'p95 ms':>16} {'req/s':>14} {'queries':>10}")
+
+    regressions = 0
+    for name, new in after['cases'].items():
+        old = before['cases'].get(name)
+        if old is None:
+            print(f"{name:<32} {'(new)':>16}")
+            continue
+
+        p95 = change(old['p95_ms'], new['p95_ms'])
+        queries = change(old.get('queries', 0), new.get('queries', 0))
+        slower = p95 > threshold or queries > threshold
+        regressions += slower
+        print(
+            f"{name:<32} {new['p50_ms']:>8.3f} {change(old['p50_ms'], new['p50_ms']):>+6.1f}% "
+            f"{new['p95_ms']:>8.3f} {p95:>+6.1f}% {new['rps']:>6.0f} {change(old['rps'], new['rps']):>+6.1f}% "
+            f"{old.get('queries', '-')!s:>4}->{new.get('queries', '-')!s:<4}"
+            f"{'  <- slower' if slower else ''}"
+        )
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 10.0))
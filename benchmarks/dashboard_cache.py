@@ -0,0 +1,79 @@
+"""Dashboard and folder page times with and without the fragment cache.
+
+    python -m benchmarks.dashboard_cache [iterations] [products] [folders]
+"""
+import sys
+
+import shortuuid
+
+from benchmarks.harness import django_test_environment, measure, print_table
+
+
+def main(iterations, product_count, folder_count):
+    with django_test_environment(DEBUG=False):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from django.test import Client
+
+        from products import caching
+        from products.models import Folder, Product, QRCode, Template, generate_short_code
+
+        owner = User.objects.create_user(username='bench', password='bench')
+        folders = Folder.objects.bulk_create([Folder(owner=owner, name=f'Aisle {i}') for i in range(folder_count)])
+        # Products are dealt round the folders and the uncategorized grid
+        slots = folders + [None]
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    owner=owner, folder=slots[i % len(slots)], name=f'Item {i}', text_description='desc',
+                    unique_slug=shortuuid.uuid(), short_code=generate_short_code(),
+                )
+                for i in range(product_count)
+            ],
+            batch_size=1000,
+        )
+        QRCode.objects.bulk_create(
+            [QRCode(linked_product=product, image_hash='0' * 64, public_url='https://x/') for product in products],
+            batch_size=1000,
+        )
+        Template.objects.bulk_create([Template(name=f'Template {i}', content='[blank][Field]') for i in range(30)])
+
+        client = Client()
+        client.force_login(owner)
+        folder_url = f'/api/folders/{folders[0].pk}/products/'
+
+        def uncached(url):
+            def get():
+                cache.clear()
+                client.get(url)
+            return get
+
+        def after_edit(url, folder):
+            # A product in another folder changes between loads
+            edited = Product.objects.filter(folder=folder).first()
+
+            def get():
+                edited.save()
+                client.get(url)
+            return get
+
+        rows = [
+            ('dashboard, uncached', measure(uncached('/dashboard/'), iterations)),
+            ('dashboard, cached', measure(lambda: client.get('/dashboard/'), iterations)),
+            ('dashboard, edit in a folder', measure(after_edit('/dashboard/', folders[1]), iterations)),
+            ('folder page, uncached', measure(uncached(folder_url), iterations)),
+            ('folder page, cached', measure(lambda: client.get(folder_url), iterations)),
+            ('folder page, edit elsewhere', measure(after_edit(folder_url, folders[1]), iterations)),
+        ]
+        print_table(rows)
+
+        stats = ', '.join(f"{kind} {outcome}={count}" for (kind, outcome), count in sorted(caching.fragment_stats.items()))
+        print(f"\n{product_count} products in {folder_count} folders; fragment cache: {stats}")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 40,
+    )
@@ -0,0 +1,168 @@
+"""Concurrent listen and dashboard throughput for each database profile.
+
+    python -m benchmarks.db_profiles [seconds] [workers] [concurrency] [results.json]
+
+Each profile gets a fresh database, seeded with `manage.py seed_benchmark`
+and served by gunicorn with `workers` sync workers, then `concurrency`
+clients request listen pages and dashboards for `seconds` each. Set
+BENCH_POSTGRES_URL to an empty PostgreSQL database to include the
+PostgreSQL profiles; it is flushed before every run.
+"""
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookiejar import CookieJar
+from pathlib import Path
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from benchmarks.harness import print_table, write_results
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PRODUCTS = 10000
+
+# Name, DATABASE_URL (None for a fresh SQLite file) and extra environment
+PROFILES = [
+    ('sqlite, defaults', None, {'SQLITE_TUNING': 'False'}),
+    ('sqlite, tuned', None, {}),
+    ('postgresql, persistent', 'postgres', {'DATABASE_POOL': 'False'}),
+    ('postgresql, pooled', 'postgres', {}),
+]
+
+
+def manage(env, *args):
+    subprocess.run(
+        [sys.executable, 'manage.py', *args], cwd=BASE_DIR, env=env, check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(env, workers, app='tsa_project.wsgi', options=()):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *options, '--workers', str(workers), '--bind', f'127.0.0.1:{port}', app],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("gunicorn did not start.")
+
+
+def logged_in(base_url, username, password):
+    cookies = CookieJar()
+    opener = build_opener(HTTPCookieProcessor(cookies))
+    opener.open(f'{base_url}/accounts/login/').read()
+    csrf_token = next(cookie.value for cookie in cookies if cookie.name == 'csrftoken')
+    data = urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf_token}).encode()
+    opener.open(Request(f'{base_url}/accounts/login/', data, headers={'Referer': f'{base_url}/accounts/login/'})).read()
+    return opener
+
+
+def hammer(openers, urls, seconds):
+    """Request random `urls` from every opener at once; one thread each."""
+    timings, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(opener, rng):
+        nonlocal errors
+        mine, failed = [], 0
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                opener.open(rng.choice(urls)).read()
+                mine.append(time.perf_counter() - t0)
+            except OSError:
+                failed += 1
+        with lock:
+            timings.extend(mine)
+            errors += failed
+
+    threads = [threading.Thread(target=client, args=(opener, random.Random(i))) for i, opener in enumerate(openers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(timings, errors, seconds)
+
+
+def summarize(timings, errors, seconds):
+    count = len(timings)
+    timings = sorted(timings) or [0.0]
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': count / seconds,
+        'p50_ms': timings[len(timings) // 2] * 1000,
+        'p95_ms': timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000,
+        'p99_ms': timings[max(int(len(timings) * 0.99) - 1, 0)] * 1000,
+    }
+
+
+def run_profile(database_url, extra_env, seconds, workers, concurrency):
+    env = {**os.environ, 'DATABASE_URL': database_url, **extra_env}
+    manage(env, 'migrate', '--no-input')
+    manage(env, 'flush', '--no-input')
+    manage(env, 'seed_benchmark', '--users=1', f'--products={PRODUCTS}', '--prefix=load')
+    slugs = subprocess.run(
+        [sys.executable, 'manage.py', 'shell', '-c',
+         "from products.models import Product; print(*Product.objects.values_list('unique_slug', flat=True)[:500])"],
+        cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout.split()
+
+    server, base_url = serve(env, workers)
+    try:
+        listen_urls = [f'{base_url}/listen/{slug}/' for slug in slugs]
+        scanners = [build_opener() for _ in range(concurrency)]
+        # One session per client, all for the same 10k-product owner
+        owners = [logged_in(base_url, 'load0', 'load') for _ in range(concurrency)]
+        return [
+            ('listen', hammer(scanners, listen_urls, seconds)),
+            ('dashboard', hammer(owners, [f'{base_url}/dashboard/'], seconds)),
+        ]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(seconds, workers, concurrency, output):
+    postgres_url = os.environ.get('BENCH_POSTGRES_URL')
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for index, (name, database, extra_env) in enumerate(PROFILES):
+            if database == 'postgres' and not postgres_url:
+                print(f"Skipping {name}: BENCH_POSTGRES_URL is not set.")
+                continue
+            database_url = postgres_url if database == 'postgres' else f"sqlite:///{Path(directory) / f'profile{index}.sqlite3'}"
+            for case, result in run_profile(database_url, extra_env, seconds, workers, concurrency):
+                rows.append((f'{name}: {case}', result))
+
+    print_table(rows)
+    if output:
+        write_results(output, 'db_profiles', rows, seconds=seconds, workers=workers, concurrency=concurrency, products=PRODUCTS)
+        print(f"\nWrote {output}")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 16,
+        sys.argv[4] if len(sys.argv) > 4 else None,
+    )
@@ -0,0 +1,110 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+
+import django
+
+
+@contextmanager
+def django_test_environment(**overrides):
+    """Set up Django against a throwaway test database for a benchmark run."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tsa_project.settings')
+    django.setup()
+
+    from django.test.utils import (
+        override_settings, setup_databases, setup_test_environment,
+        teardown_databases, teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(fn, iterations, warmup=20):
+    """Call fn repeatedly and return throughput and latency percentiles."""
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'rps': iterations / elapsed,
+        'p50_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000,
+        'p99_ms': timings[int(len(timings) * 0.99) - 1] * 1000,
+    }
+
+
+def print_table(rows):
+    # Queries and errors columns are shown when the results have them
+    extra = [column for column in ('queries', 'errors') if any(column in result for _, result in rows)]
+    print(
+        f"{'case':<32} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+        + ''.join(f" {column:>8}" for column in extra)
+    )
+    for name, result in rows:
+        print(
+            f"{name:<32} {result['rps']:>10.0f} {result['p50_ms']:>10.3f} "
+            f"{result['p95_ms']:>10.3f} {result['p99_ms']:>10.3f}"
+            + ''.join(f" {result.get(column, ''):>8}" for column in extra)
+        )
+
+
+def count_queries(fn):
+    """Queries run by one call to fn, across every database."""
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    with ExitStack() as stack:
+        contexts = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        fn()
+    return sum(len(context) for context in contexts)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, benchmark, rows, **params):
+    """Save rows as JSON, with enough context to compare runs across commits."""
+    import django
+    from django.conf import settings
+
+    results = {
+        'benchmark': benchmark,
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'params': params,
+        'cases': {name: result for name, result in rows},
+    }
+    if settings.configured:
+        from django.db import connection
+        results['database'] = connection.vendor
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
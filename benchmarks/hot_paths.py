@@ -0,0 +1,100 @@
+"""Latency, throughput and query counts for the hot paths on a seeded catalog.
+
+    python -m benchmarks.hot_paths [iterations] [products] [results.json]
+
+The catalog comes from products.seeding, as `manage.py seed_benchmark`
+builds it. Compare two saved runs with `python -m benchmarks.compare`.
+"""
+import itertools
+import json
+import sys
+from contextlib import nullcontext
+
+from benchmarks.harness import count_queries, django_test_environment, measure, print_table, write_results
+
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+FOLDERS = 40
+
+
+def main(iterations, product_count, output):
+    with django_test_environment(DEBUG=False):
+        from django.core.cache import cache
+        from django.test import Client, override_settings
+
+        from products.models import Folder, Product
+        from products.seeding import seed_catalog
+
+        (owner,) = seed_catalog(1, product_count, FOLDERS, 20)
+        folders = list(Folder.objects.filter(owner=owner).order_by('pk'))
+        folder_url = f'/api/folders/{folders[0].pk}/products/'
+        product = Product.objects.filter(owner=owner).order_by('pk').first()
+        listen_url = f'/listen/{product.unique_slug}/'
+
+        client = Client()
+        client.force_login(owner)
+        scanner = Client()
+        xhr = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        def uncached(url):
+            def get():
+                cache.clear()
+                client.get(url)
+            return get
+
+        names = itertools.count()
+
+        def create():
+            client.post(
+                '/products/new/',
+                {'name': f'New product {next(names)}', 'text_description': 'Ingredients: water.'},
+                **xhr,
+            )
+
+        # Move one card back and forth between two folders
+        targets = itertools.cycle([folders[1].pk, folders[2].pk])
+
+        def move():
+            client.post(
+                '/api/update_product_folder/',
+                json.dumps({'product_id': product.pk, 'folder_id': next(targets)}),
+                content_type='application/json',
+            )
+
+        batch_ids = list(Product.objects.filter(owner=owner).order_by('pk').values_list('pk', flat=True)[:50])
+
+        def move_batch():
+            folder_id = next(targets)
+            moves = [{'product_id': pk, 'folder_id': folder_id, 'position': i} for i, pk in enumerate(batch_ids)]
+            client.post('/api/products/batch/', json.dumps({'moves': moves}), content_type='application/json')
+
+        uncached_pages = override_settings(CACHES=DUMMY_CACHES)
+        cases = [
+            ('dashboard, uncached', uncached('/dashboard/'), nullcontext()),
+            ('dashboard, cached', lambda: client.get('/dashboard/'), nullcontext()),
+            ('folder page, uncached', uncached(folder_url), nullcontext()),
+            ('folder page, cached', lambda: client.get(folder_url), nullcontext()),
+            ('listen, uncached', lambda: scanner.get(listen_url), uncached_pages),
+            ('listen, cached', lambda: scanner.get(listen_url), nullcontext()),
+            ('create product', create, nullcontext()),
+            ('update_product_folder', move, nullcontext()),
+            ('batch move, 50 cards', move_batch, nullcontext()),
+        ]
+
+        rows = []
+        for name, fn, overrides in cases:
+            with overrides:
+                result = measure(fn, iterations)
+                rows.append((name, {**result, 'queries': count_queries(fn)}))
+
+        print_table(rows)
+        if output:
+            write_results(output, 'hot_paths', rows, iterations=iterations, products=product_count, folders=FOLDERS)
+            print(f"\nWrote {output}")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10000,
+        sys.argv[3] if len(sys.argv) > 3 else None,
+    )
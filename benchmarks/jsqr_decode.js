@@ -0,0 +1,22 @@
+// Decode RGBA frames with the jsQR build the scanner page ships.
+// Reads {iterations, frames: [{name, width, height, rgba}]} as JSON on stdin.
+const path = require('path');
+const jsQR = require(path.join(__dirname, '..', 'static', 'js', 'jsQR.min.js'));
+
+let input = '';
+process.stdin.on('data', (chunk) => { input += chunk; });
+process.stdin.on('end', () => {
+    const { iterations, frames } = JSON.parse(input);
+    const results = frames.map((frame) => {
+        const data = new Uint8ClampedArray(Buffer.from(frame.rgba, 'base64'));
+        const decode = () => jsQR(data, frame.width, frame.height, { inversionAttempts: 'dontInvert' });
+
+        const code = decode();
+        const started = process.hrtime.bigint();
+        for (let i = 0; i < iterations; i++) decode();
+        const elapsed = Number(process.hrtime.bigint() - started) / 1e6;
+
+        return { name: frame.name, ms: elapsed / iterations, data: code ? code.data : null };
+    });
+    process.stdout.write(JSON.stringify(results));
+});
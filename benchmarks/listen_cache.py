@@ -0,0 +1,41 @@
+"""Requests/second for /listen/<slug>/ with and without the page cache.
+
+    python -m benchmarks.listen_cache [iterations]
+"""
+import sys
+
+from benchmarks.harness import django_test_environment, measure, print_table
+
+DUMMY_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def main(iterations):
+    with django_test_environment():
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from django.test import Client, override_settings
+
+        from products.models import Product
+
+        owner = User.objects.create_user(username='bench', password='bench')
+        product = Product.objects.create(
+            owner=owner, name='Tomato soup', text_description='Ingredients: tomatoes, cream, basil. ' * 20
+        )
+        url = f'/listen/{product.unique_slug}/'
+        client = Client()
+
+        rows = []
+        with override_settings(CACHES=DUMMY_CACHES):
+            rows.append(('uncached render', measure(lambda: client.get(url), iterations)))
+
+        cache.clear()
+        rows.append(('cached page', measure(lambda: client.get(url), iterations)))
+
+        etag = client.get(url)['ETag']
+        rows.append(('cached, If-None-Match (304)', measure(lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), iterations)))
+
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
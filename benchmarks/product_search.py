@@ -0,0 +1,69 @@
+"""Product search latency: full-text index against icontains scans.
+
+    python -m benchmarks.product_search [iterations] [products]
+
+Try 1000000 products for the at-scale numbers; seeding takes a while.
+"""
+import random
+import sys
+
+import shortuuid
+
+from benchmarks.harness import django_test_environment, measure, print_table
+
+FOODS = (
+    'tomato basil cream soup pasta penne garlic onion pepper cheese milk butter bread flour sugar salt '
+    'rice beans lentil chickpea spinach kale carrot potato apple banana orange lemon lime mango peach '
+    'chicken beef pork fish salmon tuna prawn tofu egg yoghurt oat barley honey vinegar mustard ketchup'
+).split()
+
+
+def vocabulary(rng, size=20000):
+    # Made-up words plus the foods, drawn with a Zipf-like skew
+    words = FOODS + [
+        ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10))) for _ in range(size)
+    ]
+    rng.shuffle(words)
+    return words, [1 / (rank + 1) for rank in range(len(words))]
+
+
+def description(rng, words, weights):
+    return ' '.join(rng.choices(words, weights, k=rng.randint(20, 120))).capitalize() + '.'
+
+
+def main(iterations, product_count):
+    with django_test_environment():
+        from django.contrib.auth.models import User
+
+        from products import search
+        from products.models import Product, generate_short_code
+
+        rng = random.Random(1)
+        words, weights = vocabulary(rng)
+        owner = User.objects.create_user(username='bench', password='bench')
+        for start in range(0, product_count, 5000):
+            Product.objects.bulk_create([
+                Product(
+                    owner=owner, name=f'{rng.choice(FOODS).capitalize()} {rng.choice(FOODS)} {i}',
+                    text_description=description(rng, words, weights),
+                    unique_slug=shortuuid.uuid(), short_code=generate_short_code(),
+                )
+                for i in range(start, min(start + 5000, product_count))
+            ])
+
+        def icontains(query):
+            products = Product.objects.filter(search._substring_match(search.search_terms(query)), owner=owner)
+            return list(products.order_by('name', 'pk').values_list('pk', flat=True)[:20])
+
+        rows = []
+        for query in ('mango', 'lentil sal', 'pep'):
+            rows.append((f'icontains "{query}"', measure(lambda: icontains(query), iterations, warmup=2)))
+            rows.append((f'full-text "{query}"', measure(lambda: search.search_products(owner, query), iterations, warmup=2)))
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100000,
+    )
@@ -0,0 +1,37 @@
+"""Per-request cost of /scan/ and /listen/ with and without the session-free path.
+
+    python -m benchmarks.public_routes [iterations]
+
+Runs with a signed-in client so the full stack has a session to load.
+"""
+import sys
+
+from benchmarks.harness import django_test_environment, measure, print_table
+
+
+def main(iterations):
+    with django_test_environment():
+        from django.contrib.auth.models import User
+        from django.test import Client, override_settings
+
+        from products.models import Product
+
+        owner = User.objects.create_user(username='bench', password='bench')
+        product = Product.objects.create(owner=owner, name='Tomato soup', text_description='Tomatoes and basil.')
+        listen_url = f'/listen/{product.unique_slug}/'
+
+        client = Client()
+        client.login(username='bench', password='bench')
+
+        rows = []
+        for label, routes in (('full stack', set()), ('session-free', None)):
+            overrides = {} if routes is None else {'PUBLIC_ROUTES': routes}
+            with override_settings(**overrides):
+                rows.append((f'/scan/ {label}', measure(lambda: client.get('/scan/'), iterations)))
+                rows.append((f'/listen/ {label}', measure(lambda: client.get(listen_url), iterations)))
+
+        print_table(rows)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
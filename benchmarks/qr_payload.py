@@ -0,0 +1,88 @@
+"""Module count and jsQR decode time for long and short QR payloads.
+
+Each code is scaled to a range of widths inside a 640x480 frame, as a
+label of fixed print size would appear to the scanner camera from
+further away; denser codes get fewer pixels per module. "Reliable from"
+is the smallest width at which it and every larger width decodes.
+Needs node on PATH.
+
+    python -m benchmarks.qr_payload [iterations]
+"""
+import base64
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.harness import django_test_environment
+
+FRAME_SIZE = (640, 480)
+CODE_WIDTHS = range(40, 165, 5)
+PAYLOADS = {
+    'long  /listen/<slug>/': 'https://tsa-example.onrender.com/listen/8kQ2mZpXvN4tR7yLcW3hJd/',
+    'short /L/<CODE>': 'HTTPS://TSA-EXAMPLE.ONRENDER.COM/L/0SL8S56V',
+}
+
+
+def frame(code, width):
+    size = code.modules_count
+    modules = bytes(0 if dark else 255 for row in code.modules for dark in row)
+    image = Image.new('L', (size + 8, size + 8), 255)
+    image.paste(Image.frombytes('L', (size, size), modules), (4, 4))
+    # Draw sharp, then average down as a camera sensor would
+    image = image.resize((image.width * 10, image.height * 10), Image.NEAREST)
+    image = image.resize((width, width), Image.BOX)
+
+    canvas = Image.new('L', FRAME_SIZE, 190)
+    canvas.paste(image, ((FRAME_SIZE[0] - width) // 2, (FRAME_SIZE[1] - width) // 2))
+    return canvas.convert('RGBA').tobytes()
+
+
+def main(iterations):
+    node = shutil.which('node')
+    if node is None:
+        sys.exit('node is required to run jsQR.')
+
+    with django_test_environment():
+        from products import qr
+
+        codes = {name: qr.encode(url) for name, url in PAYLOADS.items()}
+        frames = [
+            {
+                'name': name,
+                'width': FRAME_SIZE[0],
+                'height': FRAME_SIZE[1],
+                'rgba': base64.b64encode(frame(code, width)).decode(),
+            }
+            for name, code in codes.items()
+            for width in CODE_WIDTHS
+        ]
+
+    script = Path(__file__).with_name('jsqr_decode.js')
+    output = subprocess.run(
+        [node, str(script)], input=json.dumps({'iterations': iterations, 'frames': frames}),
+        capture_output=True, text=True, check=True,
+    ).stdout
+
+    results = json.loads(output)
+
+    print(f"{'payload':<24} {'chars':>6} {'version':>8} {'modules':>8} {'reliable from':>14} {'decode ms':>10}")
+    for index, (name, code) in enumerate(codes.items()):
+        rows = list(zip(CODE_WIDTHS, results[index * len(CODE_WIDTHS):]))
+        reliable_from = None
+        for width, result in reversed(rows):
+            if not result['data']:
+                break
+            reliable_from = width
+        decoded_ms = [result['ms'] for _, result in rows if result['data']]
+        print(
+            f"{name:<24} {len(PAYLOADS[name]):>6} {code.version:>8} {code.modules_count:>8} "
+            f"{f'{reliable_from}px' if reliable_from else '-':>14} {sum(decoded_ms) / len(decoded_ms):>10.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,43 @@
+"""Bytes and render time per QR output, against the old qrcode.make PNG.
+
+    python -m benchmarks.qr_render [iterations]
+"""
+import sys
+from io import BytesIO
+
+import qrcode
+
+from benchmarks.harness import django_test_environment, measure
+
+URL = 'https://example.com/listen/8kQ2mZpXvN4tR7yLcW3hJd/'
+
+
+def legacy_png():
+    buffer = BytesIO()
+    qrcode.make(URL).get_image().save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def main(iterations):
+    with django_test_environment():
+        from products import qr
+
+        cases = [('qrcode.make (old)', legacy_png)]
+        for preset in qr.PRESETS:
+            for fmt in qr.FORMATS:
+                cases.append((f'{preset} {fmt}', lambda preset=preset, fmt=fmt: qr.render(URL, preset, fmt)))
+
+        code = qr.encode(URL)
+        cases.append(('download png, pre-encoded', lambda: qr.render_code(code)))
+
+        print(f"{'case':<32} {'bytes':>10} {'renders/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+        for name, fn in cases:
+            result = measure(fn, iterations, warmup=5)
+            print(
+                f"{name:<32} {len(fn()):>10} {result['rps']:>10.0f} "
+                f"{result['p50_ms']:>10.3f} {result['p95_ms']:>10.3f}"
+            )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
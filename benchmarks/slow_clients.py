@@ -0,0 +1,114 @@
+"""Listen and scan pages for many slow clients, gunicorn sync workers vs ASGI.
+
+    python -m benchmarks.slow_clients [seconds] [workers] [clients] [results.json]
+
+A fresh SQLite catalog is served twice with `workers` processes: by
+gunicorn's sync workers through tsa_project.wsgi, then by uvicorn workers
+through tsa_project.asgi with the settings in tsa_project.gunicorn_asgi.
+`clients` connections (1,000 by default) each trickle their request out a
+few bytes at a time, like a phone on a weak signal, then wait for the
+response. A sync worker is tied up for the whole trickle; an event loop is
+not. Requests that take longer than TIMEOUT count as errors.
+"""
+import asyncio
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmarks.db_profiles import BASE_DIR, manage, serve, summarize
+from benchmarks.harness import print_table, write_results
+
+PRODUCTS = 1000
+TIMEOUT = 30
+# Bytes per write and the pause between writes
+CHUNK = 16
+DELAY = 0.05
+
+SERVERS = [
+    ('wsgi, gunicorn sync workers', 'tsa_project.wsgi', []),
+    ('asgi, uvicorn workers', 'tsa_project.asgi:application', ['-c', 'python:tsa_project.gunicorn_asgi']),
+]
+
+
+async def slow_client(host, port, paths, rng, deadline, timings, errors):
+    while time.perf_counter() < deadline:
+        request = (
+            f"GET {rng.choice(paths)} HTTP/1.1\r\nHost: {host}\r\n"
+            "User-Agent: slow-client\r\nConnection: close\r\n\r\n"
+        ).encode()
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(TIMEOUT):
+                reader, writer = await asyncio.open_connection(host, port)
+                try:
+                    for i in range(0, len(request), CHUNK):
+                        writer.write(request[i:i + CHUNK])
+                        await writer.drain()
+                        await asyncio.sleep(DELAY)
+                    response = await reader.read()
+                finally:
+                    writer.close()
+        except (OSError, TimeoutError):
+            errors.append(1)
+            continue
+        if response.startswith(b'HTTP/1.1 200'):
+            timings.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+
+
+async def crowd(base_url, paths, clients, seconds):
+    url = urlsplit(base_url)
+    timings, errors = [], []
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(
+        slow_client(url.hostname, url.port, paths, random.Random(i), deadline, timings, errors)
+        for i in range(clients)
+    ))
+    return summarize(timings, len(errors), seconds)
+
+
+def main(seconds, workers, clients, output):
+    # Every client holds a socket open
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, clients * 2 + 100)), hard))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DATABASE_URL': f"sqlite:///{Path(directory) / 'slow_clients.sqlite3'}"}
+        manage(env, 'migrate', '--no-input')
+        manage(env, 'seed_benchmark', '--users=1', f'--products={PRODUCTS}', '--prefix=slow')
+        slugs = subprocess.run(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             "from products.models import Product; print(*Product.objects.values_list('unique_slug', flat=True)[:500])"],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout.split()
+        paths = [f'/listen/{slug}/' for slug in slugs] + ['/scan/']
+
+        for name, app, options in SERVERS:
+            server, base_url = serve(env, workers, app, options)
+            try:
+                rows.append((name, asyncio.run(crowd(base_url, paths, clients, seconds))))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print_table(rows)
+    if output:
+        write_results(output, 'slow_clients', rows, seconds=seconds, workers=workers, clients=clients, products=PRODUCTS)
+        print(f"\nWrote {output}")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 30,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 1000,
+        sys.argv[4] if len(sys.argv) > 4 else None,
+    )
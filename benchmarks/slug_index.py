@@ -0,0 +1,55 @@
+"""/listen/ throughput for unknown slugs with and without the slug index.
+
+    python -m benchmarks.slug_index [iterations] [products]
+"""
+import logging
+import sys
+from unittest import mock
+
+import shortuuid
+
+from benchmarks.harness import django_test_environment, measure, print_table
+
+
+def main(iterations, product_count):
+    with django_test_environment(DEBUG=False):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        from products.models import Product, generate_short_code
+        from products.slug_index import slug_index
+
+        owner = User.objects.create_user(username='bench', password='bench')
+        Product.objects.bulk_create(
+            [
+                Product(
+                    owner=owner, name=f'Item {i}', text_description='desc',
+                    unique_slug=shortuuid.uuid(), short_code=generate_short_code(),
+                )
+                for i in range(product_count)
+            ],
+            batch_size=1000,
+        )
+        slug = Product.objects.values_list('unique_slug', flat=True).first()
+        client = Client()
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        probes = iter(shortuuid.uuid() for _ in range(iterations * 3))
+
+        rows = []
+        with mock.patch.object(slug_index, 'is_missing', return_value=False):
+            rows.append(('unknown slug, no index', measure(lambda: client.get(f'/listen/{next(probes)}/'), iterations)))
+
+        slug_index.rebuild()
+        rows.append(('unknown slug, index', measure(lambda: client.get(f'/listen/{next(probes)}/'), iterations)))
+        rows.append(('known slug, cached page', measure(lambda: client.get(f'/listen/{slug}/'), iterations)))
+        print_table(rows)
+
+        print(f"\nfilter: {len(slug_index._filter.bits) / 1024:.0f} KiB for {product_count} products, "
+              f"{slug_index._filter.hashes} hashes")
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20000,
+    )
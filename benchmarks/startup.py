@@ -0,0 +1,114 @@
+"""Import time and time to first request, to catch startup regressions.
+
+    python -m benchmarks.startup [runs] [results.json]
+
+Every run starts a fresh process against a small seeded SQLite catalog:
+Django setup with the URLconf loaded, `manage.py check`, and gunicorn with
+one worker, with and without tsa_project.gunicorn_wsgi (preload and
+warm-up), timed from launch until a listen page comes back. Exits with
+status 1 if setup loads any of HEAVY_MODULES, which only the QR rendering
+path should need.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from benchmarks.db_profiles import BASE_DIR, free_port, manage, summarize
+from benchmarks.harness import print_table, write_results
+
+PRODUCTS = 1000
+HEAVY_MODULES = ('qrcode', 'PIL')
+
+SETUP = f"""
+import os, sys
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tsa_project.settings')
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))
+"""
+
+SERVERS = [
+    ('first request, gunicorn', []),
+    ('first request, preload + warm-up', ['-c', 'python:tsa_project.gunicorn_wsgi']),
+]
+
+
+def timed(args, env):
+    start = time.perf_counter()
+    result = subprocess.run(args, cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def first_request(env, options, path):
+    """Seconds from launching gunicorn until `path` returns 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', *options, '--workers', '1', '--bind', f'127.0.0.1:{port}', 'tsa_project.wsgi'],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < 60:
+            try:
+                with urlopen(f'http://127.0.0.1:{port}{path}', timeout=10) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (URLError, OSError):
+                time.sleep(0.005)
+        raise RuntimeError("gunicorn did not serve a request within 60 seconds.")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(runs, output):
+    rows = []
+    heavy = set()
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DATABASE_URL': f"sqlite:///{Path(directory) / 'startup.sqlite3'}"}
+        manage(env, 'migrate', '--no-input')
+        manage(env, 'seed_benchmark', '--users=1', f'--products={PRODUCTS}', '--prefix=startup')
+        _, slug = timed(
+            [sys.executable, 'manage.py', 'shell', '-c',
+             "from products.models import Product; print(Product.objects.values_list('unique_slug', flat=True).first())"],
+            env,
+        )
+        path = f'/listen/{slug.strip()}/'
+
+        timings = []
+        for _ in range(runs):
+            seconds, loaded = timed([sys.executable, '-c', SETUP], env)
+            timings.append(seconds)
+            heavy.update(loaded.split())
+        rows.append(('django setup + URLconf', summarize(timings, 0, sum(timings))))
+
+        timings = [timed([sys.executable, 'manage.py', 'check'], env)[0] for _ in range(runs)]
+        rows.append(('manage.py check', summarize(timings, 0, sum(timings))))
+
+        for name, options in SERVERS:
+            timings = [first_request(env, options, path) for _ in range(runs)]
+            rows.append((name, summarize(timings, 0, sum(timings))))
+
+    print_table(rows)
+    if output:
+        write_results(output, 'startup', rows, runs=runs, products=PRODUCTS)
+        print(f"\nWrote {output}")
+
+    if heavy:
+        print(f"\nDjango setup loaded {', '.join(sorted(heavy))}; keep them on the QR rendering path.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        sys.argv[2] if len(sys.argv) > 2 else None,
+    ))
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import mark_safe
-from .models import Folder, Product, QRCode, Template
+from . import search
+from .models import Folder, Product, QRCode, QRRenderJob, Template
 
 
 class QRCodeInline(admin.StackedInline):
@@ -8,11 +9,15 @@ class QRCodeInline(admin.StackedInline):
     can_delete = False
     verbose_name_plural = 'QR Code'
     fk_name = 'linked_product'
-    readonly_fields = ('image_tag',)
+    exclude = ('image_data',)
+    readonly_fields = ('image_tag', 'image_hash')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('image_data')
 
     def image_tag(self, instance):
-        if instance.image_data:
-            return mark_safe(f'<img src="{instance.image_data}" width="150" height="150" />')
+        if instance.image_hash:
+            return mark_safe(f'<img src="{instance.image_url}" width="150" height="150" />')
         return ""
     image_tag.short_description = 'QR Code Image'
 
@@ -24,14 +29,22 @@ class ProductAdmin(admin.ModelAdmin):
     inlines = (QRCodeInline,)
     readonly_fields = ('unique_slug',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains over every description
+        return search.filter_products(queryset, search_term), False
+
 @admin.register(QRCode)
 class QRCodeAdmin(admin.ModelAdmin):
     list_display = ('linked_product', 'public_url')
-    readonly_fields = ('image_tag',)
+    exclude = ('image_data',)
+    readonly_fields = ('image_tag', 'image_hash')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('linked_product').defer('image_data')
 
     def image_tag(self, instance):
-        if instance.image_data:
-            return mark_safe(f'<img src="{instance.image_data}" width="150" height="150" />')
+        if instance.image_hash:
+            return mark_safe(f'<img src="{instance.image_url}" width="150" height="150" />')
         return ""
     image_tag.short_description = 'QR Code Image'
 
@@ -45,3 +58,9 @@ class FolderAdmin(admin.ModelAdmin):
 class TemplateAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name', 'content')
+
+@admin.register(QRRenderJob)
+class QRRenderJobAdmin(admin.ModelAdmin):
+    list_display = ('qr_code', 'status', 'attempts', 'run_after')
+    list_filter = ('status',)
+    readonly_fields = ('last_error',)
@@ -0,0 +1,123 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+
+from .models import Product, ScanStats
+
+logger = logging.getLogger(__name__)
+
+
+class ScanBuffer:
+    """Per-process buffer of listen hits, written out as batched increments.
+
+    Each gunicorn worker keeps its own buffer. Flushes only ever add to the
+    stored counters, so workers never overwrite each other. A crash loses at
+    most the hits since the last flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.background = False
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def record(self, product_id, when=None):
+        if self._add(product_id, when):
+            self.flush()
+
+    async def arecord(self, product_id, when=None):
+        if self._add(product_id, when):
+            await sync_to_async(self.flush)()
+
+    def _add(self, product_id, when):
+        """Count one hit; True if the buffer is due for a flush."""
+        when = when or timezone.now()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since the buffer was created: drop the parent's state.
+                self._reset()
+
+            entry = self._pending.get(product_id)
+            if entry is None:
+                self._pending[product_id] = [1, when, when]
+            else:
+                entry[0] += 1
+                entry[2] = when
+
+            due = (
+                len(self._pending) >= settings.SCAN_BUFFER_SIZE
+                or time.monotonic() - self._last_flush >= settings.SCAN_FLUSH_INTERVAL
+            )
+            if self.background and self._flusher is None:
+                self._start_flusher()
+        return due
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        if not pending:
+            return 0
+
+        try:
+            write_scan_counts(pending)
+        except Exception:
+            logger.exception("Could not flush %d scan counters; keeping them for the next flush.", len(pending))
+            with self._lock:
+                for product_id, (count, first, last) in pending.items():
+                    entry = self._pending.setdefault(product_id, [0, first, last])
+                    entry[0] += count
+                    entry[1] = min(entry[1], first)
+                    entry[2] = max(entry[2], last)
+            return 0
+        return len(pending)
+
+    def _start_flusher(self):
+        self._flusher = threading.Thread(target=self._flush_forever, name='scan-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(settings.SCAN_FLUSH_INTERVAL)
+            self.flush()
+            connections.close_all()
+
+
+def write_scan_counts(pending):
+    existing = set(Product.objects.filter(pk__in=pending).values_list('pk', flat=True))
+
+    with transaction.atomic():
+        ScanStats.objects.bulk_create(
+            [ScanStats(product_id=product_id) for product_id in existing], ignore_conflicts=True
+        )
+        for product_id in existing:
+            count, first, last = pending[product_id]
+            ScanStats.objects.filter(product_id=product_id).update(
+                scan_count=F('scan_count') + count,
+                first_scanned_at=Least(Coalesce('first_scanned_at', Value(first)), Value(first)),
+                last_scanned_at=Greatest(Coalesce('last_scanned_at', Value(last)), Value(last)),
+            )
+
+
+scan_buffer = ScanBuffer()
+
+
+def enable_background_flush():
+    """Flush on a timer in every serving process, and once more at exit."""
+    scan_buffer.background = True
+    atexit.register(scan_buffer.flush)
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Folder, Product, QRCode, Template
+from .serializers import FolderSerializer, ProductSerializer, TemplateSerializer
+
+
+class KeysetPagination(BasePagination):
+    """Pages in (key, id) order by filtering past the last row seen, not OFFSET.
+
+    The cursor carries that row's key values, so every page costs the same
+    index seek and rows added or edited meanwhile don't shift the pages.
+    """
+
+    page_size = 100
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keys = view.get_keyset()
+        model = queryset.model
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+                values = [model._meta.get_field(key).to_python(value) for key, value in zip(self.keys, values)]
+            except (ValueError, TypeError, binascii.Error, DjangoValidationError):
+                raise NotFound('Invalid cursor.')
+            if len(values) != len(self.keys):
+                raise NotFound('Invalid cursor.')
+            queryset = queryset.filter(self.after(values))
+
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        page_size = min(max(page_size, 1), self.max_page_size)
+
+        rows = list(queryset.order_by(*self.keys)[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def after(self, values):
+        # (a, b) > (x, y) as a range on a plus a tiebreak on b, which the
+        # (owner, a, id) indexes can seek into.
+        key, value = self.keys[0], values[0]
+        if len(self.keys) == 1:
+            return Q(**{f'{key}__gt': value})
+        tiebreak, tiebreak_value = self.keys[1], values[1]
+        return Q(**{f'{key}__gte': value}) & (Q(**{f'{key}__gt': value}) | Q(**{f'{tiebreak}__gt': tiebreak_value}))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        values = [getattr(last, key) for key in self.keys]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), 'cursor', cursor)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class ConditionalMixin:
+    """ETags built from the rows being returned, checked before serializing.
+
+    An unchanged page costs its one query and no serialization or QR
+    lookups; the client gets a 304.
+    """
+
+    def row_version(self, obj):
+        return [obj.pk, obj.updated_at.isoformat()]
+
+    def make_etag(self, request, rows, extra=()):
+        state = [request.user.pk, request.get_full_path(), *extra, [self.row_version(row) for row in rows]]
+        return quote_etag(hashlib.sha1(json.dumps(state, default=str).encode()).hexdigest())
+
+    def not_modified(self, request, etag):
+        return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        etag = self.make_etag(request, page, [self.paginator.has_next])
+        if self.not_modified(request, etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.make_etag(request, [instance])
+        if self.not_modified(request, etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        return response
+
+
+class DeltaMixin:
+    """?since=<ISO timestamp> lists only rows changed at or after it.
+
+    Rows are then paged in (updated_at, id) order. A sync job passes the
+    largest updated_at it has stored; the boundary row may come back again,
+    which an upsert absorbs. Deleted rows are not reported.
+    """
+
+    def get_since(self):
+        since = self.request.query_params.get('since')
+        if not since:
+            return None
+        try:
+            parsed = parse_datetime(since.replace(' ', '+'))
+        except ValueError:
+            # Well-formed but impossible, e.g. month 13
+            parsed = None
+        if parsed is None:
+            raise ValidationError({'since': 'Expected an ISO 8601 timestamp.'})
+        return parsed
+
+    def get_keyset(self):
+        return ('updated_at', 'id') if self.get_since() else ('created_at', 'id')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        since = self.get_since()
+        return queryset.filter(updated_at__gte=since) if since else queryset
+
+
+def requested_fields(request):
+    fields = request.query_params.get('fields')
+    return set(fields.split(',')) if fields else None
+
+
+class ProductViewSet(DeltaMixin, ConditionalMixin, viewsets.ModelViewSet):
+    serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        products = Product.objects.filter(owner=self.request.user)
+        fields = requested_fields(self.request)
+        # Only join QR codes when their fields are asked for
+        if fields is None or fields & {'qr_code', 'listen_url'}:
+            products = products.select_related('qr_code').defer('qr_code__image_data')
+        if fields is not None and 'text_description' not in fields:
+            products = products.defer('text_description')
+        return products
+
+    def row_version(self, product):
+        version = super().row_version(product)
+        qr_code = product._state.fields_cache.get('qr_code')
+        if qr_code is not None:
+            version += [qr_code.image_hash, qr_code.public_url]
+        return version
+
+    def perform_create(self, serializer):
+        product = serializer.save(owner=self.request.user)
+        QRCode.objects.create(linked_product=product)
+
+
+class FolderViewSet(DeltaMixin, ConditionalMixin, viewsets.ModelViewSet):
+    serializer_class = FolderSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return Folder.objects.filter(owner=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+
+class TemplateViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = TemplateSerializer
+    pagination_class = KeysetPagination
+    queryset = Template.objects.all()
+
+    def get_keyset(self):
+        return ('id',)
+
+    def row_version(self, template):
+        return [template.pk, hashlib.sha1(f'{template.name}\0{template.content}'.encode()).hexdigest()]
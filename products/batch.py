@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import FOLDERS, bump_dashboard, folder_scope
+from .models import Folder, Product
+
+BULK_UPDATE_BATCH_SIZE = 500
+
+# `after` value that places a product at the start of its folder
+FIRST = 0
+
+
+def parse_batch(data):
+    """Validate the shape of a batch request and return (moves, delete_ids).
+
+    data = {
+        'moves': [{'product_id': 1, 'folder_id': 2 or None, 'position': 0}, ...],
+        'delete': [3, 4],
+    }
+    position is optional; moves without it keep their current order.
+    Instead of a position, a move may give 'after': the product it should
+    follow, or null for the start of the folder. The folder is then
+    renumbered here, so clients that have only loaded part of a folder
+    can still reorder it.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object.")
+
+    moves = []
+    for move in data.get('moves', []):
+        product_id = int(move['product_id'])
+        folder_id = int(move['folder_id']) if move.get('folder_id') else None
+        position = int(move['position']) if move.get('position') is not None else None
+        if position is not None and position < 0:
+            raise ValueError("Positions must not be negative.")
+        after = None
+        if 'after' in move:
+            after = int(move['after']) if move['after'] is not None else FIRST
+        moves.append((product_id, folder_id, position, after))
+
+    delete_ids = {int(product_id) for product_id in data.get('delete', [])}
+    return moves, delete_ids
+
+
+def apply_batch(owner, moves, delete_ids):
+    """Apply moves and deletes for `owner` in one transaction, bypassing Product.save.
+
+    Moves are (product_id, folder_id, position, after) as parse_batch
+    returns them.
+    """
+    anchors = {after for _, _, _, after in moves if after not in (None, FIRST)}
+    product_ids = {product_id for product_id, _, _, _ in moves} | delete_ids | anchors
+    folder_ids = {folder_id for _, folder_id, _, _ in moves if folder_id is not None}
+
+    old_folders = dict(Product.objects.filter(owner=owner, pk__in=product_ids).values_list('pk', 'folder_id'))
+    if set(old_folders) != product_ids:
+        raise ValueError("Some products do not exist or belong to another user.")
+
+    owned_folders = set(Folder.objects.filter(owner=owner, pk__in=folder_ids).values_list('pk', flat=True))
+    if owned_folders != folder_ids:
+        raise ValueError("Some folders do not exist or belong to another user.")
+
+    # bulk_update and update() skip auto_now, and API delta syncs need it
+    now = timezone.now()
+    positioned = [
+        Product(pk=product_id, folder_id=folder_id, position=position, updated_at=now)
+        for product_id, folder_id, position, after in moves
+        if position is not None and after is None and product_id not in delete_ids
+    ]
+    unpositioned = {}
+    for product_id, folder_id, position, after in moves:
+        if position is None and after is None and product_id not in delete_ids:
+            unpositioned.setdefault(folder_id, []).append(product_id)
+    relative = [
+        (product_id, folder_id, after)
+        for product_id, folder_id, _, after in moves
+        if after is not None and product_id not in delete_ids
+    ]
+
+    with transaction.atomic():
+        Product.objects.bulk_update(
+            positioned, ['folder', 'position', 'updated_at'], batch_size=BULK_UPDATE_BATCH_SIZE
+        )
+        for folder_id, ids in unpositioned.items():
+            Product.objects.filter(pk__in=ids).update(folder_id=folder_id, updated_at=now)
+        if relative:
+            place_relative(owner, relative, now)
+        if delete_ids:
+            Product.objects.filter(pk__in=delete_ids).delete()
+
+        changed_folders = set(old_folders.values()) | {folder_id for _, folder_id, _, _ in moves}
+        bump_dashboard(owner.pk, FOLDERS, *map(folder_scope, changed_folders))
+
+
+def place_relative(owner, relative, now):
+    """Insert each product after its anchor and renumber the folders involved."""
+    product_ids = [product_id for product_id, _, _ in relative]
+    folder_ids = {folder_id for _, folder_id, _ in relative}
+    folder_ids |= set(Product.objects.filter(pk__in=product_ids).values_list('folder_id', flat=True))
+
+    in_folders = Q(folder__in=[folder_id for folder_id in folder_ids if folder_id is not None])
+    if None in folder_ids:
+        in_folders |= Q(folder__isnull=True)
+    rows = (
+        Product.objects.filter(in_folders, owner=owner)
+        .order_by('position', '-created_at', '-pk')
+        .values_list('pk', 'folder_id', 'position')
+    )
+
+    # Every affected folder in the order the dashboard shows it
+    orders = {folder_id: [] for folder_id in folder_ids}
+    current = {}
+    for pk, folder_id, position in rows:
+        orders[folder_id].append(pk)
+        current[pk] = (folder_id, position)
+
+    for product_id, folder_id, after in relative:
+        orders[current[product_id][0]].remove(product_id)
+        current[product_id] = (folder_id, None)
+        order = orders[folder_id]
+        if after == FIRST:
+            order.insert(0, product_id)
+        elif after in order:
+            order.insert(order.index(after) + 1, product_id)
+        else:
+            raise ValueError("Products can only be placed after a product in the same folder.")
+
+    changed = [
+        Product(pk=pk, folder_id=folder_id, position=position, updated_at=now)
+        for folder_id, order in orders.items()
+        for position, pk in enumerate(order)
+        if current[pk] != (folder_id, position)
+    ]
+    Product.objects.bulk_update(changed, ['folder', 'position', 'updated_at'], batch_size=BULK_UPDATE_BATCH_SIZE)
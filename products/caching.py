@@ -0,0 +1,180 @@
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from .models import DashboardVersion
+from .slug_index import updated_marker
+
+
+# Rendered listen pages, keyed by slug or short code. Entries are dropped by
+# the Product save/delete signals in this process and carry the product's
+# updated marker, which the view checks against the slug index so edits made
+# in other workers are noticed without a query. The timeout only bounds memory.
+
+def listen_cache_key(slug):
+    return f"listen:{slug}"
+
+
+def get_listen_page(slug):
+    return cache.get(listen_cache_key(slug))
+
+
+async def aget_listen_page(slug):
+    return await cache.aget(listen_cache_key(slug))
+
+
+def listen_page_entry(product, response):
+    content = response.content
+    return {
+        'product_id': product.pk,
+        'marker': updated_marker(product),
+        'content': content,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.sha1(content).hexdigest()),
+        'last_modified': int(product.updated_at.timestamp()),
+    }
+
+
+def set_listen_page(slug, product, response):
+    entry = listen_page_entry(product, response)
+    cache.set(listen_cache_key(slug), entry, settings.LISTEN_CACHE_TIMEOUT)
+    return entry
+
+
+async def aset_listen_page(slug, product, response):
+    entry = listen_page_entry(product, response)
+    await cache.aset(listen_cache_key(slug), entry, settings.LISTEN_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_listen_page(product):
+    # Pages are cached under whichever identifier they were requested by
+    cache.delete_many([listen_cache_key(product.unique_slug), listen_cache_key(product.short_code)])
+
+
+def is_current(entry, known):
+    """Whether a cached page matches the slug index's (pk, marker) entry."""
+    return entry is not None and known is not None and entry['marker'] == known[1]
+
+
+def listen_page_response(request, entry):
+    response = get_conditional_response(
+        request, etag=entry['etag'], last_modified=entry['last_modified']
+    )
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    # Browsers may keep the page but must revalidate, so edits show up at once
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+# Dashboard fragments, keyed by owner, scope and the scope's current
+# DashboardVersion, so an edit only re-renders the parts that show it and
+# superseded entries just expire. Versions are kept in the database rather
+# than the cache so every process, the QR worker included, agrees on them.
+
+FOLDERS = 'folders'
+UNCATEGORIZED = 'uncategorized'
+TEMPLATES = 'templates'
+
+# Hits and misses per fragment kind in this process
+fragment_stats = Counter()
+
+_bumps = threading.local()
+
+
+def folder_scope(folder_id):
+    return f"folder:{folder_id}" if folder_id else UNCATEGORIZED
+
+
+def bump_dashboard(owner_id, *scopes):
+    """Give `scopes` new versions once the current transaction commits.
+
+    An owner_id of None bumps a scope shared by all users. Bumps made in
+    one transaction are written together, so bulk changes cost one query.
+    """
+    if not hasattr(_bumps, 'pending'):
+        _bumps.pending = set()
+    _bumps.pending.update((owner_id, scope) for scope in scopes)
+    transaction.on_commit(_write_versions)
+
+
+def _write_versions():
+    pending, _bumps.pending = getattr(_bumps, 'pending', set()), set()
+    DashboardVersion.objects.bulk_create(
+        [
+            DashboardVersion(owner_id=owner_id, scope=scope, version=uuid.uuid4().hex)
+            for owner_id, scope in pending if owner_id is not None
+        ],
+        update_conflicts=True,
+        unique_fields=['owner', 'scope'],
+        update_fields=['version'],
+    )
+    # NULL owners never conflict, so shared rows are updated in place
+    for scope in {scope for owner_id, scope in pending if owner_id is None}:
+        version = uuid.uuid4().hex
+        if not DashboardVersion.objects.filter(owner=None, scope=scope).update(version=version):
+            DashboardVersion.objects.create(scope=scope, version=version)
+
+
+def dashboard_versions(owner):
+    rows = DashboardVersion.objects.filter(Q(owner=owner) | Q(owner=None)).values_list('scope', 'version')
+    return dict(rows)
+
+
+async def adashboard_versions(owner):
+    rows = DashboardVersion.objects.filter(Q(owner=owner) | Q(owner=None)).values_list('scope', 'version')
+    return {scope: version async for scope, version in rows}
+
+
+def csrf_key(request):
+    # Fragments with forms embed a CSRF token, which only validates against
+    # the secret it was masked with
+    get_token(request)
+    return hashlib.sha1(request.META['CSRF_COOKIE'].encode()).hexdigest()[:16]
+
+
+def fragment_key(owner_id, scope, versions, vary):
+    return ':'.join(['dashboard', str(owner_id), scope, versions.get(scope, ''), *map(str, vary)])
+
+
+def dashboard_fragment(owner_id, scope, versions, render, *vary):
+    """Return the cached output of `render()` for this version of `scope`."""
+    key = fragment_key(owner_id, scope, versions, vary)
+    kind = scope.split(':')[0]
+    content = cache.get(key)
+    if content is None:
+        fragment_stats[kind, 'miss'] += 1
+        content = render()
+        cache.set(key, content, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        fragment_stats[kind, 'hit'] += 1
+    return content
+
+
+async def adashboard_fragment(owner_id, scope, versions, render, *vary):
+    """dashboard_fragment for async views; `render` is still called in a thread."""
+    key = fragment_key(owner_id, scope, versions, vary)
+    kind = scope.split(':')[0]
+    content = await cache.aget(key)
+    if content is None:
+        fragment_stats[kind, 'miss'] += 1
+        content = await sync_to_async(render)()
+        await cache.aset(key, content, settings.DASHBOARD_CACHE_TIMEOUT)
+    else:
+        fragment_stats[kind, 'hit'] += 1
+    return content
@@ -0,0 +1,10 @@
+class ShortCodeConverter:
+    """Product short codes, matched case-insensitively."""
+
+    regex = '[0-9A-Za-z]{4,16}'
+
+    def to_python(self, value):
+        return value.upper()
+
+    def to_url(self, value):
+        return value
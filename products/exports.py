@@ -0,0 +1,249 @@
+import hashlib
+import tempfile
+import zipfile
+import zlib
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.text import slugify
+
+from . import qr
+
+# Exports are built one file or page at a time and streamed as they go, so
+# memory stays flat however large the folder. Finished exports are kept in
+# the QR store under a digest of everything they show, so exporting an
+# unchanged folder again just sends the stored file.
+
+CONTENT_TYPES = {
+    'zip': 'application/zip',
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+}
+
+# Printable sheets are US Letter at SHEET_DPI, SHEET_COLUMNS by SHEET_ROWS
+# codes per page, each with the product name underneath.
+SHEET_DPI = 150
+SHEET_SIZE = (1275, 1650)
+SHEET_MARGIN = 75
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+SHEET_PAGE_SIZE = SHEET_COLUMNS * SHEET_ROWS
+LABEL_HEIGHT = 60
+LABEL_FONT_SIZE = 28
+QUIET_ZONE = 2
+
+# Bump when the output of an unchanged export would differ
+EXPORT_LAYOUT = 1
+
+
+def export_rows(products):
+    """What an export of `products` needs, skipping codes not rendered yet."""
+    return list(
+        products.filter(qr_code__isnull=False)
+        .exclude(qr_code__image_hash='')
+        .annotate(image_hash=F('qr_code__image_hash'), public_url=F('qr_code__public_url'))
+        .order_by('position', '-created_at', '-pk')
+        .values_list('name', 'short_code', 'image_hash', 'public_url', named=True)
+    )
+
+
+def export_name(rows, kind, preset='download', fmt='png'):
+    digest = hashlib.sha256()
+    digest.update(f"{EXPORT_LAYOUT}:{kind}:{preset}:{fmt}:{settings.QR_ERROR_CORRECTION}\n".encode())
+    for row in rows:
+        digest.update(f"{row.name}\0{row.image_hash}\n".encode())
+    digest = digest.hexdigest()
+    return f"exports/{digest[:2]}/{digest}.{kind}"
+
+
+def open_export(name):
+    """Open a stored export, or return None if it hasn't been made yet."""
+    storage = qr.get_storage()
+    if not storage.exists(name):
+        return None
+    return storage.open(name, 'rb')
+
+
+def stream_export(name, chunks):
+    """Yield `chunks`, keeping a copy that is stored once they're all sent.
+
+    Nothing is stored if the client goes away first.
+    """
+    with tempfile.TemporaryFile() as spool:
+        for chunk in chunks:
+            spool.write(chunk)
+            yield chunk
+
+        spool.seek(0)
+        qr.save_once(name, spool)
+
+
+def build_export(rows, kind, preset='download', fmt='png'):
+    if kind == 'zip':
+        return zip_chunks(rows, preset, fmt)
+    if kind == 'pdf':
+        return pdf_chunks(sheet_pages(rows))
+    return png_chunks(sheet_pages(rows))
+
+
+# ZIP archives
+
+class _ChunkWriter:
+    # Without tell() or seek(), zipfile writes each entry's sizes after its
+    # data instead of going back for them, so entries can be sent as soon
+    # as they are written.
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def unique_filenames(rows, fmt):
+    seen = set()
+    for row in rows:
+        filename = f"{slugify(row.name) or 'qr-code'}.{fmt}"
+        if filename in seen:
+            filename = f"{slugify(row.name) or 'qr-code'}-{row.short_code.lower()}.{fmt}"
+        seen.add(filename)
+        yield filename
+
+
+def _image_bytes(row, preset, fmt):
+    if preset == 'download' and fmt == 'png':
+        image = qr.open_image(row.image_hash)
+    else:
+        image = qr.get_variant(row.image_hash, preset, fmt, lambda digest: row.public_url)
+    with image:
+        return image.read()
+
+
+def zip_chunks(rows, preset='download', fmt='png'):
+    writer = _ChunkWriter()
+    # PNGs are compressed already
+    compression = zipfile.ZIP_STORED if fmt == 'png' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(writer, 'w', compression) as archive:
+        for row, filename in zip(rows, unique_filenames(rows, fmt)):
+            archive.writestr(filename, _image_bytes(row, preset, fmt))
+            yield writer.take()
+    yield writer.take()
+
+
+# Printable sheets
+
+def _fit_label(draw, text, font, width):
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + '…', font=font) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def sheet_pages(rows):
+    """Yield 1-bit pages of labelled codes, rendering one page at a time."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = SHEET_SIZE
+    cell_width = (width - 2 * SHEET_MARGIN) // SHEET_COLUMNS
+    cell_height = (height - 2 * SHEET_MARGIN) // SHEET_ROWS
+    font = ImageFont.load_default(size=LABEL_FONT_SIZE)
+
+    for start in range(0, len(rows), SHEET_PAGE_SIZE):
+        page = Image.new('1', SHEET_SIZE, 1)
+        draw = ImageDraw.Draw(page)
+        for index, row in enumerate(rows[start:start + SHEET_PAGE_SIZE]):
+            left = SHEET_MARGIN + (index % SHEET_COLUMNS) * cell_width
+            top = SHEET_MARGIN + (index // SHEET_COLUMNS) * cell_height
+
+            code = qr.module_image(qr.stored_modules(row.image_hash), QUIET_ZONE)
+            scale = min(cell_width, cell_height - LABEL_HEIGHT) // code.width
+            code = code.resize((code.width * scale, code.height * scale), Image.NEAREST)
+            page.paste(code, (left + (cell_width - code.width) // 2, top))
+
+            label = _fit_label(draw, row.name, font, cell_width - 20)
+            draw.text(
+                (left + cell_width // 2, top + code.height + LABEL_HEIGHT // 2),
+                label, fill=0, font=font, anchor='mm',
+            )
+        yield page
+
+
+def png_chunks(pages):
+    for page in pages:
+        yield _png_bytes(page)
+
+
+def _png_bytes(image):
+    buffer = BytesIO()
+    image.save(buffer, 'PNG', optimize=True, dpi=(SHEET_DPI, SHEET_DPI))
+    return buffer.getvalue()
+
+
+def pdf_chunks(pages):
+    """Write 1-bit `pages` as a PDF, sending each page once it's drawn.
+
+    The page tree only needs to know its pages at the end, so it is written
+    last; objects 1 and 2 are the catalog and the page tree.
+    """
+    offsets = {}
+    written = 0
+    page_ids = []
+
+    def pdf_object(number, body, stream=None):
+        nonlocal written
+        data = b'%d 0 obj\n' % number + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        data += b'\nendobj\n'
+        offsets[number] = written
+        written += len(data)
+        return data
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    written += len(header)
+    yield header
+
+    for page in pages:
+        image_id, content_id, page_id = 3 + 3 * len(page_ids), 4 + 3 * len(page_ids), 5 + 3 * len(page_ids)
+        width = page.width * 72 // SHEET_DPI
+        height = page.height * 72 // SHEET_DPI
+
+        # Mode 1 rows are packed a bit per pixel with 1 for white, the same
+        # as a 1-bit DeviceGray image
+        pixels = zlib.compress(page.tobytes())
+        image = pdf_object(
+            image_id,
+            b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray '
+            b'/BitsPerComponent 1 /Filter /FlateDecode /Length %d >>' % (page.width, page.height, len(pixels)),
+            pixels,
+        )
+        content = b'q %d 0 0 %d 0 0 cm /Im0 Do Q' % (width, height)
+        content = pdf_object(content_id, b'<< /Length %d >>' % len(content), content)
+        page_object = pdf_object(
+            page_id,
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>'
+            % (width, height, image_id, content_id),
+        )
+        page_ids.append(page_id)
+        yield image + content + page_object
+
+    kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+    tail = pdf_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids)))
+    tail += pdf_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+    count = 3 + 3 * len(page_ids)
+    xref_offset = written
+    tail += b'xref\n0 %d\n0000000000 65535 f \n' % count
+    tail += b''.join(b'%010d 00000 n \n' % offsets[number] for number in range(1, count))
+    tail += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (count, xref_offset)
+    yield tail
@@ -0,0 +1,18 @@
+from django import forms
+
+
+class ProductImportRowForm(forms.Form):
+    name = forms.CharField(max_length=200)
+    text_description = forms.CharField()
+    folder = forms.CharField(max_length=100, required=False)
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text="A .csv file with a header row, or a .jsonl file with one object per line.")
+
+
+class TemplateMergeForm(forms.Form):
+    file = forms.FileField(
+        help_text="A .csv or .jsonl file with a name column and one column per template field."
+    )
+    dry_run = forms.BooleanField(required=False)
@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import shortuuid
+from django.db import transaction
+
+from . import qr, speech
+from .caching import FOLDERS, bump_dashboard, folder_scope
+from .forms import ProductImportRowForm
+from .models import Folder, Product, QRCode, QRRenderJob, generate_short_code
+from .slug_index import slug_index
+
+DEFAULT_BATCH_SIZE = 500
+PREVIEW_SIZE = 5
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': len(self.errors), 'errors': self.errors}
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(fileobj, file_format):
+    """Yield (row_number, data) pairs without reading the whole file.
+
+    data is None when a line can't be parsed at all.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+
+    if file_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, row
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        yield row_number, data if isinstance(data, dict) else None
+
+
+def validate_rows(rows, report):
+    for row_number, data in rows:
+        if data is None:
+            report.add_error(row_number, {'__all__': ['Row could not be parsed.']})
+            continue
+
+        form = ProductImportRowForm(data)
+        if form.is_valid():
+            yield row_number, form.cleaned_data
+        else:
+            report.add_error(row_number, {field: list(messages) for field, messages in form.errors.items()})
+
+
+def resolve_folders(owner, names):
+    folders = {folder.name: folder for folder in Folder.objects.filter(owner=owner, name__in=names)}
+    missing = [Folder(owner=owner, name=name) for name in names if name not in folders]
+    for folder in Folder.objects.bulk_create(missing):
+        folders[folder.name] = folder
+    return folders
+
+
+def import_batch(owner, batch, report, executor=None, render=True):
+    folders = resolve_folders(owner, {data['folder'] for _, data in batch if data['folder']})
+
+    products = []
+    for _, data in batch:
+        # bulk_create skips save(), which would split the description
+        text_description = Product.normalize_description(data['text_description'])
+        products.append(Product(
+            owner=owner,
+            folder=folders.get(data['folder']),
+            name=data['name'],
+            text_description=text_description,
+            speech_chunks=speech.split_chunks(text_description),
+            unique_slug=shortuuid.uuid(),
+            short_code=generate_short_code(),
+        ))
+    base_url = qr.public_base_url()
+    qr_codes = [
+        QRCode(linked_product=product, public_url=QRCode.build_public_url(product, base_url))
+        for product in products
+    ]
+
+    if render:
+        digests = qr.render_many([qr_code.public_url for qr_code in qr_codes], executor)
+        for (row_number, _), qr_code, digest in zip(batch, qr_codes, digests):
+            if isinstance(digest, Exception):
+                report.add_error(row_number, {'qr_code': [f"Render failed, queued for retry: {digest}"]})
+            else:
+                qr_code.image_hash = digest
+
+    with transaction.atomic():
+        Product.objects.bulk_create(products)
+        for qr_code in qr_codes:
+            qr_code.linked_product_id = qr_code.linked_product.pk
+        QRCode.objects.bulk_create(qr_codes)
+        QRRenderJob.objects.bulk_create(
+            [QRRenderJob(qr_code=qr_code) for qr_code in qr_codes if not qr_code.image_hash]
+        )
+        bump_dashboard(owner.pk, FOLDERS, *{folder_scope(product.folder_id) for product in products})
+
+    # bulk_create skips the save signals that keep the slug index current
+    slug_index.add_many(products)
+    report.created += len(products)
+
+
+def import_products(owner, rows, batch_size=DEFAULT_BATCH_SIZE, workers=None, render=True, report=None):
+    """Create products and QR codes for `rows` in bulk.
+
+    rows yields (row_number, data) pairs. With render=False the images are
+    left to the QR worker; otherwise they are rendered in a process pool of
+    `workers` processes (0 renders inline).
+    """
+    report = report or ImportReport()
+    valid_rows = validate_rows(rows, report)
+
+    executor = None
+    if render and workers != 0:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        while batch := list(islice(valid_rows, batch_size)):
+            import_batch(owner, batch, report, executor, render)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return report
+
+
+def preview_products(rows, sample_size=PREVIEW_SIZE, report=None):
+    """Validate `rows` as import_products would, without creating anything.
+
+    Returns the report as a dict, with the number of rows that would be
+    created and the first `sample_size` of them.
+    """
+    report = report or ImportReport()
+    sample = []
+    valid = 0
+    for row_number, data in validate_rows(rows, report):
+        valid += 1
+        if len(sample) < sample_size:
+            sample.append({
+                'row': row_number,
+                'name': data['name'],
+                'folder': data['folder'],
+                'text_description': Product.normalize_description(data['text_description']),
+            })
+    return {'valid': valid, 'failed': len(report.errors), 'errors': report.errors, 'preview': sample}
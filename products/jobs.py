@@ -0,0 +1,106 @@
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import qr
+from .caching import bump_dashboard, folder_scope
+from .models import Product, QRCode, QRRenderJob
+
+# A running job whose worker died is handed out again after this long.
+STALE_AFTER = timedelta(minutes=5)
+
+
+def claim_jobs(limit, worker_id=None):
+    """Mark up to `limit` due jobs as running for this worker and return them."""
+    worker_id = worker_id or uuid.uuid4().hex
+    now = timezone.now()
+
+    with transaction.atomic():
+        due = QRRenderJob.objects.filter(status=QRRenderJob.PENDING, run_after__lte=now)
+        stale = QRRenderJob.objects.filter(status=QRRenderJob.RUNNING, locked_at__lt=now - STALE_AFTER)
+        # A worker that died mid-render used up an attempt; jobs that keep
+        # taking workers down give up like ones that keep raising
+        stale.filter(attempts__gte=settings.QR_RENDER_MAX_ATTEMPTS - 1).update(
+            status=QRRenderJob.FAILED,
+            attempts=F('attempts') + 1,
+            last_error='The worker rendering it stopped before finishing.',
+            locked_by='',
+            locked_at=None,
+        )
+        job_ids = list((due | stale).order_by('run_after').values_list('pk', flat=True)[:limit])
+
+        # The status filters make the claim safe when two workers race for
+        # the same rows: only one UPDATE can still match them.
+        due.filter(pk__in=job_ids).update(status=QRRenderJob.RUNNING, locked_by=worker_id, locked_at=now)
+        stale.filter(pk__in=job_ids).update(
+            status=QRRenderJob.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+        )
+
+    return list(
+        QRRenderJob.objects.filter(locked_by=worker_id, status=QRRenderJob.RUNNING)
+        .select_related('qr_code')
+        .defer('qr_code__image_data')
+    )
+
+
+def claimed(job):
+    """The job's row, as long as it is still this worker's claim on the same URL.
+
+    A stale reclaim hands the row to another worker, and a re-enqueue after
+    the product's URL changed resets it, so results for the old claim are
+    dropped rather than stored over newer ones.
+    """
+    return QRRenderJob.objects.filter(
+        pk=job.pk,
+        status=QRRenderJob.RUNNING,
+        locked_by=job.locked_by,
+        qr_code__public_url=job.qr_code.public_url,
+    )
+
+
+def complete_job(job, digest):
+    """Store a rendered image; False if the claim was lost meanwhile."""
+    with transaction.atomic():
+        if not claimed(job).delete()[0]:
+            return False
+
+        QRCode.objects.filter(pk=job.qr_code_id, public_url=job.qr_code.public_url).update(image_hash=digest)
+        # The product's QR metadata changed, which API delta syncs and the
+        # dashboard cache go by
+        product = Product.objects.filter(qr_code=job.qr_code_id)
+        product.update(updated_at=timezone.now())
+        for owner_id, folder_id in product.values_list('owner_id', 'folder_id'):
+            bump_dashboard(owner_id, folder_scope(folder_id))
+    return True
+
+
+def fail_job(job, error):
+    attempts = job.attempts + 1
+    changes = {'attempts': attempts, 'last_error': str(error), 'locked_by': '', 'locked_at': None}
+
+    if attempts >= settings.QR_RENDER_MAX_ATTEMPTS:
+        changes['status'] = QRRenderJob.FAILED
+    else:
+        changes['status'] = QRRenderJob.PENDING
+        changes['run_after'] = timezone.now() + timedelta(seconds=2 ** attempts)
+
+    # An update rather than save(), which would raise if the row was deleted
+    # or recreate a claim that another worker now holds
+    claimed(job).update(**changes)
+
+
+def run_jobs(jobs, executor=None):
+    """Render claimed jobs, in `executor` if given, and record each outcome."""
+    digests = qr.render_many([job.qr_code.public_url for job in jobs], executor)
+
+    rendered = 0
+    for job, digest in zip(jobs, digests):
+        if isinstance(digest, Exception):
+            fail_job(job, digest)
+        elif complete_job(job, digest):
+            rendered += 1
+    return rendered
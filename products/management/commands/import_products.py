@@ -0,0 +1,76 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import DEFAULT_BATCH_SIZE, ImportReport, detect_format, import_products, preview_products, read_rows
+from products.merge import merge_rows
+from products.models import Template
+
+
+class Command(BaseCommand):
+    help = "Bulk import products from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help="Username that will own the products.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (0 renders inline).")
+        parser.add_argument('--no-render', action='store_true', help="Leave QR rendering to the QR worker.")
+        parser.add_argument('--report', help="Write the per-row error report to this JSON file.")
+        parser.add_argument(
+            '--template', type=int, help="Fill this Template's [blank][Label] fields from each row's columns."
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Validate and preview without creating anything.")
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}.")
+
+        template = None
+        if options['template'] is not None:
+            try:
+                template = Template.objects.get(pk=options['template'])
+            except Template.DoesNotExist:
+                raise CommandError(f"No template with id {options['template']}.")
+
+        file_format = options['format'] or detect_format(options['path'])
+        started = time.perf_counter()
+        report = ImportReport()
+
+        with open(options['path'], 'rb') as fileobj:
+            rows = read_rows(fileobj, file_format)
+            if template is not None:
+                rows = merge_rows(template, rows, report)
+
+            if options['dry_run']:
+                preview = preview_products(rows, report=report)
+                self.stdout.write(f"{preview['valid']} products would be created, {preview['failed']} rows with errors.")
+                for row in preview['preview']:
+                    self.stdout.write(f"Row {row['row']}: {row['name']}: {row['text_description']}")
+                for error in report.errors:
+                    self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+                return
+
+            import_products(
+                owner,
+                rows,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                render=not options['no_render'],
+                report=report,
+            )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Imported {report.created} products in {elapsed:.1f}s, {len(report.errors)} rows with errors.")
+
+        if options['report']:
+            with open(options['report'], 'w') as fileobj:
+                json.dump(report.as_dict(), fileobj, indent=2)
+        else:
+            for error in report.errors:
+                self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
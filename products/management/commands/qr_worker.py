@@ -0,0 +1,35 @@
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from products.jobs import claim_jobs, run_jobs
+
+
+class Command(BaseCommand):
+    help = "Render queued QR codes in a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (0 renders inline).")
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+
+    def handle(self, *args, **options):
+        worker_id = uuid.uuid4().hex
+        workers = options['workers']
+        pool = nullcontext() if workers == 0 else ProcessPoolExecutor(max_workers=workers)
+
+        with pool as executor:
+            while True:
+                jobs = claim_jobs(options['batch_size'], worker_id)
+                if jobs:
+                    rendered = run_jobs(jobs, executor)
+                    self.stdout.write(f"Rendered {rendered} of {len(jobs)} QR codes.")
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,107 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from products import qr
+from products.caching import bump_dashboard, folder_scope
+from products.models import Product, QRCode, QRRenderJob
+
+
+class Command(BaseCommand):
+    help = "Re-render QR codes whose public URL changed, resuming from a checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (0 renders inline).")
+        parser.add_argument(
+            '--checkpoint',
+            default=str(Path(settings.BASE_DIR) / '.regenerate_qr_codes.json'),
+            help="Progress file; a run for the same base URL resumes after the last saved id.",
+        )
+        parser.add_argument('--restart', action='store_true', help="Ignore any saved checkpoint.")
+        parser.add_argument('--force', action='store_true', help="Re-render codes whose URL is already current.")
+
+    def handle(self, *args, **options):
+        base_url = qr.public_base_url()
+        checkpoint_path = Path(options['checkpoint'])
+        checkpoint = self.load_checkpoint(checkpoint_path, base_url, options)
+        if checkpoint['last_pk']:
+            self.stdout.write(f"Resuming after QR code {checkpoint['last_pk']}.")
+
+        rows = (
+            QRCode.objects.filter(pk__gt=checkpoint['last_pk'])
+            .select_related('linked_product')
+            .only('pk', 'public_url', 'image_hash', 'linked_product__short_code', 'linked_product__owner', 'linked_product__folder')
+            .order_by('pk')
+            .iterator(chunk_size=options['batch_size'])
+        )
+
+        workers = options['workers']
+        pool = nullcontext() if workers == 0 else ProcessPoolExecutor(max_workers=workers)
+        with pool as executor:
+            while batch := list(islice(rows, options['batch_size'])):
+                self.regenerate_batch(batch, base_url, options['force'], executor, checkpoint)
+                checkpoint['last_pk'] = batch[-1].pk
+                self.save_checkpoint(checkpoint_path, checkpoint)
+                self.stdout.write(
+                    f"Up to QR code {checkpoint['last_pk']}: {checkpoint['regenerated']} regenerated, "
+                    f"{checkpoint['failed']} queued for retry."
+                )
+
+        checkpoint_path.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {checkpoint['regenerated']} regenerated, {checkpoint['failed']} queued for the QR worker."
+        ))
+
+    def load_checkpoint(self, path, base_url, options):
+        fresh = {'base_url': base_url, 'force': options['force'], 'last_pk': 0, 'regenerated': 0, 'failed': 0}
+        if options['restart'] or not path.exists():
+            return fresh
+
+        saved = json.loads(path.read_text())
+        if saved.get('base_url') != base_url or saved.get('force') != options['force']:
+            self.stdout.write("Checkpoint is for a different run; starting over.")
+            return fresh
+        return saved
+
+    def save_checkpoint(self, path, checkpoint):
+        # Write then rename, so an interrupted run never leaves half a file
+        partial = path.with_name(path.name + '.partial')
+        partial.write_text(json.dumps(checkpoint))
+        partial.replace(path)
+
+    def regenerate_batch(self, batch, base_url, force, executor, checkpoint):
+        stale = []
+        for qr_code in batch:
+            public_url = QRCode.build_public_url(qr_code.linked_product, base_url)
+            if force or public_url != qr_code.public_url:
+                qr_code.public_url = public_url
+                stale.append(qr_code)
+        if not stale:
+            return
+
+        failed = []
+        for qr_code, digest in zip(stale, qr.render_many([c.public_url for c in stale], executor)):
+            if isinstance(digest, Exception):
+                qr_code.image_hash = ''
+                failed.append(qr_code)
+            else:
+                qr_code.image_hash = digest
+
+        with transaction.atomic():
+            QRCode.objects.bulk_update(stale, ['public_url', 'image_hash'])
+            Product.objects.filter(qr_code__in=stale).update(updated_at=timezone.now())
+            for owner_id, folder_id in {(c.linked_product.owner_id, c.linked_product.folder_id) for c in stale}:
+                bump_dashboard(owner_id, folder_scope(folder_id))
+            for qr_code in failed:
+                QRRenderJob.enqueue(qr_code)
+
+        checkpoint['regenerated'] += len(stale) - len(failed)
+        checkpoint['failed'] += len(failed)
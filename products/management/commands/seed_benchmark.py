@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Create users, folders, templates and products in bulk for load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--products', type=int, default=10000, help="Products per user.")
+        parser.add_argument('--folders', type=int, default=40, help="Folders per user.")
+        parser.add_argument('--templates', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0, help="The same seed always gives the same catalog.")
+        parser.add_argument('--prefix', default='bench', help="Usernames are <prefix>0, <prefix>1, ...; the password is <prefix>.")
+        parser.add_argument('--render', action='store_true', help="Render QR images now instead of leaving them to the QR worker.")
+        parser.add_argument('--workers', type=int, default=None, help="Render processes with --render (0 renders inline).")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users starting with {prefix!r} already exist; pick another --prefix.")
+
+        started = time.perf_counter()
+        owners = seed_catalog(
+            options['users'],
+            options['products'],
+            options['folders'],
+            options['templates'],
+            seed=options['seed'],
+            prefix=prefix,
+            render=options['render'],
+            workers=options['workers'],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(owners)} users with {options['products']} products and {options['folders']} folders each "
+            f"in {elapsed:.1f}s."
+        ))
+        if not options['render']:
+            self.stdout.write("QR images are queued; run `manage.py qr_worker` to render them.")
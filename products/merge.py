@@ -0,0 +1,57 @@
+import re
+from functools import lru_cache
+
+# Template.content marks fields as [blank][Label]. Rows supply a value per
+# label; a label used more than once gets the same value each time.
+PLACEHOLDER = re.compile(r'\[blank\]\[(.*?)\]')
+
+
+class CompiledTemplate:
+    """Template content split once into literal text and field labels."""
+
+    def __init__(self, content):
+        # re.split with a group alternates literal, label, literal, ...
+        self.parts = PLACEHOLDER.split(content)
+        self.fields = list(dict.fromkeys(self.parts[1::2]))
+
+    def missing_fields(self, values):
+        return [field for field in self.fields if values.get(field) is None]
+
+    def render(self, values):
+        # Descriptions are unicode_escape-decoded on save (see
+        # Product.normalize_description), so backslashes typed in a value
+        # are doubled to survive it, as the single-product form does.
+        return ''.join(
+            part if index % 2 == 0 else str(values[part]).replace('\\', '\\\\')
+            for index, part in enumerate(self.parts)
+        )
+
+
+@lru_cache(maxsize=256)
+def compile_template(content):
+    # Keyed on the content itself, so editing a template recompiles it
+    return CompiledTemplate(content)
+
+
+def merge_rows(template, rows, report):
+    """Fill `template` from each (row_number, data) pair in `rows`.
+
+    Yields rows ready for import_products, with text_description rendered.
+    Rows missing a field are recorded in `report` and skipped.
+    """
+    compiled = compile_template(template.content)
+    for row_number, data in rows:
+        if data is None:
+            yield row_number, data
+            continue
+
+        missing = compiled.missing_fields(data)
+        if missing:
+            report.add_error(row_number, {'text_description': [f"Missing value for [{field}]." for field in missing]})
+            continue
+
+        yield row_number, {
+            'name': data.get('name') or template.name,
+            'folder': data.get('folder'),
+            'text_description': compiled.render(data),
+        }
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_remove_qrcode_image_qrcode_image_data_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the stored PNG.', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='qrcode',
+            name='image_data',
+            field=models.TextField(blank=True, help_text='Legacy base64 image data, moved to the QR image store.'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:30
+
+import base64
+import hashlib
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import migrations
+
+BATCH_SIZE = 500
+DATA_URL_PREFIX = 'data:image/png;base64,'
+
+
+def image_name(digest):
+    return f"{digest[:2]}/{digest}.png"
+
+
+def move_images_to_store(apps, schema_editor):
+    QRCode = apps.get_model('products', 'QRCode')
+    storage = storages['qr_codes']
+    last_pk = 0
+
+    while True:
+        batch = list(
+            QRCode.objects.filter(pk__gt=last_pk)
+            .exclude(image_data='')
+            .order_by('pk')
+            .only('pk', 'image_data')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for qr_code in batch:
+            content = base64.b64decode(qr_code.image_data.removeprefix(DATA_URL_PREFIX))
+            digest = hashlib.sha256(content).hexdigest()
+            if not storage.exists(image_name(digest)):
+                storage.save(image_name(digest), ContentFile(content))
+            qr_code.image_hash = digest
+            qr_code.image_data = ''
+
+        QRCode.objects.bulk_update(batch, ['image_hash', 'image_data'])
+        last_pk = batch[-1].pk
+
+
+def inline_images_from_store(apps, schema_editor):
+    QRCode = apps.get_model('products', 'QRCode')
+    storage = storages['qr_codes']
+    last_pk = 0
+
+    while True:
+        batch = list(
+            QRCode.objects.filter(pk__gt=last_pk, image_data='')
+            .exclude(image_hash='')
+            .order_by('pk')
+            .only('pk', 'image_hash')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for qr_code in batch:
+            with storage.open(image_name(qr_code.image_hash), 'rb') as image:
+                qr_code.image_data = DATA_URL_PREFIX + base64.b64encode(image.read()).decode('utf-8')
+
+        QRCode.objects.bulk_update(batch, ['image_data'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_qrcode_image_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_images_to_store, inline_images_from_store),
+    ]
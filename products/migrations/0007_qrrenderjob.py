@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_move_qrcode_images_to_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_by', models.CharField(blank=True, max_length=64)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('qr_code', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='render_job', to='products.qrcode')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='products_qr_status_be4ab9_idx')],
+            },
+        ),
+    ]
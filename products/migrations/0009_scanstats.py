@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='scan_stats', serialize=False, to='products.product')),
+                ('scan_count', models.PositiveBigIntegerField(default=0)),
+                ('first_scanned_at', models.DateTimeField(blank=True, null=True)),
+                ('last_scanned_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
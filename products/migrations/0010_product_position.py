@@ -0,0 +1,24 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_scanstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='position',
+            field=models.PositiveIntegerField(default=0, help_text='Order of the card within its folder.'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['owner', 'folder', 'position'], name='products_pr_owner_i_dc74cf_idx'),
+        ),
+    ]
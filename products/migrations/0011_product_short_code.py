@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-16 20:47
+
+import shortuuid
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def assign_short_codes(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    short_codes = shortuuid.ShortUUID(alphabet='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    last_pk = 0
+
+    while True:
+        batch = list(Product.objects.filter(pk__gt=last_pk, short_code__isnull=True).order_by('pk').only('pk')[:BATCH_SIZE])
+        if not batch:
+            break
+
+        for product in batch:
+            product.short_code = short_codes.random(length=8)
+        Product.objects.bulk_update(batch, ['short_code'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='short_code',
+            field=models.CharField(editable=False, max_length=16, null=True),
+        ),
+        migrations.RunPython(assign_short_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='short_code',
+            field=models.CharField(blank=True, editable=False, help_text='Identifier used in QR payloads.', max_length=16, unique=True),
+        ),
+    ]
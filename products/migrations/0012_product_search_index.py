@@ -0,0 +1,86 @@
+# Generated by Django 6.0.1 on 2026-10-16 21:05
+
+from django.db import migrations
+
+# Full-text index over Product.name and text_description, maintained by the
+# database itself so bulk_create, update() and raw SQL stay in sync.
+#
+# SQLite: an external-content FTS5 table plus triggers. Django rebuilds
+# SQLite tables for some column alterations, which drops triggers, so a
+# later migration that alters products_product must re-run this one's SQL.
+#
+# PostgreSQL: a stored generated tsvector column with a GIN index.
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE products_product_fts USING fts5(
+        name, text_description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER products_product_fts_insert AFTER INSERT ON products_product BEGIN
+        INSERT INTO products_product_fts (rowid, name, text_description)
+        VALUES (new.id, new.name, new.text_description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_product_fts_delete AFTER DELETE ON products_product BEGIN
+        INSERT INTO products_product_fts (products_product_fts, rowid, name, text_description)
+        VALUES ('delete', old.id, old.name, old.text_description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_product_fts_update AFTER UPDATE OF name, text_description ON products_product BEGIN
+        INSERT INTO products_product_fts (products_product_fts, rowid, name, text_description)
+        VALUES ('delete', old.id, old.name, old.text_description);
+        INSERT INTO products_product_fts (rowid, name, text_description)
+        VALUES (new.id, new.name, new.text_description);
+    END
+    """,
+    "INSERT INTO products_product_fts (products_product_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS products_product_fts_insert',
+    'DROP TRIGGER IF EXISTS products_product_fts_delete',
+    'DROP TRIGGER IF EXISTS products_product_fts_update',
+    'DROP TABLE IF EXISTS products_product_fts',
+]
+
+POSTGRESQL_CREATE = [
+    """
+    ALTER TABLE products_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(text_description, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX products_product_search_idx ON products_product USING gin (search_vector)',
+]
+
+POSTGRESQL_DROP = [
+    'DROP INDEX IF EXISTS products_product_search_idx',
+    'ALTER TABLE products_product DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def run(statements_by_vendor):
+    def operation(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_short_code'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_CREATE, 'postgresql': POSTGRESQL_CREATE}),
+            run({'sqlite': SQLITE_DROP, 'postgresql': POSTGRESQL_DROP}),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 6.0.1 on 2026-10-16 23:40
+
+import re
+from importlib import import_module
+
+from django.db import migrations, models
+
+search_index = import_module('products.migrations.0012_product_search_index')
+
+BATCH_SIZE = 500
+
+# A copy of products.speech as it was when this migration was written, so
+# later changes there don't change what the migration stores
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+(?=[A-Z"“‘\'(\[])')
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+MAX_CHUNK = 200
+
+
+def split_long(sentence):
+    if len(sentence) <= MAX_CHUNK:
+        return [sentence]
+    chunks = []
+    current = ''
+    for clause in CLAUSE_END.split(sentence):
+        if current and len(current) + 1 + len(clause) > MAX_CHUNK:
+            chunks.append(current)
+            current = clause
+        else:
+            current = f'{current} {clause}' if current else clause
+    chunks.append(current)
+    return chunks
+
+
+def split_chunks(text):
+    sections = []
+    for line in (text or '').split('\n'):
+        line = ' '.join(line.split())
+        if not line:
+            continue
+        sections.append([chunk for sentence in SENTENCE_END.split(line) for chunk in split_long(sentence)])
+    return sections
+
+
+def split_descriptions(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    last_pk = 0
+
+    while True:
+        batch = list(
+            Product.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'text_description')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        for product in batch:
+            product.speech_chunks = split_chunks(product.text_description)
+
+        Product.objects.bulk_update(batch, ['speech_chunks'])
+        last_pk = batch[-1].pk
+
+
+# Adding or removing the column rebuilds products_product on SQLite, which
+# drops the full-text triggers from 0012; put them back and reindex
+recreate_search_index = search_index.run({'sqlite': search_index.SQLITE_DROP + search_index.SQLITE_CREATE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_dashboardversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_index),
+        migrations.AddField(
+            model_name='product',
+            name='speech_chunks',
+            field=models.JSONField(
+                blank=True, default=list, editable=False, help_text='text_description split into sections of sentences.'
+            ),
+        ),
+        migrations.RunPython(recreate_search_index, migrations.RunPython.noop),
+        migrations.RunPython(split_descriptions, migrations.RunPython.noop),
+    ]
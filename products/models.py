@@ -1,16 +1,25 @@
-import base64
 import codecs
-from io import BytesIO
 
-import qrcode
 import shortuuid
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.sites.models import Site
-from django.core.files import File
 from django.db import models
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 
+from . import qr, speech
+
+# Short codes use only digits and uppercase letters so the whole QR
+# payload fits the alphanumeric mode, which packs 5.5 bits per character
+# instead of 8.
+SHORT_CODE_LENGTH = 8
+short_codes = shortuuid.ShortUUID(alphabet='0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def generate_short_code():
+    return short_codes.random(length=SHORT_CODE_LENGTH)
+
 
 class Template(models.Model):
     name = models.CharField(max_length=100)
@@ -24,6 +33,7 @@ class Folder(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='folders')
     name = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -35,20 +45,57 @@ class Product(models.Model):
     
     name = models.CharField(max_length=200, help_text="A descriptive name for the product.")
     text_description = models.TextField(help_text="The text that will be read aloud when the QR code is scanned.")
+    speech_chunks = models.JSONField(
+        default=list, blank=True, editable=False, help_text="text_description split into sections of sentences."
+    )
     
+    position = models.PositiveIntegerField(default=0, help_text="Order of the card within its folder.")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     unique_slug = models.SlugField(unique=True, max_length=100, blank=True)
+    short_code = models.CharField(
+        unique=True, max_length=16, blank=True, editable=False, help_text='Identifier used in QR payloads.'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'folder', 'position']),
+            # Keyset pages and ?since= deltas in the API
+            models.Index(fields=['owner', 'created_at', 'id']),
+            models.Index(fields=['owner', 'updated_at', 'id']),
+            # Slug index catch-up with edits from other workers
+            models.Index(fields=['updated_at']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The folder it was loaded in, so the save signal can tell a move
+        if 'folder_id' in instance.__dict__:
+            instance._loaded_folder_id = instance.folder_id
+        return instance
+
+    @staticmethod
+    def normalize_description(text):
+        try:
+            decoded_text = codecs.decode(text, 'unicode_escape')
+            return decoded_text.replace('\r\n', '\n').replace('\r', '\n')
+        except (UnicodeDecodeError, TypeError):
+            return text.replace('\r\n', '\n').replace('\r', '\n')
 
     def save(self, *args, **kwargs):
         if self.text_description:
-            try:
-                decoded_text = codecs.decode(self.text_description, 'unicode_escape')
-                self.text_description = decoded_text.replace('\r\n', '\n').replace('\r', '\n')
-            except (UnicodeDecodeError, TypeError):
-                self.text_description = self.text_description.replace('\r\n', '\n').replace('\r', '\n')
+            self.text_description = self.normalize_description(self.text_description)
+        self.speech_chunks = speech.split_chunks(self.text_description)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text_description' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'speech_chunks'}
             
         if not self.unique_slug:
             self.unique_slug = shortuuid.uuid()
+
+        if not self.short_code:
+            self.short_code = generate_short_code()
             
         super().save(*args, **kwargs)
 
@@ -58,28 +105,124 @@ class Product(models.Model):
 
 class QRCode(models.Model):
     linked_product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='qr_code')
-    image_data = models.TextField(blank=True, help_text="Base64 encoded image data of the QR code.")
+    image_data = models.TextField(blank=True, help_text="Legacy base64 image data, moved to the QR image store.")
+    image_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the stored PNG.")
     public_url = models.URLField(blank=True)
 
     def get_filename(self):
         return f"{slugify(self.linked_product.name)}.png"
 
+    @property
+    def is_pending(self):
+        return not self.image_hash
+
+    @property
+    def image_url(self):
+        if not self.image_hash:
+            return ''
+        return reverse('qr_image', kwargs={'digest': self.image_hash})
+
+    def variant_url(self, preset, fmt='png'):
+        if not self.image_hash:
+            return ''
+        return reverse('qr_variant', kwargs={'digest': self.image_hash, 'preset': preset, 'fmt': fmt})
+
+    @property
+    def thumbnail_url(self):
+        return self.variant_url('thumbnail')
+
+    @staticmethod
+    def build_public_url(product, base_url=None):
+        base_url = qr.compact_base_url(base_url or qr.public_base_url())
+        return base_url + reverse('product_short_listen', kwargs={'short_code': product.short_code})
+
     def save(self, *args, **kwargs):
-        protocol = 'http'
-        domain = '127.0.0.1:8000'
-        self.public_url = f"{protocol}://{domain}/listen/{self.linked_product.unique_slug}/"
-        
-        if not self.image_data:
-            qr_image = qrcode.make(self.public_url)
-            canvas = qr_image.get_image()
-            
-            buffer = BytesIO()
-            canvas.save(buffer, 'PNG')
-            
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            self.image_data = f"data:image/png;base64,{image_base64}"
+        public_url = self.build_public_url(self.linked_product)
+        if public_url != self.public_url:
+            # The stored image encodes the old URL
+            self.public_url = public_url
+            self.image_hash = ''
+
+        render_later = not self.image_hash and settings.QR_RENDER_QUEUE
+        if not self.image_hash and not render_later:
+            self.image_hash = qr.store_image(qr.render_png(self.public_url))
 
         super().save(*args, **kwargs)
 
+        if render_later:
+            QRRenderJob.enqueue(self)
+
     def __str__(self):
         return f"QR Code for {self.linked_product.name}"
+
+
+class QRRenderJob(models.Model):
+    # Rows only exist while a render is outstanding; the worker deletes them
+    # once the image is stored.
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    qr_code = models.OneToOneField(QRCode, on_delete=models.CASCADE, related_name='render_job')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    @classmethod
+    def enqueue(cls, qr_code):
+        cls.objects.update_or_create(
+            qr_code=qr_code,
+            defaults={
+                'status': cls.PENDING,
+                'attempts': 0,
+                'run_after': timezone.now(),
+                'locked_by': '',
+                'locked_at': None,
+                'last_error': '',
+            },
+        )
+
+    def __str__(self):
+        return f"Render job for QR code {self.qr_code_id} ({self.status})"
+
+
+class ScanStats(models.Model):
+    # Written in batches by products.analytics, never on the listen request.
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='scan_stats')
+    scan_count = models.PositiveBigIntegerField(default=0)
+    first_scanned_at = models.DateTimeField(null=True, blank=True)
+    last_scanned_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Scans for {self.product_id}: {self.scan_count}"
+
+
+class DashboardVersion(models.Model):
+    # Cached dashboard fragments are keyed by these (see products.caching).
+    # A new version is written whenever what a scope shows changes; rows with
+    # no owner apply to every user.
+    # No database constraint: versions are written after commit and may
+    # land just after their owner was deleted.
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, db_constraint=False, related_name='dashboard_versions'
+    )
+    scope = models.CharField(max_length=32)
+    version = models.CharField(max_length=32)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['owner', 'scope'], name='unique_dashboard_version')]
+
+    def __str__(self):
+        return f"{self.scope} for {self.owner_id}: {self.version}"
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import storages
+
+
+# QR images are stored once per distinct PNG, named by the SHA-256 of their
+# bytes, so a stored file never changes and can be cached forever.
+#
+# qrcode and Pillow are imported inside the functions that draw or read
+# images, so processes that never render (most web workers, most manage.py
+# commands) don't pay for loading them.
+
+def public_base_url():
+    """Scheme and host that QR codes point at, without a trailing slash."""
+    if settings.QR_PUBLIC_BASE_URL:
+        return settings.QR_PUBLIC_BASE_URL.rstrip('/')
+    return f"{settings.QR_PUBLIC_SCHEME}://{Site.objects.get_current().domain}"
+
+
+def compact_base_url(base_url):
+    """Uppercase the scheme and host, which are case-insensitive.
+
+    With an uppercase short code after it, the payload stays in the QR
+    alphanumeric mode. Paths and user info are left alone.
+    """
+    parts = urlsplit(base_url)
+    if '@' in parts.netloc:
+        return base_url
+    return f"{parts.scheme.upper()}://{parts.netloc.upper()}{parts.path}"
+
+
+def get_storage():
+    return storages['qr_codes']
+
+
+def image_name(digest):
+    return f"{digest[:2]}/{digest}.png"
+
+
+def save_once(name, content):
+    """Store `content`, bytes or a file, under `name` unless it's already there.
+
+    Names are digests of what they hold, so writers racing for a name store
+    the same bytes. On local storage the file is written aside and renamed
+    into place, so nobody opens it half-written; elsewhere the loser of a
+    race deletes the copy the storage kept under another name.
+    """
+    storage = get_storage()
+    if storage.exists(name):
+        return
+
+    try:
+        path = Path(storage.path(name))
+    except NotImplementedError:
+        saved = storage.save(name, File(content) if hasattr(content, 'read') else ContentFile(content))
+        if saved != name:
+            storage.delete(saved)
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as f:
+        try:
+            if hasattr(content, 'read'):
+                shutil.copyfileobj(content, f)
+            else:
+                f.write(content)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    # Temporary files are private; stored images are served as media
+    os.chmod(f.name, storage.file_permissions_mode or 0o644)
+    os.replace(f.name, path)
+
+
+# Named output sizes, in pixels per module and modules of quiet zone.
+# `download` matches the size qrcode.make has always produced.
+PRESETS = {
+    'thumbnail': {'box_size': 4, 'border': 2},
+    'download': {'box_size': 10, 'border': 4},
+    'print': {'box_size': 24, 'border': 4},
+}
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+# Names of the qrcode.constants for each level
+ERROR_CORRECTION = {
+    'L': 'ERROR_CORRECT_L',
+    'M': 'ERROR_CORRECT_M',
+    'Q': 'ERROR_CORRECT_Q',
+    'H': 'ERROR_CORRECT_H',
+}
+
+
+def encode(url, error_correction=None):
+    """Build the module matrix for `url`; the slow part of any render."""
+    import qrcode
+
+    level = getattr(qrcode.constants, ERROR_CORRECTION[error_correction or settings.QR_ERROR_CORRECTION])
+
+    # Sizing is cheap next to mask selection, so try the payload as one
+    # segment and split into runs of each mode, and keep the smallest.
+    best = None
+    for optimize in (0, 4, 20):
+        code = qrcode.QRCode(error_correction=level, border=0)
+        code.add_data(url, optimize=optimize)
+        code.best_fit()
+        if best is None or code.version < best.version:
+            best = code
+    best.make(fit=False)
+    return best
+
+
+def module_image(modules, border):
+    """A 1-bit image with one pixel per module, quiet zone included."""
+    from PIL import Image
+
+    size = len(modules)
+    pixels = bytes(0 if dark else 255 for row in modules for dark in row)
+    image = Image.new('1', (size + 2 * border, size + 2 * border), 1)
+    image.paste(Image.frombytes('L', (size, size), pixels).convert('1'), (border, border))
+    return image
+
+
+def _draw_png(code, box_size, border):
+    from PIL import Image
+
+    # Paint one pixel per module and scale up, rather than drawing a
+    # rectangle per module, and keep the result 1-bit.
+    image = module_image(code.modules, border)
+    image = image.resize((image.width * box_size, image.height * box_size), Image.NEAREST)
+
+    buffer = BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _draw_svg(code, box_size, border):
+    from qrcode.image.svg import SvgPathImage
+
+    code.box_size = box_size
+    code.border = border
+    buffer = BytesIO()
+    code.make_image(image_factory=SvgPathImage).save(buffer)
+    return buffer.getvalue()
+
+
+def render(url, preset='download', fmt='png', error_correction=None):
+    return render_code(encode(url, error_correction), preset, fmt)
+
+
+def render_code(code, preset='download', fmt='png'):
+    draw = _draw_svg if fmt == 'svg' else _draw_png
+    return draw(code, **PRESETS[preset])
+
+
+def render_png(url):
+    return render(url)
+
+
+def store_image(content):
+    digest = hashlib.sha256(content).hexdigest()
+    save_once(image_name(digest), content)
+    return digest
+
+
+def open_image(digest):
+    return get_storage().open(image_name(digest), 'rb')
+
+
+def image_exists(digest):
+    return get_storage().exists(image_name(digest))
+
+
+def stored_modules(digest):
+    """Read the module matrix back out of a stored image.
+
+    Stored images use the download preset, so sampling the middle of each
+    box is much cheaper than encoding the URL again.
+    """
+    from PIL import Image
+
+    box_size, border = PRESETS['download']['box_size'], PRESETS['download']['border']
+    with open_image(digest) as f:
+        image = Image.open(f).convert('L')
+    boxes = image.width // box_size
+    pixels = image.resize((boxes, boxes), Image.NEAREST).tobytes()
+    return [
+        [pixels[y * boxes + x] < 128 for x in range(border, boxes - border)]
+        for y in range(border, boxes - border)
+    ]
+
+
+# Other sizes and formats are derived from a stored image on first request
+# and kept next to it. They inherit its immutability, since the digest
+# pins the URL the code was rendered from.
+
+def variant_name(digest, preset, fmt):
+    return f"variants/{digest[:2]}/{digest}/{preset}-{settings.QR_ERROR_CORRECTION}.{fmt}"
+
+
+def get_variant(digest, preset, fmt, url_for_digest):
+    """Open a stored variant, rendering it from `url_for_digest()` if missing.
+
+    Returns None if the digest is unknown.
+    """
+    storage = get_storage()
+    name = variant_name(digest, preset, fmt)
+    if not storage.exists(name):
+        url = url_for_digest(digest)
+        if url is None:
+            return None
+        save_once(name, render(url, preset, fmt))
+    return storage.open(name, 'rb')
+
+
+def render_many(urls, executor=None):
+    """Render and store a PNG per URL, in `executor` if given.
+
+    Returns a digest per URL, or the exception raised while rendering it.
+    """
+    if executor is None:
+        results = []
+        for url in urls:
+            try:
+                results.append(render_png(url))
+            except Exception as e:
+                results.append(e)
+    else:
+        futures = [executor.submit(render_png, url) for url in urls]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+
+    return [result if isinstance(result, Exception) else store_image(result) for result in results]
@@ -0,0 +1,143 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Product
+
+SEARCH_PAGE_SIZE = 20
+MAX_TERMS = 8
+
+# Highlight markers that are escaped along with the snippet and then turned
+# into <mark> tags, so user text never reaches the page unescaped.
+MARK_START = '⦃'
+MARK_END = '⦄'
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    """Every term must match, the last one also as a prefix."""
+    if connection.vendor == 'postgresql':
+        return ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def highlight(snippet):
+    return escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+# Rank first, then build highlights and snippets for the page rows only;
+# snippet() is costly and would otherwise run for every match.
+SQLITE_SEARCH = f"""
+    WITH page AS (
+        SELECT products_product_fts.rowid AS id, bm25(products_product_fts, 10.0, 1.0) AS rank
+        FROM products_product_fts
+        JOIN products_product p ON p.id = products_product_fts.rowid
+        WHERE products_product_fts MATCH %s AND p.owner_id = %s
+        ORDER BY rank, id
+        LIMIT %s OFFSET %s
+    )
+    SELECT page.id,
+           highlight(products_product_fts, 0, '{MARK_START}', '{MARK_END}'),
+           snippet(products_product_fts, 1, '{MARK_START}', '{MARK_END}', '…', 16),
+           page.rank
+    FROM page CROSS JOIN products_product_fts ON products_product_fts.rowid = page.id
+    WHERE products_product_fts MATCH %s
+    ORDER BY page.rank, page.id
+"""
+
+# Likewise, headlines are worked out for the requested page only.
+POSTGRESQL_SEARCH = f"""
+    SELECT page.id,
+           ts_headline('simple', p.name, page.query, 'StartSel={MARK_START}, StopSel={MARK_END}, HighlightAll=true'),
+           ts_headline('simple', p.text_description, page.query,
+                       'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=16, MinWords=6'),
+           page.rank
+    FROM (
+        SELECT p.id, q.query, ts_rank(p.search_vector, q.query) AS rank
+        FROM products_product p, to_tsquery('simple', %s) AS q(query)
+        WHERE p.search_vector @@ q.query AND p.owner_id = %s
+        ORDER BY rank DESC, p.id
+        LIMIT %s OFFSET %s
+    ) page
+    JOIN products_product p ON p.id = page.id
+    ORDER BY page.rank DESC, page.id
+"""
+
+
+def _substring_match(terms):
+    # For backends without a full-text index
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(text_description__icontains=term)
+    return condition
+
+
+def _fallback_rows(owner, terms, limit, offset):
+    products = Product.objects.filter(_substring_match(terms), owner=owner).order_by('name', 'pk')
+    rows = products.values_list('pk', 'name', 'text_description')[offset:offset + limit]
+    return [(pk, name, description[:120], 0) for pk, name, description in rows]
+
+
+def search_products(owner, query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """One page of `owner`'s products matching `query`, best match first.
+
+    Returns (products, has_next). Each product carries `search_name` and
+    `search_snippet` as HTML with <mark> around the matched words.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    # One extra row tells us whether there is a next page
+    limit, offset = page_size + 1, (page - 1) * page_size
+    if connection.vendor in ('sqlite', 'postgresql'):
+        expression = match_expression(terms)
+        if connection.vendor == 'sqlite':
+            sql, params = SQLITE_SEARCH, [expression, owner.pk, limit, offset, expression]
+        else:
+            sql, params = POSTGRESQL_SEARCH, [expression, owner.pk, limit, offset]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    else:
+        rows = _fallback_rows(owner, terms, limit, offset)
+
+    rows, has_next = rows[:page_size], len(rows) > page_size
+    products = Product.objects.select_related('qr_code').defer('qr_code__image_data').in_bulk([row[0] for row in rows])
+
+    results = []
+    for pk, name, snippet, rank in rows:
+        product = products.get(pk)
+        if product is None:
+            # Deleted since the search ran
+            continue
+        product.search_name = highlight(name)
+        product.search_snippet = highlight(snippet)
+        product.search_rank = rank
+        results.append(product)
+    return results, has_next
+
+
+def filter_products(queryset, query):
+    """Narrow a Product queryset to full-text matches of `query`, unranked."""
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    if connection.vendor == 'sqlite':
+        matches = RawSQL(
+            'SELECT rowid FROM products_product_fts WHERE products_product_fts MATCH %s', [match_expression(terms)]
+        )
+    elif connection.vendor == 'postgresql':
+        matches = RawSQL(
+            "SELECT id FROM products_product WHERE search_vector @@ to_tsquery('simple', %s)",
+            [match_expression(terms)],
+        )
+    else:
+        return queryset.filter(_substring_match(terms))
+    return queryset.filter(pk__in=matches)
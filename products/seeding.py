@@ -0,0 +1,77 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from .caching import TEMPLATES, bump_dashboard
+from .importers import import_products
+from .models import Template
+
+# Made-up but realistic catalogs for load tests: grocery names, labelled
+# descriptions of varying length, and a handful of folders per user with
+# some products left uncategorized. The same seed always gives the same
+# names, descriptions and folders, so runs on different commits measure the
+# same data; only slugs and short codes are random.
+
+ADJECTIVES = 'organic fresh frozen smoked salted unsalted sweet spicy plain whole light'.split()
+FOODS = (
+    'tomato soup pasta penne rice beans lentils chickpeas spinach carrots potatoes apples bananas oranges '
+    'lemons mangoes chicken beef salmon tuna tofu eggs yoghurt oats honey vinegar mustard ketchup bread '
+    'cheese milk butter flour sugar coffee tea crackers cereal peanut-butter jam'
+).split()
+SIZES = ['200 g', '400 g', '500 g', '1 kg', '250 ml', '500 ml', '1 l', 'pack of 6', 'family size']
+ALLERGENS = ['milk', 'eggs', 'peanuts', 'tree nuts', 'soy', 'wheat', 'fish', 'shellfish', 'sesame']
+AISLES = ['Produce', 'Dairy', 'Bakery', 'Pantry', 'Frozen', 'Snacks', 'Drinks', 'Household', 'Deli', 'Canned']
+
+TEMPLATE_CONTENT = 'Ingredients: [blank][Ingredients]\nAllergens: [blank][Allergens]\nStorage: [blank][Storage]'
+
+
+def folder_names(count):
+    return [f'{AISLES[i % len(AISLES)]} {i // len(AISLES) + 1}' for i in range(count)]
+
+
+def product_rows(rng, count, folders):
+    """Yield (row_number, data) pairs as read_rows would, for import_products."""
+    # One slot in every len(folders) + 1 stays uncategorized
+    slots = folders + ['']
+    for row_number in range(1, count + 1):
+        food = rng.choice(FOODS).replace('-', ' ')
+        description = [
+            f'{rng.choice(ADJECTIVES).capitalize()} {food}, {rng.choice(SIZES)}.',
+            f"Ingredients: {', '.join(rng.sample(FOODS, rng.randint(2, 8))).replace('-', ' ')}.",
+            f"Allergens: {', '.join(rng.sample(ALLERGENS, rng.randint(0, 3))) or 'none'}.",
+        ]
+        if rng.random() < 0.3:
+            description.append('Store in a cool, dry place. Once opened, keep refrigerated and use within 3 days.')
+        yield row_number, {
+            'name': f'{rng.choice(ADJECTIVES).capitalize()} {food} {row_number}',
+            'text_description': '\n'.join(description),
+            'folder': rng.choice(slots),
+        }
+
+
+def seed_catalog(users, products_per_user, folders_per_user, templates, seed=0, prefix='bench', render=False, workers=None):
+    """Create users named `prefix`0, `prefix`1, ... with a catalog each.
+
+    Products go through the bulk import path. With render=False their QR
+    codes are left to the QR worker. Every user's password is `prefix`.
+    Returns the created users.
+    """
+    rng = random.Random(seed)
+    # Hashing once keeps seeding fast; the users still log in normally
+    password = make_password(prefix)
+    owners = User.objects.bulk_create(
+        [User(username=f'{prefix}{i}', password=password) for i in range(users)]
+    )
+    # bulk_create doesn't return ids on every backend
+    owners = list(User.objects.filter(username__in=[owner.username for owner in owners]).order_by('pk'))
+
+    Template.objects.bulk_create(
+        [Template(name=f'{prefix} template {i}', content=TEMPLATE_CONTENT) for i in range(templates)]
+    )
+    bump_dashboard(None, TEMPLATES)
+
+    folders = folder_names(folders_per_user)
+    for owner in owners:
+        import_products(owner, product_rows(rng, products_per_user, folders), render=render, workers=workers)
+    return owners
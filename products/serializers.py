@@ -0,0 +1,76 @@
+from rest_framework import serializers
+
+from .merge import compile_template
+from .models import Folder, Product, QRCode, Template
+
+
+class SparseFieldsMixin:
+    """Drop the fields not listed in ?fields=a,b,c, if given."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+        if fields:
+            wanted = set(fields.split(','))
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+class FolderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Folder
+        fields = ('id', 'name', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    folder = serializers.PrimaryKeyRelatedField(queryset=Folder.objects.none(), allow_null=True, required=False)
+    listen_url = serializers.SerializerMethodField()
+    qr_code = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = (
+            'id', 'name', 'text_description', 'folder', 'position',
+            'unique_slug', 'short_code', 'listen_url', 'created_at', 'updated_at', 'qr_code',
+        )
+        read_only_fields = ('unique_slug', 'short_code', 'created_at', 'updated_at')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if 'folder' in self.fields and request is not None:
+            self.fields['folder'].queryset = Folder.objects.filter(owner=request.user)
+
+    def get_listen_url(self, product):
+        try:
+            return product.qr_code.public_url
+        except QRCode.DoesNotExist:
+            return None
+
+    def get_qr_code(self, product):
+        try:
+            qr_code = product.qr_code
+        except QRCode.DoesNotExist:
+            return None
+
+        build = self.context['request'].build_absolute_uri
+        return {
+            'pending': qr_code.is_pending,
+            'image_hash': qr_code.image_hash or None,
+            'image_url': build(qr_code.image_url) if qr_code.image_hash else None,
+            'thumbnail_url': build(qr_code.thumbnail_url) if qr_code.image_hash else None,
+            'svg_url': build(qr_code.variant_url('print', 'svg')) if qr_code.image_hash else None,
+        }
+
+
+class TemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    placeholders = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Template
+        fields = ('id', 'name', 'content', 'placeholders')
+
+    def get_placeholders(self, template):
+        return compile_template(template.content).fields
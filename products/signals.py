@@ -0,0 +1,75 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import FOLDERS, TEMPLATES, UNCATEGORIZED, bump_dashboard, folder_scope, invalidate_listen_page
+from .models import DashboardVersion, Folder, Product, QRCode, Template
+from .slug_index import slug_index
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def drop_cached_listen_page(sender, instance, **kwargs):
+    invalidate_listen_page(instance)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    slug_index.remember(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    slug_index.forget(instance)
+
+
+# Dashboard fragment versions. Bulk writes that skip these signals bump
+# versions themselves.
+
+@receiver(post_save, sender=Product)
+def bump_saved_product_dashboard(sender, instance, created, **kwargs):
+    scopes = [folder_scope(instance.folder_id)]
+    old_folder_id = getattr(instance, '_loaded_folder_id', instance.folder_id)
+    # Folder counts only change when products come, go or move
+    if created:
+        scopes.append(FOLDERS)
+    elif old_folder_id != instance.folder_id:
+        scopes += [FOLDERS, folder_scope(old_folder_id)]
+    instance._loaded_folder_id = instance.folder_id
+    bump_dashboard(instance.owner_id, *scopes)
+
+
+@receiver(post_delete, sender=Product)
+def bump_deleted_product_dashboard(sender, instance, **kwargs):
+    bump_dashboard(instance.owner_id, FOLDERS, folder_scope(instance.folder_id))
+
+
+@receiver(post_save, sender=QRCode)
+def bump_qr_code_dashboard(sender, instance, **kwargs):
+    product = instance.linked_product
+    bump_dashboard(product.owner_id, folder_scope(product.folder_id))
+
+
+@receiver(post_save, sender=Folder)
+def bump_folder_dashboard(sender, instance, **kwargs):
+    bump_dashboard(instance.owner_id, FOLDERS)
+
+
+@receiver(pre_delete, sender=Folder)
+def uncategorize_folder_products(sender, instance, **kwargs):
+    # on_delete=SET_NULL leaves updated_at alone, so ?since= syncs would
+    # never see these products lose their folder
+    Product.objects.filter(folder=instance).update(folder=None, updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Folder)
+def drop_folder_dashboard(sender, instance, **kwargs):
+    # Its products fall back to uncategorized
+    bump_dashboard(instance.owner_id, FOLDERS, UNCATEGORIZED)
+    DashboardVersion.objects.filter(owner=instance.owner_id, scope=folder_scope(instance.pk)).delete()
+
+
+@receiver(post_save, sender=Template)
+@receiver(post_delete, sender=Template)
+def bump_template_dashboard(sender, instance, **kwargs):
+    bump_dashboard(None, TEMPLATES)
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Set membership in a fixed bit array: no false negatives, ~1% false positives."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1024)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def updated_marker(product):
+    return product.updated_at.timestamp()
+
+
+# Catch-ups re-read rows updated this long before the previous one started,
+# so an edit whose transaction committed late is still picked up
+UPDATE_OVERLAP = timedelta(seconds=5)
+
+
+class SlugIndex:
+    """Per-process index of listen identifiers (slugs and short codes).
+
+    A Bloom filter over every identifier answers "definitely not a product"
+    without a query, and a bounded LRU maps recently served identifiers to
+    (pk, updated marker), so a cached listen page can be checked for
+    freshness without a query. Changes made by other workers arrive through
+    a rate-limited query for new and recently updated rows, and a periodic
+    rebuild, which also drops deleted products.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._recent = OrderedDict()
+        self._max_pk = 0
+        self._updated_since = None
+        self._built_at = 0.0
+        self._caught_up_at = 0.0
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        updated_since = timezone.now() - UPDATE_OVERLAP
+        # Leave room for growth until the next rebuild
+        bloom = BloomFilter(Product.objects.count() * 4)
+        recent_pks = {pk for pk, _ in self._recent.values()}
+        markers = {}
+        max_pk = 0
+
+        rows = Product.objects.values_list('pk', 'unique_slug', 'short_code', 'updated_at').order_by()
+        for pk, unique_slug, short_code, updated_at in rows.iterator(chunk_size=2000):
+            bloom.add(unique_slug)
+            if short_code:
+                bloom.add(short_code)
+            if pk in recent_pks:
+                markers[pk] = updated_at.timestamp()
+            max_pk = max(max_pk, pk)
+
+        self._recent = OrderedDict(
+            (identifier, (pk, markers[pk])) for identifier, (pk, _) in self._recent.items() if pk in markers
+        )
+        self._filter = bloom
+        self._max_pk = max_pk
+        self._updated_since = updated_since
+        self._built_at = self._caught_up_at = time.monotonic()
+
+    def warm(self):
+        """Build the index at worker startup, if the database is reachable."""
+        try:
+            self.rebuild()
+        except DatabaseError:
+            logger.exception("Could not warm the slug index; it will be built on first use.")
+        finally:
+            connections.close_all()
+
+    def _refresh(self):
+        if self._filter is None:
+            self.rebuild()
+        elif time.monotonic() - self._built_at >= settings.SLUG_INDEX_REBUILD_INTERVAL:
+            # One thread rebuilds while the others keep using the old index
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._rebuild()
+                except DatabaseError:
+                    logger.exception("Could not rebuild the slug index; keeping the current one.")
+                    self._built_at = time.monotonic()
+                finally:
+                    self._lock.release()
+
+    def _catch_up(self):
+        """Pick up rows created or edited by other workers, at most once per interval."""
+        with self._lock:
+            if time.monotonic() - self._caught_up_at < settings.SLUG_INDEX_CATCHUP_INTERVAL:
+                return False
+            self._caught_up_at = time.monotonic()
+
+            updated_since, self._updated_since = self._updated_since, timezone.now() - UPDATE_OVERLAP
+            rows = Product.objects.filter(Q(pk__gt=self._max_pk) | Q(updated_at__gte=updated_since))
+            for pk, unique_slug, short_code, updated_at in rows.values_list(
+                'pk', 'unique_slug', 'short_code', 'updated_at'
+            ):
+                for identifier in (unique_slug, short_code):
+                    if not identifier:
+                        continue
+                    self._filter.add(identifier)
+                    if identifier in self._recent:
+                        self._recent[identifier] = (pk, updated_at.timestamp())
+                self._max_pk = max(self._max_pk, pk)
+            return True
+
+    def _due(self):
+        now = time.monotonic()
+        return (
+            self._filter is None
+            or now - self._built_at >= settings.SLUG_INDEX_REBUILD_INTERVAL
+            or now - self._caught_up_at >= settings.SLUG_INDEX_CATCHUP_INTERVAL
+        )
+
+    def is_missing(self, identifier):
+        """True only if no product has this slug or short code."""
+        self._refresh()
+        if identifier in self._recent or identifier in self._filter:
+            return False
+        # Possibly created by another worker since the last rebuild
+        if self._catch_up():
+            return identifier not in self._filter
+        return True
+
+    async def ais_missing(self, identifier):
+        """is_missing for async views; only goes to a thread when it has to query."""
+        now = time.monotonic()
+        if self._filter is not None and now - self._built_at < settings.SLUG_INDEX_REBUILD_INTERVAL:
+            if identifier in self._recent or identifier in self._filter:
+                return False
+            if now - self._caught_up_at < settings.SLUG_INDEX_CATCHUP_INTERVAL:
+                return True
+        return await sync_to_async(self.is_missing)(identifier)
+
+    def get(self, identifier):
+        """(pk, updated marker) for a recently served identifier, else None.
+
+        Catches up with other workers first when that is due, so a marker
+        is at most SLUG_INDEX_CATCHUP_INTERVAL seconds behind the database.
+        """
+        self._refresh()
+        self._catch_up()
+        return self._recent.get(identifier)
+
+    async def aget(self, identifier):
+        """get for async views; only goes to a thread when it has to query."""
+        if self._due():
+            return await sync_to_async(self.get)(identifier)
+        return self._recent.get(identifier)
+
+    def remember(self, product):
+        with self._lock:
+            entry = (product.pk, updated_marker(product))
+            for identifier in (product.unique_slug, product.short_code):
+                if not identifier:
+                    continue
+                if self._filter is not None:
+                    self._filter.add(identifier)
+                self._recent[identifier] = entry
+                self._recent.move_to_end(identifier)
+
+            while len(self._recent) > settings.SLUG_INDEX_SIZE:
+                self._recent.popitem(last=False)
+
+    def add_many(self, products):
+        """Record products created without save signals, e.g. by bulk_create."""
+        with self._lock:
+            if self._filter is None:
+                return
+            for product in products:
+                self._filter.add(product.unique_slug)
+                if product.short_code:
+                    self._filter.add(product.short_code)
+
+    def forget(self, product):
+        # The filter can't drop keys; the next rebuild clears them
+        with self._lock:
+            self._recent.pop(product.unique_slug, None)
+            self._recent.pop(product.short_code, None)
+
+
+slug_index = SlugIndex()
@@ -0,0 +1,41 @@
+import re
+
+# Listen pages speak a description one chunk at a time, so the first words
+# start without waiting for the whole text to be synthesized, pause and
+# resume work per sentence, and long labels stay under the length some
+# browsers stop speaking at. Each line of the description is a section
+# (skip forward and back move between them) and each section a list of
+# sentences. Chunks are worked out when the product is saved.
+
+# Sentence ends: . ! ? or … then whitespace and something that starts a
+# sentence, so "approx. 5 g" and "1.5 l" stay whole
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+(?=[A-Z"“‘\'(\[])')
+# Where an over-long sentence may be broken, keeping the punctuation
+CLAUSE_END = re.compile(r'(?<=[,;:])\s+')
+MAX_CHUNK = 200
+
+
+def split_long(sentence):
+    if len(sentence) <= MAX_CHUNK:
+        return [sentence]
+    chunks = []
+    current = ''
+    for clause in CLAUSE_END.split(sentence):
+        if current and len(current) + 1 + len(clause) > MAX_CHUNK:
+            chunks.append(current)
+            current = clause
+        else:
+            current = f'{current} {clause}' if current else clause
+    chunks.append(current)
+    return chunks
+
+
+def split_chunks(text):
+    """[[sentence, ...], ...]: one list per non-blank line of `text`."""
+    sections = []
+    for line in (text or '').split('\n'):
+        line = ' '.join(line.split())
+        if not line:
+            continue
+        sections.append([chunk for sentence in SENTENCE_END.split(line) for chunk in split_long(sentence)])
+    return sections
@@ -1,16 +1,30 @@
 document.addEventListener('DOMContentLoaded', function () {
+    // Pending QR codes are polled every QR_POLL_INTERVAL ms, backing off to
+    // QR_POLL_MAX_INTERVAL while nothing changes. After QR_POLL_MAX_ATTEMPTS
+    // such polls in a row, e.g. with no QR worker running, polling stops.
+    const QR_POLL_INTERVAL = 2000;
+    const QR_POLL_MAX_INTERVAL = 30000;
+    const QR_POLL_MAX_ATTEMPTS = 20;
+
     // Handles dashboard interactions
     class Dashboard {
         constructor(config) {
             this.urls = config.urls;
             this.csrfToken = config.csrfToken;
+            this.qrPollMisses = 0;
+            this.qrPollSeen = new Set();
 
             this.initTabs();
             this.initCreateTabs();
             this.initModals();
             this.initDragAndDrop();
+            this.initBulkDelete();
+            this.initSelectionExport();
+            this.initProductSearch();
             this.initPreviewButtons();
             this.initFolderToggles();
+            this.initLoadMore();
+            this.pollPendingQRCodes();
             this.handleUrlParams();
 
             this.initTemplateCreation();
@@ -18,6 +32,7 @@ document.addEventListener('DOMContentLoaded', function () {
             this.initFormValidation();
             this.initTemplateSearch();
             this.initProductCreation();
+            this.initProductImport();
         }
 
         initTabs() {
@@ -109,36 +124,198 @@ document.addEventListener('DOMContentLoaded', function () {
             new Sortable(grid, {
                 group: 'shared',
                 animation: 150,
+                filter: '.card-select',
+                preventOnFilter: false,
                 onEnd: (evt) => this.handleDrop(evt),
             });
         }
 
         handleDrop(evt) {
-            const productId = evt.item.dataset.id;
-            const toFolderId = evt.to.dataset.folderId;
+            // Folders load a page at a time, so send the card the dropped one
+            // now follows and let the server renumber the whole folder.
+            // Drops made in quick succession go in one batch, in order.
+            this.pendingMoves = this.pendingMoves || [];
+            this.movedGrids = this.movedGrids || new Set();
+            const card = evt.item;
+            let previous = card.previousElementSibling;
+            while (previous && !previous.classList.contains('grid-item')) {
+                previous = previous.previousElementSibling;
+            }
+            this.pendingMoves.push({
+                product_id: card.dataset.id,
+                folder_id: evt.to.dataset.folderId === 'null' ? null : evt.to.dataset.folderId,
+                after: previous ? previous.dataset.id : null,
+            });
+            this.movedGrids.add(evt.from).add(evt.to);
+
+            clearTimeout(this.moveTimer);
+            this.moveTimer = setTimeout(() => this.flushMoves(), 400);
 
-            fetch(this.urls.updateProductFolder, {
+            requestAnimationFrame(() => this.refreshFolderHeight(evt.to));
+        }
+
+        flushMoves() {
+            if (!this.pendingMoves || this.pendingMoves.length === 0) return;
+            const moves = this.pendingMoves;
+            const grids = this.movedGrids;
+            this.pendingMoves = [];
+            this.movedGrids = new Set();
+
+            this.sendBatch({ moves })
+                .then((data) => {
+                    if (data.status !== 'ok') {
+                        throw new Error(data.message);
+                    }
+                })
+                .catch((error) => {
+                    alert('Could not move: ' + (error.message || 'please try again'));
+                    // Put the cards back where the server still has them
+                    grids.forEach((grid) => this.reloadGrid(grid));
+                });
+        }
+
+        sendBatch(payload) {
+            return fetch(this.urls.productBatch, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                     'X-CSRFToken': this.csrfToken,
                 },
-                body: JSON.stringify({
-                    product_id: productId,
-                    folder_id: toFolderId === 'null' ? null : toFolderId,
-                }),
+                body: JSON.stringify(payload),
+            }).then((response) => {
+                // Errors from outside the view, e.g. CSRF failures, are HTML pages
+                if (!(response.headers.get('Content-Type') || '').includes('application/json')) {
+                    throw new Error(`the server returned ${response.status}`);
+                }
+                return response.json();
+            });
+        }
+
+        reloadGrid(grid) {
+            grid.querySelectorAll('.grid-item').forEach((card) => card.remove());
+            grid.dataset.loaded = 'true';
+            grid.dataset.nextPage = 1;
+            this.loadProducts(grid);
+        }
+
+        // Select several cards and delete them in one request
+        initBulkDelete() {
+            const button = document.getElementById('delete-selected-btn');
+            const catalog = document.getElementById('catalog');
+
+            catalog.addEventListener('change', (event) => {
+                if (event.target.classList.contains('card-select')) {
+                    const count = catalog.querySelectorAll('.card-select:checked').length;
+                    button.disabled = count === 0;
+                    button.textContent = count ? `Delete selected (${count})` : 'Delete selected';
+                }
             });
 
-            requestAnimationFrame(() => {
-                const toGrid = evt.to;
-                if (toGrid.parentElement.classList.contains('folder-content')) {
-                    const folderContent = toGrid.parentElement;
-                    const folderHeader = folderContent.previousElementSibling;
-                    if (folderHeader.classList.contains('open')) {
-                        folderContent.style.maxHeight = `${folderContent.scrollHeight}px`;
+            button.addEventListener('click', () => {
+                const cards = Array.from(catalog.querySelectorAll('.card-select:checked'))
+                    .map((checkbox) => checkbox.closest('.grid-item'));
+                if (cards.length === 0 || !confirm(`Delete ${cards.length} products?`)) return;
+
+                this.flushMoves();
+                this.sendBatch({ delete: cards.map((card) => card.dataset.id) }).then((data) => {
+                    if (data.status === 'ok') {
+                        cards.forEach((card) => card.remove());
+                        button.disabled = true;
+                        button.textContent = 'Delete selected';
+                    } else {
+                        alert('Could not delete: ' + data.message);
                     }
+                }).catch((error) => {
+                    alert('Could not delete: ' + error.message);
+                });
+            });
+        }
+
+        // Download the selected cards' QR codes as one ZIP
+        initSelectionExport() {
+            const button = document.getElementById('export-selected-btn');
+            const catalog = document.getElementById('catalog');
+            const selected = () => Array.from(catalog.querySelectorAll('.card-select:checked'))
+                .map((checkbox) => checkbox.closest('.grid-item').dataset.id);
+
+            catalog.addEventListener('change', (event) => {
+                if (event.target.classList.contains('card-select')) {
+                    const count = selected().length;
+                    button.disabled = count === 0;
+                    button.textContent = count ? `Export selected (${count})` : 'Export selected';
                 }
             });
+
+            button.addEventListener('click', () => {
+                const ids = selected();
+                if (ids.length === 0) return;
+                window.location.href = `${this.urls.selectionExport}?products=${ids.join(',')}`;
+            });
+        }
+
+        initProductSearch() {
+            const input = document.getElementById('product-search');
+            const panel = document.getElementById('search-results');
+            const list = panel.querySelector('.search-result-list');
+            const more = panel.querySelector('.search-more-btn');
+            let timer = null;
+            let query = '';
+            let nextPage = null;
+
+            const load = (page) => {
+                const requested = query;
+                fetch(`${this.urls.productSearch}?q=${encodeURIComponent(requested)}&page=${page}`, {
+                    headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                })
+                    .then((response) => response.json())
+                    .then((data) => {
+                        // Ignore replies to queries the user has typed past
+                        if (requested !== query) return;
+                        if (page === 1) list.replaceChildren();
+                        data.products.forEach((product) => list.appendChild(this.buildSearchResult(product)));
+                        if (page === 1 && data.products.length === 0) {
+                            const empty = document.createElement('li');
+                            empty.className = 'no-results';
+                            empty.textContent = 'No products found.';
+                            list.appendChild(empty);
+                        }
+                        nextPage = data.next_page;
+                        more.hidden = !nextPage;
+                        panel.hidden = false;
+                    });
+            };
+
+            input.addEventListener('input', () => {
+                clearTimeout(timer);
+                timer = setTimeout(() => {
+                    query = input.value.trim();
+                    if (!query) {
+                        panel.hidden = true;
+                        list.replaceChildren();
+                        return;
+                    }
+                    load(1);
+                }, 250);
+            });
+
+            more.addEventListener('click', () => {
+                if (nextPage) load(nextPage);
+            });
+        }
+
+        buildSearchResult(product) {
+            const item = document.createElement('li');
+            item.className = 'search-result';
+            // name_html and snippet_html are escaped server-side, with <mark> around matches
+            item.innerHTML = `
+                <a class="search-result-name"></a>
+                <p class="search-result-snippet"></p>
+            `;
+            const link = item.querySelector('a');
+            link.href = product.edit_url;
+            link.innerHTML = product.name_html;
+            item.querySelector('p').innerHTML = product.snippet_html;
+            return item;
         }
 
         // Play text-to-speech previews
@@ -149,11 +326,12 @@ document.addEventListener('DOMContentLoaded', function () {
                 this.speak(text);
             });
 
-            document.querySelectorAll('.preview-btn').forEach((button) => {
-                button.addEventListener('click', (event) => {
-                    const description = event.currentTarget.closest('.grid-item').dataset.description;
-                    this.speak(description);
-                });
+            // Delegated so cards loaded later get previews too
+            document.getElementById('catalog').addEventListener('click', (event) => {
+                const button = event.target.closest('.preview-btn');
+                if (button) {
+                    this.speak(button.closest('.grid-item').dataset.description);
+                }
             });
         }
 
@@ -173,16 +351,134 @@ document.addEventListener('DOMContentLoaded', function () {
         }
 
         initSingleFolderToggle(header) {
-            header.addEventListener('click', function (event) {
+            header.addEventListener('click', (event) => {
                 if (!event.target.closest('.folder-actions')) {
                     const isOpen = header.classList.toggle('open');
                     header.setAttribute('aria-expanded', isOpen);
                     const content = header.nextElementSibling;
+                    const grid = content.querySelector('.grid-container');
+
+                    if (isOpen && !grid.dataset.loaded) {
+                        grid.dataset.loaded = 'true';
+                        this.loadProducts(grid);
+                    }
                     content.style.maxHeight = content.style.maxHeight ? null : `${content.scrollHeight}px`;
                 }
             });
         }
 
+        // Fetch folder contents one page at a time
+        initLoadMore() {
+            document.querySelectorAll('.load-more-btn').forEach((button) => {
+                button.addEventListener('click', () => {
+                    this.loadProducts(document.getElementById(button.dataset.grid));
+                });
+            });
+        }
+
+        loadProducts(grid) {
+            const page = grid.dataset.nextPage;
+            if (!page) return;
+            delete grid.dataset.nextPage;
+
+            fetch(`${grid.dataset.productsUrl}?page=${page}`, {
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            })
+                .then((response) => response.json())
+                .then((data) => {
+                    data.products.forEach((product) => {
+                        // Cards dropped in before the folder was opened are already here
+                        if (!grid.querySelector(`.grid-item[data-id='${product.pk}']`)) {
+                            grid.appendChild(this.buildProductCard(product));
+                        }
+                    });
+
+                    if (data.next_page) {
+                        grid.dataset.nextPage = data.next_page;
+                    }
+                    this.pollPendingQRCodes();
+
+                    const button = document.querySelector(`.load-more-btn[data-grid='${grid.id}']`);
+                    if (button) {
+                        button.hidden = !data.next_page;
+                    }
+                    this.refreshFolderHeight(grid);
+                });
+        }
+
+        // QR images render in the background; swap them in once ready
+        pollPendingQRCodes() {
+            if (this.qrPollTimer) return;
+
+            const pending = Array.from(document.querySelectorAll('.grid-item .qr-pending:not(.qr-failed)'))
+                .map((placeholder) => placeholder.closest('.grid-item').dataset.id);
+            if (pending.length === 0) return;
+
+            // Newly added cards get a fresh set of attempts
+            if (pending.some((pk) => !this.qrPollSeen.has(pk))) {
+                pending.forEach((pk) => this.qrPollSeen.add(pk));
+                this.qrPollMisses = 0;
+            }
+            if (this.qrPollMisses >= QR_POLL_MAX_ATTEMPTS) return;
+
+            const delay = Math.min(QR_POLL_INTERVAL * 1.5 ** this.qrPollMisses, QR_POLL_MAX_INTERVAL);
+            this.qrPollTimer = setTimeout(() => {
+                fetch(`${this.urls.qrStatus}?products=${pending.join(',')}`, {
+                    headers: { 'X-Requested-With': 'XMLHttpRequest' },
+                })
+                    .then((response) => {
+                        if (!response.ok) throw new Error(`QR status returned ${response.status}`);
+                        return response.json();
+                    })
+                    .then((data) => {
+                        const images = Object.entries(data.images);
+                        images.forEach(([pk, urls]) => {
+                            const card = document.querySelector(`.grid-item[data-id='${pk}']`);
+                            if (card) this.showQRImage(card, urls);
+                        });
+                        data.failed.forEach((pk) => {
+                            const card = document.querySelector(`.grid-item[data-id='${pk}']`);
+                            if (card) this.showQRFailed(card);
+                        });
+                        this.qrPollMisses = images.length || data.failed.length ? 0 : this.qrPollMisses + 1;
+                    })
+                    .catch(() => {
+                        this.qrPollMisses += 1;
+                    })
+                    .finally(() => {
+                        this.qrPollTimer = null;
+                        this.pollPendingQRCodes();
+                    });
+            }, delay);
+        }
+
+        showQRFailed(card) {
+            const placeholder = card.querySelector('.qr-pending');
+            if (!placeholder) return;
+            placeholder.classList.add('qr-failed');
+            placeholder.textContent = 'QR code could not be generated.';
+        }
+
+        showQRImage(card, { image_url: imageUrl, thumbnail_url: thumbnailUrl }) {
+            const placeholder = card.querySelector('.qr-pending');
+            if (placeholder) placeholder.remove();
+
+            const img = card.querySelector('img');
+            img.src = thumbnailUrl;
+            img.hidden = false;
+
+            const download = card.querySelector('.download-link');
+            download.href = imageUrl;
+            download.hidden = false;
+        }
+
+        refreshFolderHeight(grid) {
+            const content = grid.parentElement;
+            if (content.classList.contains('folder-content') && content.style.maxHeight) {
+                content.style.maxHeight = `${content.scrollHeight}px`;
+            }
+        }
+
         handleUrlParams() {
             const tabToOpen = new URLSearchParams(window.location.search).get('tab') || 'catalog';
             this.openTab(tabToOpen);
@@ -276,6 +572,14 @@ document.addEventListener('DOMContentLoaded', function () {
                         ${folder.name}
                     </span>
                     <div class="folder-actions">
+                        <a href="${folder.sheet_url}" class="btn-icon" title="Print QR Sheet">
+                            <svg viewBox="0 0 24 24"><path d="M19 8H5c-1.66 0-3 1.34-3 3v6h4v4h12v-4h4v-6c0-1.66-1.34-3-3-3zm-3 11H8v-5h8v5zm3-7c-.55 0-1-.45-1-1s.45-1 1-1 1 .45 1 1-.45 1-1 1zm-1-9H6v4h12V3z"></path></svg>
+                            <span class="sr-only">Print QR Sheet</span>
+                        </a>
+                        <a href="${folder.zip_url}" class="btn-icon" title="Download All QR Codes">
+                            <svg viewBox="0 0 24 24"><path d="M19 9h-4V3H9v6H5l7 7 7-7zM5 18v2h14v-2H5z"></path></svg>
+                            <span class="sr-only">Download All QR Codes</span>
+                        </a>
                         <a href="${folder.edit_url}" class="btn-icon" title="Edit Folder">
                             <svg class="icon-edit" viewBox="0 0 24 24"><path d="M3 17.25V21h3.75L17.81 9.94l-3.75-3.75L3 17.25zM20.71 7.04c.39-.39.39-1.02 0-1.41l-2.34-2.34c-.39-.39-1.02-.39-1.41 0l-1.83 1.83 3.75 3.75 1.83-1.83z"></path></svg>
                             <span class="sr-only">Edit Folder</span>
@@ -290,18 +594,16 @@ document.addEventListener('DOMContentLoaded', function () {
                     </div>
                 </h3>
                 <div class="folder-content" id="folder-content-${folder.pk}">
-                    <div class="grid-container folder-grid" id="folder-${folder.pk}" data-folder-id="${folder.pk}">
+                    <div class="grid-container folder-grid" id="folder-${folder.pk}" data-folder-id="${folder.pk}" data-products-url="${folder.products_url}" data-loaded="true">
                         <!-- cards dropped here -->
                     </div>
                 </div>
             `;
 
-            const uncategorized = Array.from(document.querySelectorAll('.folder-section h3')).find((h3) => {
-                return h3.textContent.trim() === 'Uncategorized';
-            });
+            const uncategorized = document.getElementById('uncategorized-grid');
 
             if (uncategorized) {
-                catalog.insertBefore(section, uncategorized.parentElement);
+                catalog.insertBefore(section, uncategorized.closest('.folder-section'));
             } else {
                 catalog.appendChild(section);
             }
@@ -431,16 +733,56 @@ document.addEventListener('DOMContentLoaded', function () {
             });
         }
 
-        addNewProductToDOM(product) {
-            const uncategorizedGrid = document.getElementById('uncategorized-grid');
+        // Upload a CSV/JSONL file and show the per-row report
+        initProductImport() {
+            const form = document.getElementById('product-import-form');
+            if (!form) return;
+
+            form.addEventListener('submit', (event) => {
+                event.preventDefault();
+                const report = document.getElementById('import-report');
+                report.textContent = 'Importing...';
+
+                fetch(form.action, {
+                    method: 'POST',
+                    body: new FormData(form),
+                    headers: {
+                        'X-CSRFToken': this.csrfToken,
+                        'X-Requested-With': 'XMLHttpRequest',
+                    },
+                })
+                    .then((response) => response.json())
+                    .then((data) => {
+                        if (data.status !== 'ok') {
+                            report.textContent = 'Could not import that file.';
+                            return;
+                        }
+
+                        report.textContent = `Imported ${data.created} products. ${data.failed} rows had errors.`;
+                        const list = document.createElement('ul');
+                        data.errors.forEach((error) => {
+                            const item = document.createElement('li');
+                            const messages = Object.values(error.errors).flat().join(' ');
+                            item.textContent = `Row ${error.row}: ${messages}`;
+                            list.appendChild(item);
+                        });
+                        report.appendChild(list);
+                        form.reset();
+                    });
+            });
+        }
+
+        buildProductCard(product) {
             const card = document.createElement('div');
             card.className = 'grid-item';
             card.dataset.id = product.pk;
             card.dataset.description = product.text_description;
 
             card.innerHTML = `
-                <p><strong>${product.name}</strong></p>
-                <img src="${product.image_data}" alt="QR Code for ${product.name}" width="100">
+                <input type="checkbox" class="card-select">
+                <p><strong></strong></p>
+                <div class="qr-pending" role="status">Generating QR code…</div>
+                <img width="100" hidden>
                 <div class="item-actions">
                     <button class="btn-icon preview-btn" title="Play Audio Preview">
                         <svg class="icon-play" viewBox="0 0 24 24"><path d="M8 5v14l11-7z"></path></svg>
@@ -450,7 +792,7 @@ document.addEventListener('DOMContentLoaded', function () {
                         <svg class="icon-edit" viewBox="0 0 24 24"><path d="M3 17.25V21h3.75L17.81 9.94l-3.75-3.75L3 17.25zM20.71 7.04c.39-.39.39-1.02 0-1.41l-2.34-2.34c-.39-.39-1.02-.39-1.41 0l-1.83 1.83 3.75 3.75 1.83-1.83z"></path></svg>
                         <span class="sr-only">Edit</span>
                     </a>
-                    <a href="${product.image_data}" download="${product.filename}" class="btn-icon" title="Download">
+                    <a class="btn-icon download-link" title="Download" hidden>
                         <svg viewBox="0 0 24 24"><path d="M19 9h-4V3H9v6H5l7 7 7-7zM5 18v2h14v-2H5z"></path></svg>
                         <span class="sr-only">Download QR Code</span>
                     </a>
@@ -464,12 +806,20 @@ document.addEventListener('DOMContentLoaded', function () {
                 </div>
             `;
 
-            uncategorizedGrid.appendChild(card);
+            // Names are user input, so keep them out of innerHTML
+            card.querySelector('strong').textContent = product.name;
+            card.querySelector('.card-select').setAttribute('aria-label', `Select ${product.name}`);
+            card.querySelector('img').alt = `QR Code for ${product.name}`;
+            card.querySelector('.download-link').download = product.filename;
+            if (product.image_url) {
+                this.showQRImage(card, product);
+            }
+            return card;
+        }
 
-            card.querySelector('.preview-btn').addEventListener('click', (event) => {
-                const description = event.currentTarget.closest('.grid-item').dataset.description;
-                this.speak(description);
-            });
+        addNewProductToDOM(product) {
+            document.getElementById('uncategorized-grid').appendChild(this.buildProductCard(product));
+            this.pollPendingQRCodes();
         }
     }
 
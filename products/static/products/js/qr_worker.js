@@ -0,0 +1,26 @@
+// Decodes camera frames for scanner.js off the main thread. Frames arrive
+// as transferred ImageData buffers; each result goes back with its id and
+// how long jsQR took.
+self.onmessage = event => {
+    const message = event.data;
+    if (message.type === 'init') {
+        importScripts(message.jsQRUrl);
+        return;
+    }
+
+    const { id, buffer, width, height } = message;
+    const start = performance.now();
+    let code = null;
+    try {
+        code = jsQR(new Uint8ClampedArray(buffer), width, height, { inversionAttempts: "dontInvert" });
+    } catch (error) {
+        // Always answer, or the scanner waits on this frame forever
+        console.error(error);
+    }
+    self.postMessage({
+        id,
+        decodeMs: performance.now() - start,
+        // Only what the scanner uses; the chunks don't clone cheaply
+        code: code && { data: code.data, location: code.location },
+    });
+};
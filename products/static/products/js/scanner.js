@@ -1,187 +1,363 @@
-document.addEventListener('DOMContentLoaded', () => {
-    class DirectionalBeacon {
-        constructor() {
-            this.audioCtx = null;
-            this.panner = null;
-            this.gainNode = null;
-            this.isInitialized = false;
-        }
+class DirectionalBeacon {
+    constructor() {
+        this.audioCtx = null;
+        this.panner = null;
+        this.gainNode = null;
+        this.isInitialized = false;
+    }
 
-        _initAudio() {
-            if (this.isInitialized) return;
-            try {
-                this.audioCtx = new (window.AudioContext || window.webkitAudioContext)();
-                this.panner = this.audioCtx.createStereoPanner();
-                this.gainNode = this.audioCtx.createGain();
-                this.gainNode.gain.setValueAtTime(0, this.audioCtx.currentTime);
-                this.panner.connect(this.gainNode);
-                this.gainNode.connect(this.audioCtx.destination);
-                this.isInitialized = true;
-            } catch (e) {
-                console.error("Web Audio API is not supported in this browser.", e);
-            }
+    _initAudio() {
+        if (this.isInitialized) return;
+        try {
+            this.audioCtx = new (window.AudioContext || window.webkitAudioContext)();
+            this.panner = this.audioCtx.createStereoPanner();
+            this.gainNode = this.audioCtx.createGain();
+            this.gainNode.gain.setValueAtTime(0, this.audioCtx.currentTime);
+            this.panner.connect(this.gainNode);
+            this.gainNode.connect(this.audioCtx.destination);
+            this.isInitialized = true;
+        } catch (e) {
+            console.error("Web Audio API is not supported in this browser.", e);
         }
+    }
 
-        beep(pan, pitch, duration = 0.15) {
-            if (!this.isInitialized) this._initAudio();
-            if (!this.audioCtx) return;
-
-            const now = this.audioCtx.currentTime;
-            this.panner.pan.setValueAtTime(pan, now);
-            this.gainNode.gain.cancelScheduledValues(now);
-            this.gainNode.gain.setValueAtTime(0, now);
-            this.gainNode.gain.linearRampToValueAtTime(1, now + 0.01);
-            this.gainNode.gain.exponentialRampToValueAtTime(0.0001, now + duration);
-
-            const oscillator = this.audioCtx.createOscillator();
-            oscillator.type = 'sine';
-            oscillator.frequency.setValueAtTime(pitch, now);
-            oscillator.connect(this.panner);
-            oscillator.start(now);
-            oscillator.stop(now + duration);
-        }
+    beep(pan, pitch, duration = 0.15) {
+        if (!this.isInitialized) this._initAudio();
+        if (!this.audioCtx) return;
 
-        playSuccess() {
-            if (!this.isInitialized) this._initAudio();
-            if (!this.audioCtx) return;
-
-            const now = this.audioCtx.currentTime;
-            const oscillator = this.audioCtx.createOscillator();
-            oscillator.type = 'sine';
-            oscillator.frequency.setValueAtTime(1200, now);
-            oscillator.connect(this.audioCtx.destination);
-            oscillator.start(now);
-            oscillator.stop(now + 0.2);
-        }
+        const now = this.audioCtx.currentTime;
+        this.panner.pan.setValueAtTime(pan, now);
+        this.gainNode.gain.cancelScheduledValues(now);
+        this.gainNode.gain.setValueAtTime(0, now);
+        this.gainNode.gain.linearRampToValueAtTime(1, now + 0.01);
+        this.gainNode.gain.exponentialRampToValueAtTime(0.0001, now + duration);
+
+        const oscillator = this.audioCtx.createOscillator();
+        oscillator.type = 'sine';
+        oscillator.frequency.setValueAtTime(pitch, now);
+        oscillator.connect(this.panner);
+        oscillator.start(now);
+        oscillator.stop(now + duration);
     }
 
-    class QRScanner {
-        constructor() {
-            this.video = document.getElementById('camera-feed');
-            this.canvasElement = document.getElementById('canvas');
-            this.canvas = this.canvasElement.getContext('2d');
-            this.statusMessage = document.getElementById('status-message');
-            this.beacon = new DirectionalBeacon();
-            this.scanning = false;
-            this.stream = null;
-            this.lastBeepTime = 0;
-            this.init();
-        }
+    playSuccess() {
+        if (!this.isInitialized) this._initAudio();
+        if (!this.audioCtx) return;
 
-        init() {
-            this.startScanner();
-            window.addEventListener('beforeunload', () => this.stopScanner());
-        }
+        const now = this.audioCtx.currentTime;
+        const oscillator = this.audioCtx.createOscillator();
+        oscillator.type = 'sine';
+        oscillator.frequency.setValueAtTime(1200, now);
+        oscillator.connect(this.audioCtx.destination);
+        oscillator.start(now);
+        oscillator.stop(now + 0.2);
+    }
+}
 
-        drawLine(begin, end, color) {
-            this.canvas.beginPath();
-            this.canvas.moveTo(begin.x, begin.y);
-            this.canvas.lineTo(end.x, end.y);
-            this.canvas.lineWidth = 4;
-            this.canvas.strokeStyle = color;
-            this.canvas.stroke();
-        }
+// Frames are decoded in a worker (qr_worker.js), so jsQR never blocks the
+// beacon's audio scheduling. While searching, whole frames are scaled down
+// to SEARCH_SIZE and sent at a rate that leaves the worker idle half the
+// time. Once a code is found, only the region around it is sent, as often
+// as the worker can take it, until it is lost for ROI_MISSES frames.
+const SEARCH_SIZE = 480;
+const ROI_SIZE = 360;
+// How far the region reaches past the code, in code widths
+const ROI_MARGIN = 1;
+const ROI_MISSES = 3;
+const SEARCH_MIN_INTERVAL = 50;
+const SEARCH_MAX_INTERVAL = 250;
+// A frame the worker hasn't answered by then counts as no code
+const DECODE_TIMEOUT = 1000;
 
-        tick() {
-            if (!this.scanning || this.video.readyState !== this.video.HAVE_ENOUGH_DATA) {
-                requestAnimationFrame(() => this.tick());
-                return;
-            }
+class WorkerDetector {
+    constructor(workerUrl, jsQRUrl) {
+        this.worker = new Worker(workerUrl);
+        this.worker.postMessage({ type: 'init', jsQRUrl });
+        this.pending = new Map();
+        this.nextId = 0;
+        this.worker.onmessage = event => {
+            const { id, code, decodeMs } = event.data;
+            const pending = this.pending.get(id);
+            if (!pending) return;  // Already timed out
+            clearTimeout(pending.timer);
+            this.pending.delete(id);
+            pending.resolve({ code, decodeMs });
+        };
+    }
 
-            this.canvasElement.height = this.video.videoHeight;
-            this.canvasElement.width = this.video.videoWidth;
-            this.canvas.drawImage(this.video, 0, 0, this.canvasElement.width, this.canvasElement.height);
-            const imageData = this.canvas.getImageData(0, 0, this.canvasElement.width, this.canvasElement.height);
-            const code = jsQR(imageData.data, imageData.width, imageData.height, { inversionAttempts: "dontInvert" });
+    detect(imageData) {
+        return new Promise(resolve => {
+            const id = this.nextId++;
+            const timer = setTimeout(() => {
+                this.pending.delete(id);
+                resolve({ code: null, decodeMs: DECODE_TIMEOUT });
+            }, DECODE_TIMEOUT);
+            this.pending.set(id, { resolve, timer });
+            // Transferred, not copied; the buffer is unusable here afterwards
+            const buffer = imageData.data.buffer;
+            this.worker.postMessage(
+                { type: 'frame', id, buffer, width: imageData.width, height: imageData.height },
+                [buffer]
+            );
+        });
+    }
+
+    close() {
+        this.worker.terminate();
+    }
+}
+
+// For browsers without workers, and as the baseline in the benchmark page
+class InlineDetector {
+    constructor(jsQRUrl) {
+        this.ready = window.jsQR ? Promise.resolve() : new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = jsQRUrl;
+            script.onload = resolve;
+            script.onerror = reject;
+            document.head.appendChild(script);
+        });
+    }
+
+    async detect(imageData) {
+        await this.ready;
+        const start = performance.now();
+        const code = jsQR(imageData.data, imageData.width, imageData.height, { inversionAttempts: "dontInvert" });
+        return { code, decodeMs: performance.now() - start };
+    }
+
+    close() {}
+}
+
+class QRScanner {
+    // config: {urls: {worker, jsQR}}, plus for the benchmark page: stream
+    // (instead of the camera), detector ('worker' or 'inline'), track
+    // (false to always search whole frames), throttle (false to decode every
+    // frame), searchSize, onFound and stats.
+    constructor(config) {
+        this.config = config;
+        this.video = document.getElementById('camera-feed');
+        this.canvasElement = document.getElementById('canvas');
+        this.canvas = this.canvasElement.getContext('2d');
+        this.statusMessage = document.getElementById('status-message');
+        this.beacon = new DirectionalBeacon();
+        this.scanning = false;
+        this.stream = null;
+        this.lastBeepTime = 0;
+
+        // Frames are scaled into this canvas before decoding
+        this.frameCanvas = document.createElement('canvas');
+        this.frame = this.frameCanvas.getContext('2d', { willReadFrequently: true });
+        this.roi = null;
+        this.roiMisses = 0;
+        this.decodeMs = 0;
+        this.lastSubmit = 0;
+        this.searchSize = config.searchSize || SEARCH_SIZE;
+        this.track = config.track !== false;
+        this.throttle = config.throttle !== false;
+        this.stats = config.stats || null;
+        this.onFound = config.onFound || (code => { window.location.href = code.data; });
+
+        const inline = config.detector === 'inline' || !window.Worker;
+        this.detector = inline
+            ? new InlineDetector(config.urls.jsQR)
+            : new WorkerDetector(config.urls.worker, config.urls.jsQR);
+    }
+
+    start() {
+        this.startScanner();
+        window.addEventListener('beforeunload', () => this.stopScanner());
+    }
+
+    drawLine(begin, end, color) {
+        this.canvas.beginPath();
+        this.canvas.moveTo(begin.x, begin.y);
+        this.canvas.lineTo(end.x, end.y);
+        this.canvas.lineWidth = 4;
+        this.canvas.strokeStyle = color;
+        this.canvas.stroke();
+    }
 
-            this.canvas.clearRect(0, 0, this.canvasElement.width, this.canvasElement.height);
-            if (code) {
-                this.handleQRCode(code);
+    scheduleFrame() {
+        if (!this.scanning) return;
+        // Searching is throttled to twice the decode time; tracking isn't
+        const interval = this.roi || !this.throttle
+            ? 0
+            : Math.min(SEARCH_MAX_INTERVAL, Math.max(SEARCH_MIN_INTERVAL, this.decodeMs * 2));
+        const wait = Math.max(0, this.lastSubmit + interval - performance.now());
+        setTimeout(() => {
+            if (this.video.requestVideoFrameCallback) {
+                this.video.requestVideoFrameCallback(() => this.tick());
+            } else {
+                requestAnimationFrame(() => this.tick());
             }
+        }, wait);
+    }
+
+    grabFrame(region) {
+        const scale = Math.min(1, (this.roi ? ROI_SIZE : this.searchSize) / Math.max(region.width, region.height));
+        const width = Math.max(1, Math.round(region.width * scale));
+        const height = Math.max(1, Math.round(region.height * scale));
+        if (this.frameCanvas.width !== width || this.frameCanvas.height !== height) {
+            this.frameCanvas.width = width;
+            this.frameCanvas.height = height;
+        }
+        this.frame.drawImage(this.video, region.x, region.y, region.width, region.height, 0, 0, width, height);
+        return this.frame.getImageData(0, 0, width, height);
+    }
 
+    async tick() {
+        if (!this.scanning) return;
+        if (this.video.readyState !== this.video.HAVE_ENOUGH_DATA) {
             requestAnimationFrame(() => this.tick());
+            return;
         }
 
-        handleQRCode(code) {
-            const loc = code.location;
-            this.drawLine(loc.topLeftCorner, loc.topRightCorner, "#FF3B58");
-            this.drawLine(loc.topRightCorner, loc.bottomRightCorner, "#FF3B58");
-            this.drawLine(loc.bottomRightCorner, loc.bottomLeftCorner, "#FF3B58");
-            this.drawLine(loc.bottomLeftCorner, loc.topLeftCorner, "#FF3B58");
-
-            const qrCenterX = (loc.topLeftCorner.x + loc.topRightCorner.x) / 2;
-            const pan = (qrCenterX / this.canvasElement.width) * 2 - 1;
-
-            const qrWidth = Math.abs(loc.topRightCorner.x - loc.topLeftCorner.x);
-            const percentArea = (qrWidth * qrWidth) / (this.canvasElement.width * this.canvasElement.height);
-            const proximity = Math.min(percentArea / 0.1, 1.0);
-
-            if (proximity >= 1.0) {
-                this.statusMessage.textContent = "QR Code detected! Redirecting...";
-                this.beacon.playSuccess();
-                this.stopScanner();
-                window.location.href = code.data;
-                return;
-            }
+        const videoWidth = this.video.videoWidth;
+        const videoHeight = this.video.videoHeight;
+        if (this.canvasElement.width !== videoWidth || this.canvasElement.height !== videoHeight) {
+            this.canvasElement.width = videoWidth;
+            this.canvasElement.height = videoHeight;
+        }
 
-            const maxInterval = 1000;
-            const minInterval = 150;
-            const interval = minInterval + (maxInterval - minInterval) * Math.pow(1 - proximity, 2);
+        const region = this.roi || { x: 0, y: 0, width: videoWidth, height: videoHeight };
+        const grabbedAt = performance.now();
+        this.lastSubmit = grabbedAt;
+        const imageData = this.grabFrame(region);
+        const scale = imageData.width / region.width;
+        const { code, decodeMs } = await this.detector.detect(imageData);
 
-            const basePitch = 660;
-            const peakPitch = 880;
-            const centeredness = 1 - Math.abs(pan);
-            const pitch = basePitch + (peakPitch - basePitch) * centeredness;
+        this.decodeMs = this.decodeMs ? this.decodeMs * 0.8 + decodeMs * 0.2 : decodeMs;
+        if (this.stats) {
+            this.stats.frames++;
+            this.stats.decodeMs.push(decodeMs);
+        }
+        if (!this.scanning) return;
 
-            const now = Date.now();
-            if (now - this.lastBeepTime > interval) {
-                this.beacon.beep(pan, pitch);
-                this.lastBeepTime = now;
+        this.canvas.clearRect(0, 0, videoWidth, videoHeight);
+        if (code) {
+            // Back from frame pixels to video pixels
+            const location = {};
+            for (const [name, point] of Object.entries(code.location)) {
+                location[name] = { x: region.x + point.x / scale, y: region.y + point.y / scale };
             }
+            if (this.stats) this.stats.detections++;
+            this.updateRegion(location, videoWidth, videoHeight);
+            this.handleQRCode({ data: code.data, location }, grabbedAt);
+        } else if (this.roi && ++this.roiMisses >= ROI_MISSES) {
+            this.roi = null;
         }
 
-        startScanner() {
-            if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
-                this.updateStatus("Camera access is not supported by your browser.");
-                return;
-            }
+        this.scheduleFrame();
+    }
+
+    updateRegion(loc, videoWidth, videoHeight) {
+        if (!this.track) return;
+        const corners = [loc.topLeftCorner, loc.topRightCorner, loc.bottomRightCorner, loc.bottomLeftCorner];
+        const xs = corners.map(point => point.x);
+        const ys = corners.map(point => point.y);
+        const margin = Math.max(Math.max(...xs) - Math.min(...xs), Math.max(...ys) - Math.min(...ys)) * ROI_MARGIN;
+        const left = Math.max(0, Math.floor(Math.min(...xs) - margin));
+        const top = Math.max(0, Math.floor(Math.min(...ys) - margin));
+        const right = Math.min(videoWidth, Math.ceil(Math.max(...xs) + margin));
+        const bottom = Math.min(videoHeight, Math.ceil(Math.max(...ys) + margin));
+        this.roi = { x: left, y: top, width: right - left, height: bottom - top };
+        this.roiMisses = 0;
+    }
+
+    handleQRCode(code, grabbedAt) {
+        const loc = code.location;
+        this.drawLine(loc.topLeftCorner, loc.topRightCorner, "#FF3B58");
+        this.drawLine(loc.topRightCorner, loc.bottomRightCorner, "#FF3B58");
+        this.drawLine(loc.bottomRightCorner, loc.bottomLeftCorner, "#FF3B58");
+        this.drawLine(loc.bottomLeftCorner, loc.topLeftCorner, "#FF3B58");
+
+        const qrCenterX = (loc.topLeftCorner.x + loc.topRightCorner.x) / 2;
+        const pan = (qrCenterX / this.canvasElement.width) * 2 - 1;
+
+        const qrWidth = Math.abs(loc.topRightCorner.x - loc.topLeftCorner.x);
+        const percentArea = (qrWidth * qrWidth) / (this.canvasElement.width * this.canvasElement.height);
+        const proximity = Math.min(percentArea / 0.1, 1.0);
 
-            navigator.mediaDevices.getUserMedia({ video: { facingMode: "environment" } })
-                .then(stream => {
-                    this.stream = stream;
-                    this.video.srcObject = stream;
-                    this.video.setAttribute("playsinline", true);
-                    this.video.play();
-                    this.scanning = true;
-                    this.updateStatus('Scanning for QR code...');
-                    requestAnimationFrame(() => this.tick());
-                })
-                .catch(err => {
-                    console.error("Error starting camera: ", err);
-                    let message = "Could not start camera.";
-                    if (err.name === "NotAllowedError" || err.name === "PermissionDeniedError") {
-                        message = "Camera permission was denied. Please grant permission in your browser settings.";
-                    } else if (err.name === "NotFoundError" || err.name === "DevicesNotFoundError") {
-                        message = "No camera was found on this device.";
-                    } else if (err.name === "NotReadableError" || err.name === "TrackStartError") {
-                        message = "The camera is currently in use by another application.";
-                    }
-                    this.updateStatus(message);
-                });
+        if (proximity >= 1.0) {
+            this.statusMessage.textContent = "QR Code detected! Redirecting...";
+            this.beacon.playSuccess();
+            this.stopScanner();
+            this.onFound(code);
+            return;
         }
 
-        stopScanner() {
-            this.scanning = false;
-            if (this.stream) {
-                this.stream.getTracks().forEach(track => track.stop());
-            }
-            this.updateStatus('Scanner deactivated.');
+        const maxInterval = 1000;
+        const minInterval = 150;
+        const interval = minInterval + (maxInterval - minInterval) * Math.pow(1 - proximity, 2);
+
+        const basePitch = 660;
+        const peakPitch = 880;
+        const centeredness = 1 - Math.abs(pan);
+        const pitch = basePitch + (peakPitch - basePitch) * centeredness;
+
+        const now = Date.now();
+        if (now - this.lastBeepTime > interval) {
+            this.beacon.beep(pan, pitch);
+            this.lastBeepTime = now;
+            if (this.stats) this.stats.beepLatencies.push(performance.now() - grabbedAt);
         }
+    }
 
-        updateStatus(message) {
-            this.statusMessage.textContent = message;
+    startScanner() {
+        if (this.config.stream) {
+            this.startStream(this.config.stream);
+            return;
         }
+        if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
+            this.updateStatus("Camera access is not supported by your browser.");
+            return;
+        }
+
+        navigator.mediaDevices.getUserMedia({ video: { facingMode: "environment" } })
+            .then(stream => this.startStream(stream))
+            .catch(err => {
+                console.error("Error starting camera: ", err);
+                let message = "Could not start camera.";
+                if (err.name === "NotAllowedError" || err.name === "PermissionDeniedError") {
+                    message = "Camera permission was denied. Please grant permission in your browser settings.";
+                } else if (err.name === "NotFoundError" || err.name === "DevicesNotFoundError") {
+                    message = "No camera was found on this device.";
+                } else if (err.name === "NotReadableError" || err.name === "TrackStartError") {
+                    message = "The camera is currently in use by another application.";
+                }
+                this.updateStatus(message);
+            });
+    }
+
+    startStream(stream) {
+        this.stream = stream;
+        this.video.srcObject = stream;
+        this.video.setAttribute("playsinline", true);
+        this.video.play();
+        this.scanning = true;
+        this.updateStatus('Scanning for QR code...');
+        requestAnimationFrame(() => this.tick());
     }
 
-    new QRScanner();
+    stopScanner() {
+        this.scanning = false;
+        // A stream passed in belongs to the caller
+        if (this.stream && !this.config.stream) {
+            this.stream.getTracks().forEach(track => track.stop());
+        }
+        this.detector.close();
+        this.updateStatus('Scanner deactivated.');
+    }
+
+    updateStatus(message) {
+        this.statusMessage.textContent = message;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    // The benchmark page starts its own scanners
+    if (!scannerConfig.benchmark) {
+        new QRScanner(scannerConfig).start();
+    }
 });
@@ -1,9 +1,47 @@
+import base64
 import json
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import Http404
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Product, QRCode
+from django.contrib.sites.models import Site
+from PIL import Image
+from tsa_project import metrics
+from . import caching, jobs, qr, search
+from .analytics import ScanBuffer
+from .batch import apply_batch
+from .merge import compile_template
+from .models import Folder, Product, QRCode, QRRenderJob, ScanStats, Template
+from .slug_index import slug_index, updated_marker
+from .views import AsyncProductListenView, afolder_products, aqr_status
+
+TEST_STORAGES = {
+    **settings.STORAGES,
+    'qr_codes': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': tempfile.mkdtemp(prefix='qr-test-')},
+    },
+}
 
 
+@override_settings(STORAGES=TEST_STORAGES)
 class ProductModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(username='u', password='p')
@@ -14,12 +52,40 @@ class ProductModelTest(TestCase):
         )
         self.assertNotEqual(product.unique_slug, '')
 
-    def test_qrcode_auto_created_with_image_data(self):
+    def test_startup_does_not_load_image_libraries(self):
+        # Only the QR rendering path needs qrcode and Pillow
+        script = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print(sorted({'qrcode', 'PIL'} & set(sys.modules)))"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'tsa_project.settings'}
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, check=True, capture_output=True, text=True
+        )
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    @override_settings(QR_RENDER_QUEUE=False)
+    def test_qrcode_image_saved_to_store(self):
+        product = Product.objects.create(
+            owner=self.user, name='Test', text_description='desc'
+        )
+        qr_code = QRCode.objects.create(linked_product=product)
+        self.assertEqual(qr_code.image_data, '')
+        self.assertTrue(qr.image_exists(qr_code.image_hash))
+
+    @override_settings(QR_PUBLIC_BASE_URL='https://labels.example', QR_RENDER_QUEUE=False)
+    def test_qr_payload_is_short_and_alphanumeric(self):
         product = Product.objects.create(
             owner=self.user, name='Test', text_description='desc'
         )
-        qr = QRCode.objects.create(linked_product=product)
-        self.assertTrue(qr.image_data.startswith('data:image/png;base64,'))
+        qr_code = QRCode.objects.create(linked_product=product)
+        self.assertEqual(qr_code.public_url, f'HTTPS://LABELS.EXAMPLE/L/{product.short_code}')
+
+        code = qr.encode(qr_code.public_url)
+        long_code = qr.encode(f'https://labels.example/listen/{product.unique_slug}/')
+        self.assertEqual([data.mode for data in code.data_list], [qrcode.util.MODE_ALPHA_NUM])
+        self.assertLess(code.modules_count, long_code.modules_count)
 
     def test_listen_view_returns_200_for_valid_slug(self):
         product = Product.objects.create(
@@ -28,6 +94,20 @@ class ProductModelTest(TestCase):
         response = self.client.get(f'/listen/{product.unique_slug}/')
         self.assertEqual(response.status_code, 200)
 
+    def test_description_is_split_into_spoken_sections(self):
+        product = Product.objects.create(
+            owner=self.user, name='Test', text_description='Milk, approx. 5 g sugar. Keep cold!\n\nContains nuts.'
+        )
+        self.assertEqual(product.speech_chunks, [['Milk, approx. 5 g sugar.', 'Keep cold!'], ['Contains nuts.']])
+
+        product.text_description = 'Soup.'
+        product.save(update_fields=['text_description'])
+        product.refresh_from_db()
+        self.assertEqual(product.speech_chunks, [['Soup.']])
+
+        response = self.client.get(f'/listen/{product.unique_slug}/')
+        self.assertContains(response, '<script id="speech-chunks" type="application/json">[["Soup."]]</script>', html=True)
+
     def test_dashboard_requires_login(self):
         response = self.client.get('/dashboard/')
         self.assertRedirects(response, '/accounts/login/?next=/dashboard/')
@@ -43,4 +123,1030 @@ class ProductModelTest(TestCase):
             data=json.dumps({'product_id': product.id, 'folder_id': None}),
             content_type='application/json'
         )
-        self.assertEqual(response.status_code, 400)
\ No newline at end of file
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DashboardQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+
+    def add_products(self, count, folder=None):
+        for i in range(count):
+            product = Product.objects.create(
+                owner=self.user, folder=folder, name=f'Item {i}', text_description='desc'
+            )
+            QRCode.objects.create(linked_product=product)
+
+    def count_queries(self, url):
+        # Uncached renders; DashboardCacheTest covers the cached ones
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_dashboard_query_count_does_not_grow_with_products(self):
+        folder = Folder.objects.create(owner=self.user, name='Aisle 1')
+        self.add_products(2)
+        self.add_products(2, folder=folder)
+        baseline = self.count_queries('/dashboard/')
+
+        Folder.objects.create(owner=self.user, name='Aisle 2')
+        self.add_products(20)
+        self.add_products(20, folder=folder)
+        self.assertEqual(self.count_queries('/dashboard/'), baseline)
+
+    def test_folder_products_endpoint_is_paginated(self):
+        folder = Folder.objects.create(owner=self.user, name='Aisle 1')
+        self.add_products(50, folder=folder)
+
+        first = self.client.get(f'/api/folders/{folder.pk}/products/').json()
+        self.assertEqual(len(first['products']), 48)
+        self.assertEqual(first['next_page'], 2)
+
+        second = self.client.get(f'/api/folders/{folder.pk}/products/?page=2').json()
+        self.assertEqual(len(second['products']), 2)
+        self.assertIsNone(second['next_page'])
+
+    def test_cards_without_a_qr_code_are_listed(self):
+        folder = Folder.objects.create(owner=self.user, name='Aisle 1')
+        Product.objects.create(owner=self.user, folder=folder, name='Admin entry', text_description='desc')
+
+        (card,) = self.client.get(f'/api/folders/{folder.pk}/products/').json()['products']
+        self.assertEqual((card['image_url'], card['thumbnail_url']), ('', ''))
+        self.assertEqual(card['filename'], 'admin-entry.png')
+        self.assertEqual(len(self.client.get('/api/products/search/', {'q': 'admin'}).json()['products']), 1)
+
+    def test_folder_products_endpoint_rejects_other_owner(self):
+        other = User.objects.create_user(username='other', password='p')
+        folder = Folder.objects.create(owner=other, name='Private')
+        response = self.client.get(f'/api/folders/{folder.pk}/products/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.aisles = [Folder.objects.create(owner=self.user, name=f'Aisle {i}') for i in range(2)]
+        self.product = Product.objects.create(owner=self.user, folder=self.aisles[0], name='Soup', text_description='d')
+        self.loose = Product.objects.create(owner=self.user, name='Loose', text_description='d')
+        for product in (self.product, self.loose):
+            QRCode.objects.create(linked_product=product)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_unchanged_dashboard_is_served_from_cache(self):
+        first, uncached = self.get('/dashboard/')
+        caching.fragment_stats.clear()
+        second, cached = self.get('/dashboard/')
+
+        self.assertLess(cached, uncached)
+        self.assertEqual(caching.fragment_stats['folders', 'hit'], 1)
+        self.assertEqual(caching.fragment_stats['uncategorized', 'hit'], 1)
+        self.assertContains(second, 'Aisle 1')
+        self.assertContains(second, '<p><strong>Loose</strong></p>')
+
+    def test_edit_only_rerenders_its_folder(self):
+        for aisle in self.aisles:
+            self.get(f'/api/folders/{aisle.pk}/products/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Tomato soup'
+            self.product.save()
+
+        caching.fragment_stats.clear()
+        edited = self.get(f'/api/folders/{self.aisles[0].pk}/products/')[0].json()
+        self.get(f'/api/folders/{self.aisles[1].pk}/products/')
+        self.assertEqual(edited['products'][0]['name'], 'Tomato soup')
+        self.assertEqual(caching.fragment_stats['folder', 'miss'], 1)
+        self.assertEqual(caching.fragment_stats['folder', 'hit'], 1)
+
+    def test_batch_move_updates_both_folders_and_counts(self):
+        self.get('/dashboard/')
+        self.get(f'/api/folders/{self.aisles[1].pk}/products/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_batch(self.user, [(self.loose.pk, self.aisles[1].pk, None, None)], set())
+
+        dashboard = self.get('/dashboard/')[0]
+        self.assertNotContains(dashboard, 'Loose')
+        self.assertContains(dashboard, '<span class="folder-count">(1)</span>', count=2)
+        moved = self.get(f'/api/folders/{self.aisles[1].pk}/products/')[0].json()
+        self.assertEqual([product['name'] for product in moved['products']], ['Loose'])
+
+    def test_saving_a_move_updates_both_folders_and_counts(self):
+        # As the admin does: load, change the folder, save()
+        for aisle in self.aisles:
+            self.get(f'/api/folders/{aisle.pk}/products/')
+        self.get('/dashboard/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=self.product.pk)
+            product.folder = self.aisles[1]
+            product.save()
+
+        left = self.get(f'/api/folders/{self.aisles[0].pk}/products/')[0].json()
+        self.assertEqual(left['products'], [])
+        self.assertContains(self.get('/dashboard/')[0], '<span class="folder-count">(0)</span>')
+
+    def test_template_changes_reach_every_user(self):
+        self.get('/dashboard/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Template.objects.create(name='Cereal', content='Contains [blank][Allergens]')
+        self.assertContains(self.get('/dashboard/')[0], 'Cereal')
+
+
+@override_settings(STORAGES=TEST_STORAGES, QR_RENDER_QUEUE=False)
+class QRImageViewTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='u', password='p')
+        product = Product.objects.create(owner=user, name='Test', text_description='desc')
+        self.qr_code = QRCode.objects.create(linked_product=product)
+        self.url = self.qr_code.image_url
+
+    def test_image_served_with_immutable_caching(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{self.qr_code.image_hash}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'\x89PNG'))
+
+    def test_matching_etag_returns_304(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.qr_code.image_hash}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_digest_returns_404(self):
+        response = self.client.get(f"/qr/{'0' * 64}.png")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(f"/qr/{'0' * 64}/thumbnail.png")
+        self.assertEqual(response.status_code, 404)
+
+    def test_stored_png_is_one_bit(self):
+        with qr.open_image(self.qr_code.image_hash) as image_file:
+            image = Image.open(image_file)
+            self.assertEqual(image.mode, '1')
+            modules = qr.encode(self.qr_code.public_url).modules_count
+            self.assertEqual(image.size, ((modules + 8) * 10, (modules + 8) * 10))
+
+    def test_variant_rendered_once_then_served_from_storage(self):
+        url = self.qr_code.variant_url('thumbnail')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        thumbnail = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertLess(thumbnail.width, 410)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_svg_variant(self):
+        response = self.client.get(self.qr_code.variant_url('print', 'svg'))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', b''.join(response.streaming_content))
+
+    def test_error_correction_setting(self):
+        url = self.qr_code.public_url
+        with self.settings(QR_ERROR_CORRECTION='L'):
+            low = qr.encode(url).modules_count
+        with self.settings(QR_ERROR_CORRECTION='H'):
+            high = qr.encode(url).modules_count
+        self.assertLess(low, high)
+
+    def test_racing_writers_leave_one_copy(self):
+        storage = qr.get_storage()
+        qr.save_once('race/local.png', b'first')
+        with mock.patch.object(storage, 'exists', return_value=False):
+            qr.save_once('race/local.png', b'first')
+        # Renamed into place, not saved beside the other copy
+        self.assertEqual(storage.listdir('race'), ([], ['local.png']))
+
+        in_memory = {**TEST_STORAGES, 'qr_codes': {'BACKEND': 'django.core.files.storage.InMemoryStorage'}}
+        with self.settings(STORAGES=in_memory):
+            storage = qr.get_storage()
+            qr.save_once('race/remote.png', b'first')
+            # Lost the race: the name was free when checked
+            with mock.patch.object(storage, 'exists', return_value=False):
+                qr.save_once('race/remote.png', b'second')
+            self.assertEqual(storage.listdir('race'), ([], ['remote.png']))
+            with storage.open('race/remote.png') as f:
+                self.assertEqual(f.read(), b'first')
+
+
+@override_settings(STORAGES=TEST_STORAGES, QR_RENDER_QUEUE=False)
+class QRExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.folder = Folder.objects.create(owner=self.user, name='Aisle 3')
+        for name in ['Rice', 'Rice', 'Beans']:
+            product = Product.objects.create(owner=self.user, folder=self.folder, name=name, text_description='d')
+            QRCode.objects.create(linked_product=product)
+        self.client.login(username='u', password='p')
+
+    def test_folder_zip_is_streamed_then_served_from_store(self):
+        url = f'/folders/{self.folder.pk}/qr-codes.zip'
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('aisle-3.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 3)
+        self.assertEqual(len({name for name in archive.namelist() if name.startswith('rice')}), 2)
+
+        with mock.patch('products.exports.build_export') as build:
+            again = self.client.get(url)
+            self.assertEqual(b''.join(again.streaming_content), archive.fp.getvalue())
+        build.assert_not_called()
+
+    def test_rename_changes_the_export(self):
+        url = f'/folders/{self.folder.pk}/qr-codes.zip?format=svg'
+        first = zipfile.ZipFile(BytesIO(b''.join(self.client.get(url).streaming_content)))
+        self.assertIn('beans.svg', first.namelist())
+
+        Product.objects.filter(name='Beans').update(name='Lentils')
+        second = zipfile.ZipFile(BytesIO(b''.join(self.client.get(url).streaming_content)))
+        self.assertIn('lentils.svg', second.namelist())
+        self.assertNotIn('beans.svg', second.namelist())
+
+    def test_printable_sheet(self):
+        response = self.client.get(f'/folders/{self.folder.pk}/qr-codes.pdf')
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        self.assertIn(b'/Count 1', content)
+
+        response = self.client.get(f'/folders/{self.folder.pk}/qr-codes.png?page=1')
+        page = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(page.mode, '1')
+        self.assertEqual(self.client.get(f'/folders/{self.folder.pk}/qr-codes.png?page=2').status_code, 404)
+
+    def test_selection_and_owner_isolation(self):
+        beans = Product.objects.get(name='Beans')
+        response = self.client.get(f'/products/qr-codes.zip?products={beans.pk}')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['beans.png'])
+
+        User.objects.create_user(username='other', password='p')
+        self.client.login(username='other', password='p')
+        self.assertEqual(self.client.get(f'/folders/{self.folder.pk}/qr-codes.zip').status_code, 404)
+        self.assertEqual(self.client.get(f'/products/qr-codes.zip?products={beans.pk}').status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class QRRenderQueueTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+
+    def create_product(self):
+        self.client.post('/products/new/', {'name': 'Soup', 'text_description': 'Tomato soup'})
+        return Product.objects.get(name='Soup')
+
+    def test_create_returns_before_rendering(self):
+        product = self.create_product()
+        self.assertTrue(product.qr_code.is_pending)
+        self.assertEqual(QRRenderJob.objects.get().status, QRRenderJob.PENDING)
+
+        response = self.client.get(f'/api/qr_status/?products={product.pk}')
+        self.assertEqual(response.json()['images'], {})
+        self.assertEqual(response.json()['failed'], [])
+
+    def test_worker_renders_pending_codes(self):
+        product = self.create_product()
+        call_command('qr_worker', '--once', '--workers=0', stdout=StringIO())
+
+        qr_code = QRCode.objects.get(linked_product=product)
+        self.assertTrue(qr.image_exists(qr_code.image_hash))
+        self.assertFalse(QRRenderJob.objects.exists())
+
+        response = self.client.get(f'/api/qr_status/?products={product.pk}')
+        self.assertEqual(
+            response.json()['images'],
+            {str(product.pk): {'image_url': qr_code.image_url, 'thumbnail_url': qr_code.thumbnail_url}},
+        )
+
+    def test_failed_render_is_retried_then_given_up(self):
+        product = self.create_product()
+        with mock.patch('products.qr.render_png', side_effect=ValueError('boom')):
+            for attempt in range(settings.QR_RENDER_MAX_ATTEMPTS):
+                QRRenderJob.objects.update(run_after=QRRenderJob.objects.get().created_at)
+                call_command('qr_worker', '--once', '--workers=0', stdout=StringIO())
+
+        job = QRRenderJob.objects.get()
+        self.assertEqual(job.status, QRRenderJob.FAILED)
+        self.assertEqual(job.attempts, settings.QR_RENDER_MAX_ATTEMPTS)
+        self.assertEqual(job.last_error, 'boom')
+
+        response = self.client.get(f'/api/qr_status/?products={product.pk}')
+        self.assertEqual(response.json()['failed'], [product.pk])
+
+    def test_stale_claims_count_as_attempts(self):
+        self.create_product()
+        QRRenderJob.objects.update(
+            status=QRRenderJob.RUNNING,
+            locked_by='dead',
+            locked_at=timezone.now() - 2 * jobs.STALE_AFTER,
+            attempts=settings.QR_RENDER_MAX_ATTEMPTS - 1,
+        )
+        self.assertEqual(jobs.claim_jobs(10), [])
+
+        job = QRRenderJob.objects.get()
+        self.assertEqual(job.status, QRRenderJob.FAILED)
+        self.assertEqual(job.attempts, settings.QR_RENDER_MAX_ATTEMPTS)
+
+    def test_results_of_a_lost_claim_are_dropped(self):
+        product = self.create_product()
+        job, = jobs.claim_jobs(10, 'first')
+        # Reclaimed as stale by another worker
+        QRRenderJob.objects.update(locked_by='second')
+
+        self.assertFalse(jobs.complete_job(job, 'f' * 64))
+        jobs.fail_job(job, ValueError('boom'))
+        self.assertTrue(QRCode.objects.get(linked_product=product).is_pending)
+        self.assertEqual(QRRenderJob.objects.values_list('locked_by', 'attempts').get(), ('second', 0))
+
+        QRRenderJob.objects.all().delete()
+        jobs.fail_job(job, ValueError('boom'))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+
+    def test_command_imports_csv_with_row_errors(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csv_file:
+            csv_file.write('name,text_description,folder\n')
+            csv_file.write('Milk,Two percent,Dairy\n')
+            csv_file.write(',Missing a name,Dairy\n')
+            csv_file.write('Bread,Whole wheat,\n')
+        self.addCleanup(os.remove, csv_file.name)
+
+        stderr = StringIO()
+        call_command(
+            'import_products', csv_file.name, '--user=u', '--workers=0', '--batch-size=1',
+            stdout=StringIO(), stderr=stderr,
+        )
+
+        self.assertEqual(Product.objects.filter(owner=self.user).count(), 2)
+        self.assertEqual(Product.objects.get(name='Milk').folder.name, 'Dairy')
+        self.assertEqual(Product.objects.get(name='Milk').speech_chunks, [['Two percent']])
+        self.assertTrue(qr.image_exists(QRCode.objects.get(linked_product__name='Bread').image_hash))
+        self.assertIn('Row 3', stderr.getvalue())
+
+    def test_seed_benchmark_is_repeatable(self):
+        call_command('seed_benchmark', '--users=2', '--products=30', '--folders=3', '--templates=2', stdout=StringIO())
+        call_command('seed_benchmark', '--users=1', '--products=30', '--folders=3', '--prefix=again', stdout=StringIO())
+
+        first, second = User.objects.get(username='bench0'), User.objects.get(username='again0')
+        self.assertTrue(self.client.login(username='bench1', password='bench'))
+        self.assertEqual(Product.objects.filter(owner__username__startswith='bench').count(), 60)
+        self.assertEqual(Folder.objects.filter(owner=first).count(), 3)
+        self.assertEqual(QRRenderJob.objects.filter(qr_code__linked_product__owner=first).count(), 30)
+
+        def catalog(owner):
+            return list(Product.objects.filter(owner=owner).order_by('pk').values_list('name', 'text_description', 'folder__name'))
+        self.assertEqual(catalog(first), catalog(second))
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', '--products=1', stdout=StringIO())
+
+    def test_upload_endpoint_queues_rendering(self):
+        self.client.login(username='u', password='p')
+        upload = SimpleUploadedFile(
+            'labels.jsonl',
+            b'{"name": "Milk", "text_description": "Two percent"}\nnot json\n',
+        )
+        response = self.client.post('/products/import/', {'file': upload})
+
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'], [{'row': 2, 'errors': {'__all__': ['Row could not be parsed.']}}])
+        self.assertEqual(QRRenderJob.objects.count(), 1)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class TemplateMergeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.template = Template.objects.create(
+            name='Shelf label', content='Price [blank][Price].\\nAisle [blank][Aisle]. Costs [blank][Price].'
+        )
+        self.url = f'/templates/{self.template.pk}/merge/'
+
+    def upload(self, **data):
+        rows = (
+            b'name,folder,Price,Aisle\n'
+            b'Milk,Dairy,$2,4\n'
+            b'Bread,,$3\n'
+            b'Jam,,$4\\5,7\n'
+        )
+        return self.client.post(self.url, {'file': SimpleUploadedFile('rows.csv', rows), **data}).json()
+
+    def test_compiled_template_is_cached_per_content(self):
+        compiled = compile_template(self.template.content)
+        self.assertIs(compile_template(self.template.content), compiled)
+        self.assertEqual(compiled.fields, ['Price', 'Aisle'])
+
+    def test_dry_run_previews_without_creating(self):
+        data = self.upload(dry_run='on')
+        self.assertEqual((data['valid'], data['failed']), (2, 1))
+        self.assertEqual(data['preview'][0]['text_description'], 'Price $2.\nAisle 4. Costs $2.')
+        self.assertEqual(data['errors'], [{'row': 3, 'errors': {'text_description': ['Missing value for [Aisle].']}}])
+        self.assertFalse(Product.objects.exists())
+
+    def test_merge_bulk_creates_products_and_queued_codes(self):
+        data = self.upload()
+        self.assertEqual((data['created'], data['failed']), (2, 1))
+
+        milk = Product.objects.get(name='Milk')
+        self.assertEqual(milk.folder.name, 'Dairy')
+        self.assertTrue(milk.qr_code.is_pending)
+        # A typed backslash is kept literally
+        self.assertEqual(Product.objects.get(name='Jam').text_description, 'Price $4\\5.\nAisle 7. Costs $4\\5.')
+        self.assertEqual(QRRenderJob.objects.count(), 2)
+
+
+@override_settings(SCAN_FLUSH_INTERVAL=3600, SLUG_INDEX_CATCHUP_INTERVAL=3600)
+class ListenPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='p')
+        self.product = Product.objects.create(owner=self.user, name='Soup', text_description='Tomato soup')
+        self.url = f'/listen/{self.product.unique_slug}/'
+        slug_index.rebuild()
+
+    def test_second_hit_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_conditional_get_returns_304(self):
+        first = self.client.get(self.url)
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_date.status_code, 304)
+
+    def test_edit_and_delete_invalidate_cached_page(self):
+        self.client.get(self.url)
+        self.product.text_description = 'Chicken soup'
+        self.product.save()
+        self.assertContains(self.client.get(self.url), 'Chicken soup')
+
+        self.product.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_edit_in_another_worker_is_served_after_catch_up(self):
+        # Another worker's save leaves this process's cache alone, like
+        # update(), which sends no signals
+        self.client.get(self.url)
+        Product.objects.filter(pk=self.product.pk).update(
+            text_description='Chicken soup', updated_at=self.product.updated_at + timedelta(milliseconds=1)
+        )
+        self.assertContains(self.client.get(self.url), 'Tomato soup')
+
+        # Heard once the slug index catches up
+        with self.settings(SLUG_INDEX_CATCHUP_INTERVAL=0):
+            self.assertContains(self.client.get(self.url), 'Chicken soup')
+
+    async def test_served_from_cache_under_asgi(self):
+        client = AsyncClient()
+        first = await client.get(self.url)
+        second = await client.get(self.url, headers={'If-None-Match': first['ETag']})
+        self.assertContains(first, 'Tomato soup')
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual((await client.get('/listen/NoSuchSlugNoSuchSlug00/')).status_code, 404)
+
+    def test_short_route_serves_same_page_case_insensitively(self):
+        short_url = f'/L/{self.product.short_code}'
+        response = self.client.get(f'/L/{self.product.short_code.lower()}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.client.get(self.url).content)
+
+        self.client.get(short_url)
+        self.product.text_description = 'Chicken soup'
+        self.product.save()
+        self.assertContains(self.client.get(short_url), 'Chicken soup')
+
+
+@override_settings(SCAN_FLUSH_INTERVAL=3600, SLUG_INDEX_CATCHUP_INTERVAL=3600)
+class AsyncViewsTest(TestCase):
+    # Only routed under ASGI (ASYNC_VIEWS), so called directly here
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='p')
+        self.folder = Folder.objects.create(owner=self.user, name='Aisle 1')
+        self.product = Product.objects.create(
+            owner=self.user, folder=self.folder, name='Soup', text_description='Tomato soup'
+        )
+        slug_index.rebuild()
+
+    def request(self, **params):
+        request = AsyncRequestFactory().get('/', params)
+
+        async def auser():
+            return self.user
+
+        request.user, request.auser = self.user, auser
+        return request
+
+    async def test_listen_page(self):
+        view = AsyncProductListenView.as_view()
+        first = await view(self.request(), unique_slug=self.product.unique_slug)
+        second = await view(self.request(), unique_slug=self.product.unique_slug)
+        self.assertContains(first, 'Tomato soup')
+        self.assertEqual(first.content, second.content)
+        with self.assertRaises(Http404):
+            await view(self.request(), unique_slug='NoSuchSlugNoSuchSlug00')
+
+    async def test_folder_products_and_qr_status(self):
+        response = await afolder_products(self.request(), folder_id=self.folder.pk)
+        self.assertEqual([card['pk'] for card in json.loads(response.content)['products']], [self.product.pk])
+
+        response = await aqr_status(self.request(products=str(self.product.pk)))
+        self.assertEqual(json.loads(response.content), {'status': 'ok', 'images': {}, 'failed': []})
+
+
+@override_settings(SCAN_FLUSH_INTERVAL=3600, SLUG_INDEX_CATCHUP_INTERVAL=3600)
+class SlugIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='p')
+        self.product = Product.objects.create(owner=self.user, name='Soup', text_description='Tomato soup')
+        slug_index.rebuild()
+
+    def test_unknown_slug_404s_without_a_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/listen/NoSuchSlugNoSuchSlug00/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_products_created_elsewhere_are_caught_up(self):
+        # bulk_create sends no signals, like a save in another worker
+        other, = Product.objects.bulk_create([
+            Product(
+                owner=self.user, name='Milk', text_description='Milk',
+                unique_slug='fromanotherworker', short_code='OTHER1',
+            )
+        ])
+        self.assertTrue(slug_index.is_missing(other.unique_slug))
+
+        with self.settings(SLUG_INDEX_CATCHUP_INTERVAL=0):
+            self.assertFalse(slug_index.is_missing(other.unique_slug))
+        self.assertEqual(self.client.get(f'/listen/{other.unique_slug}/').status_code, 200)
+
+    def test_markers_follow_edits_elsewhere(self):
+        self.assertEqual(slug_index.get(self.product.unique_slug), (self.product.pk, updated_marker(self.product)))
+
+        edited_at = self.product.updated_at + timedelta(seconds=1)
+        Product.objects.filter(pk=self.product.pk).update(updated_at=edited_at)
+        with self.assertNumQueries(0):
+            self.assertEqual(slug_index.get(self.product.unique_slug)[1], updated_marker(self.product))
+
+        with self.settings(SLUG_INDEX_CATCHUP_INTERVAL=0):
+            self.assertEqual(slug_index.get(self.product.short_code), (self.product.pk, edited_at.timestamp()))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.soup = Product.objects.create(
+            owner=self.user, name='Tomato soup', text_description='Ripe tomatoes, cream and <b>basil</b>.'
+        )
+        self.pasta = Product.objects.create(
+            owner=self.user, name='Pasta', text_description='Penne with tomato sauce.'
+        )
+        for product in (self.soup, self.pasta):
+            QRCode.objects.create(linked_product=product)
+
+    def search(self, query, page=1):
+        return self.client.get('/api/products/search/', {'q': query, 'page': page}).json()
+
+    def test_ranked_prefix_search_with_escaped_highlights(self):
+        data = self.search('tom')
+        self.assertEqual([product['pk'] for product in data['products']], [self.soup.pk, self.pasta.pk])
+        self.assertEqual(data['products'][0]['name_html'], '<mark>Tomato</mark> soup')
+
+        snippet = self.search('basil')['products'][0]['snippet_html']
+        self.assertIn('&lt;b&gt;<mark>basil</mark>&lt;/b&gt;', snippet)
+
+    def test_other_owners_products_are_not_found(self):
+        other = User.objects.create_user(username='other', password='p')
+        Product.objects.create(owner=other, name='Tomato juice', text_description='juice')
+        self.assertEqual(len(self.search('juice')['products']), 0)
+
+    def test_index_follows_updates_and_deletes(self):
+        Product.objects.filter(pk=self.pasta.pk).update(name='Penne arrabbiata', text_description='Spicy')
+        self.assertEqual([product['pk'] for product in self.search('arrab')['products']], [self.pasta.pk])
+        self.assertEqual([product['pk'] for product in self.search('tomato')['products']], [self.soup.pk])
+
+        self.soup.delete()
+        self.assertEqual(self.search('tomato')['products'], [])
+
+    def test_pagination(self):
+        self.assertEqual(search.search_products(self.user, 'tomato', page=1, page_size=1), ([self.soup], True))
+        self.assertEqual(search.search_products(self.user, 'tomato', page=2, page_size=1), ([self.pasta], False))
+
+    def test_admin_search_uses_index(self):
+        User.objects.create_superuser(username='admin', password='p')
+        self.client.login(username='admin', password='p')
+        response = self.client.get('/admin/products/product/', {'q': 'penne'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.pasta])
+
+
+@override_settings(STORAGES=TEST_STORAGES, QR_RENDER_QUEUE=False)
+class ApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.products = [Product.objects.create(owner=self.user, name=f'Product {i}') for i in range(5)]
+        for product in self.products:
+            QRCode.objects.create(linked_product=product)
+
+    def test_keyset_pages_cover_every_product_once(self):
+        seen, url = [], '/api/v1/products/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            seen += [product['id'] for product in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [product.pk for product in self.products])
+
+    def test_sparse_fields_skip_qr_join(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/v1/products/', {'fields': 'id,name'}).json()
+        self.assertEqual(data['results'][0], {'id': self.products[0].pk, 'name': 'Product 0'})
+        self.assertFalse(any('products_qrcode' in query['sql'] for query in queries))
+
+        product = self.client.get(f'/api/v1/products/{self.products[0].pk}/').json()
+        self.assertTrue(product['qr_code']['image_url'].startswith('http://testserver/'))
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get('/api/v1/products/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Product.objects.filter(pk=self.products[0].pk).update(updated_at=timezone.now())
+        self.assertEqual(self.client.get('/api/v1/products/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_since_lists_changed_rows_only(self):
+        since = timezone.now()
+        Product.objects.filter(pk=self.products[3].pk).update(updated_at=since + timedelta(seconds=1))
+        data = self.client.get('/api/v1/products/', {'since': since.isoformat()}).json()
+        self.assertEqual([product['id'] for product in data['results']], [self.products[3].pk])
+
+    def test_since_lists_products_of_deleted_folders(self):
+        folders = [Folder.objects.create(owner=self.user, name=f'Aisle {i}') for i in range(2)]
+        Product.objects.filter(pk=self.products[1].pk).update(folder=folders[0])
+        Product.objects.filter(pk=self.products[2].pk).update(folder=folders[1])
+        since = timezone.now()
+
+        folders[0].delete()
+        self.client.post(f'/folders/{folders[1].pk}/delete/')
+
+        data = self.client.get('/api/v1/products/', {'since': since.isoformat()}).json()
+        self.assertEqual([(product['id'], product['folder']) for product in data['results']],
+                         [(self.products[1].pk, None), (self.products[2].pk, None)])
+
+    def test_bad_cursor_since_and_page_size_are_client_errors(self):
+        cursor = base64.urlsafe_b64encode(json.dumps(['garbage', 1]).encode()).decode()
+        self.assertEqual(self.client.get('/api/v1/products/', {'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get('/api/v1/products/', {'since': '2024-13-45T00:00:00'}).status_code, 400)
+
+        for page_size in ('0', '-3'):
+            data = self.client.get('/api/v1/products/', {'page_size': page_size}).json()
+            self.assertEqual([product['id'] for product in data['results']], [self.products[0].pk])
+            self.assertIsNotNone(data['next'])
+
+    def test_owner_isolation_and_create(self):
+        other = User.objects.create_user(username='other', password='p')
+        folder = Folder.objects.create(owner=other, name='Theirs')
+        self.assertEqual(self.client.get(f'/api/v1/folders/{folder.pk}/').status_code, 404)
+
+        data = {'name': 'New', 'text_description': 'Hi', 'folder': folder.pk}
+        response = self.client.post('/api/v1/products/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        data['folder'] = None
+        response = self.client.post('/api/v1/products/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(QRCode.objects.filter(linked_product_id=response.json()['id']).exists())
+
+
+@override_settings(SCAN_FLUSH_INTERVAL=3600, SLUG_INDEX_CATCHUP_INTERVAL=3600)
+class PublicRouteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='u', password='p')
+        self.product = Product.objects.create(owner=self.user, name='Soup', text_description='Tomato soup')
+        self.client.login(username='u', password='p')
+        slug_index.rebuild()
+
+    def test_listen_skips_session_for_signed_in_scanner(self):
+        url = f'/listen/{self.product.unique_slug}/'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_scan_page_renders_without_session(self):
+        response = self.client.get('/scan/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Logout')
+
+    def test_service_worker_precaches_scanner_without_session(self):
+        response = self.client.get('/sw.js')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertContains(response, '"/scan/"')
+        self.assertContains(response, '/static/js/jsQR.min.js')
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertContains(self.client.get('/scan/'), '/sw.js')
+
+    def test_scan_page_decodes_in_a_worker(self):
+        response = self.client.get('/scan/')
+        self.assertContains(response, '/static/products/js/qr_worker.js')
+        self.assertNotContains(response, '<script src="/static/js/jsQR.min.js">')
+
+    def test_scanner_benchmark_is_staff_only(self):
+        self.assertEqual(self.client.get('/scan/benchmark/').status_code, 302)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.assertContains(self.client.get('/scan/benchmark/'), 'data:image/png;base64,')
+
+    @override_settings(PUBLIC_ROUTES=set())
+    def test_routes_use_session_when_not_declared_public(self):
+        response = self.client.get('/scan/')
+        self.assertContains(response, 'Logout')
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES, QR_RENDER_QUEUE=False, METRICS_ENABLED=True, METRICS_DIR=tempfile.mkdtemp(prefix='metrics-test-')
+)
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics.view_stats._reset()
+        for path in Path(settings.METRICS_DIR).glob('*.json'):
+            path.unlink()
+        self.user = User.objects.create_user(username='u', password='p', is_staff=True)
+        self.client.login(username='u', password='p')
+
+    def test_server_timing_breaks_down_the_request(self):
+        response = self.client.get('/dashboard/')
+        timing = response['Server-Timing']
+        self.assertTrue(timing.startswith('total;dur='))
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="[0-9]+ queries"')
+        self.assertIn('template;dur=', timing)
+
+        response = self.client.post('/products/new/', {'name': 'Soup', 'text_description': 'Tomato'})
+        self.assertIn('qr;dur=', response['Server-Timing'])
+
+    def test_endpoint_sums_every_process(self):
+        cache.clear()
+        caching.fragment_stats.clear()
+        self.client.get('/dashboard/')
+        other = {
+            'views': {'dashboard': {'buckets': [0] * 11 + [1], 'count': 1, 'seconds': 12.0, 'queries': 3,
+                                    'db': 0.5, 'template': 0.1, 'qr': 0.0}},
+            'fragments': [['folders', 'hit', 4]],
+        }
+        Path(settings.METRICS_DIR, '1.json').write_text(json.dumps(other))
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('tsa_request_duration_seconds_count{view="dashboard"} 2', body)
+        self.assertIn('tsa_request_duration_seconds_bucket{view="dashboard",le="+Inf"} 2', body)
+        self.assertIn('tsa_qr_render_seconds_total{view="dashboard"} 0.0', body)
+        self.assertIn('tsa_dashboard_fragments_total{kind="folders",outcome="hit"} 4', body)
+        self.assertIn('tsa_dashboard_fragments_total{kind="folders",outcome="miss"} 1', body)
+
+    def test_exited_workers_stay_counted(self):
+        snapshot = json.dumps({
+            'views': {'dashboard': {'buckets': [1] + [0] * 11, 'count': 1, 'seconds': 0.001, 'queries': 3,
+                                    'db': 0.0, 'template': 0.0, 'qr': 0.0}},
+            'fragments': [['folders', 'hit', 4]],
+        })
+        Path(settings.METRICS_DIR, '4242-first.json').write_text(snapshot)
+        metrics.retire(4242)
+        self.assertFalse(Path(settings.METRICS_DIR, '4242-first.json').exists())
+
+        # A later worker that got the same pid
+        Path(settings.METRICS_DIR, '4242-second.json').write_text(snapshot)
+        metrics.retire(4242)
+
+        totals, fragments = metrics.collect()
+        self.assertEqual(totals['dashboard']['count'], 2)
+        self.assertEqual(fragments['folders', 'hit'], 8)
+
+    def test_endpoint_is_staff_only(self):
+        User.objects.create_user(username='other', password='p')
+        self.client.login(username='other', password='p')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+    def test_listen_pages_report_time_to_first_audio(self):
+        response = self.client.post('/api/listen_timing/', '{"first_audio_ms": 420}', content_type='text/plain')
+        self.assertEqual(response.status_code, 204)
+        response = self.client.post('/api/listen_timing/', '{"first_audio_ms": -1}', content_type='text/plain')
+        self.assertEqual(response.status_code, 400)
+
+        body = self.client.get('/metrics/').content.decode()
+        self.assertIn('tsa_client_seconds_bucket{timing="first_audio",le="0.5"} 1', body)
+        self.assertNotIn('view="client:first_audio"', body)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_middleware_is_not_loaded(self):
+        response = self.client.get('/dashboard/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get('/metrics/').status_code, 404)
+
+
+@override_settings(SCAN_FLUSH_INTERVAL=3600)
+class ScanAnalyticsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.folder = Folder.objects.create(owner=self.user, name='Dairy')
+        self.milk = Product.objects.create(owner=self.user, folder=self.folder, name='Milk', text_description='Milk')
+        self.eggs = Product.objects.create(owner=self.user, name='Eggs', text_description='Eggs')
+
+    def test_hits_are_buffered_then_written_in_one_flush(self):
+        buffer = ScanBuffer()
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                buffer.record(self.milk.pk)
+            buffer.record(self.eggs.pk)
+
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(ScanStats.objects.get(product=self.milk).scan_count, 3)
+        self.assertEqual(ScanStats.objects.get(product=self.eggs).scan_count, 1)
+
+    def test_flushes_from_separate_workers_add_up(self):
+        worker_a, worker_b = ScanBuffer(), ScanBuffer()
+        worker_a.record(self.milk.pk)
+        worker_b.record(self.milk.pk)
+        worker_b.record(self.milk.pk)
+        worker_a.flush()
+        worker_b.flush()
+        self.assertEqual(ScanStats.objects.get(product=self.milk).scan_count, 3)
+
+    @override_settings(SCAN_BUFFER_SIZE=2)
+    def test_size_threshold_triggers_flush_and_deleted_products_are_skipped(self):
+        buffer = ScanBuffer()
+        buffer.record(self.milk.pk)
+        self.eggs.delete()
+        buffer.record(self.eggs.pk)
+        self.assertEqual(ScanStats.objects.get().product, self.milk)
+
+    def test_stats_page_shows_folder_and_product_totals(self):
+        buffer = ScanBuffer()
+        buffer.record(self.milk.pk)
+        buffer.record(self.milk.pk)
+        buffer.flush()
+
+        self.client.login(username='u', password='p')
+        response = self.client.get('/dashboard/stats/')
+        self.assertEqual(response.context['folders'].get().scan_count, 2)
+        self.assertEqual(response.context['uncategorized']['scan_count'], None)
+        self.assertEqual([p.name for p in response.context['products']], ['Milk', 'Eggs'])
+
+
+class ProductBatchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='u', password='p')
+        self.client.login(username='u', password='p')
+        self.folder = Folder.objects.create(owner=self.user, name='Dairy')
+
+    def add_products(self, count):
+        return [
+            Product.objects.create(owner=self.user, name=f'Item {i}', text_description='desc')
+            for i in range(count)
+        ]
+
+    def post_batch(self, payload):
+        return self.client.post('/api/products/batch/', data=json.dumps(payload), content_type='application/json')
+
+    def moves_into_folder(self, products):
+        return [
+            {'product_id': product.pk, 'folder_id': self.folder.pk, 'position': position}
+            for position, product in enumerate(reversed(products))
+        ]
+
+    def count_batch_queries(self, products):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_batch({'moves': self.moves_into_folder(products)})
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_moves_and_reorders_in_fixed_number_of_queries(self):
+        few, many = self.add_products(2), self.add_products(30)
+        self.assertEqual(self.count_batch_queries(few), self.count_batch_queries(many))
+
+        ordered = list(Product.objects.filter(pk__in=[p.pk for p in many]).order_by('position'))
+        self.assertEqual(ordered, list(reversed(many)))
+        self.assertTrue(all(p.folder_id == self.folder.pk for p in ordered))
+
+    def test_relative_moves_renumber_the_whole_folder(self):
+        # Newest first, as the dashboard lists them; a client may only have
+        # the first page of these loaded
+        products = self.add_products(5)
+        Product.objects.update(folder=self.folder)
+        shown = list(reversed(products))
+
+        response = self.post_batch({'moves': [
+            {'product_id': shown[4].pk, 'folder_id': self.folder.pk, 'after': None},
+            {'product_id': shown[0].pk, 'folder_id': self.folder.pk, 'after': shown[2].pk},
+        ]})
+        self.assertEqual(response.status_code, 200)
+
+        ordered = Product.objects.filter(folder=self.folder).order_by('position', '-created_at', '-pk')
+        self.assertEqual(list(ordered), [shown[4], shown[1], shown[2], shown[0], shown[3]])
+        self.assertEqual([product.position for product in ordered], [0, 1, 2, 3, 4])
+
+        response = self.post_batch({'moves': [{'product_id': shown[1].pk, 'folder_id': None, 'after': shown[3].pk}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_skips_model_save(self):
+        product = self.add_products(1)[0]
+        Product.objects.filter(pk=product.pk).update(text_description='Line one\\nline two')
+        self.post_batch({'moves': self.moves_into_folder([product])})
+        self.assertEqual(Product.objects.get(pk=product.pk).text_description, 'Line one\\nline two')
+
+    def test_deletes_selected_products(self):
+        keep, drop, also_drop = self.add_products(3)
+        response = self.post_batch({'delete': [drop.pk, also_drop.pk]})
+        self.assertEqual(response.json()['deleted'], 2)
+        self.assertEqual(list(Product.objects.all()), [keep])
+
+    def test_rejects_whole_batch_if_any_product_is_not_owned(self):
+        mine = self.add_products(1)[0]
+        other = User.objects.create_user(username='other', password='p')
+        theirs = Product.objects.create(owner=other, name='Theirs', text_description='desc')
+
+        response = self.post_batch({'delete': [mine.pk, theirs.pk]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.count(), 2)
+
+
+@override_settings(STORAGES=TEST_STORAGES, QR_RENDER_QUEUE=False, QR_PUBLIC_BASE_URL='http://old.example')
+class RegenerateQRCodesTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='u', password='p')
+        self.qr_codes = [
+            QRCode.objects.create(
+                linked_product=Product.objects.create(owner=user, name=f'Item {i}', text_description='desc')
+            )
+            for i in range(3)
+        ]
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+    def regenerate(self, *args):
+        call_command(
+            'regenerate_qr_codes', '--workers=0', '--batch-size=1', f'--checkpoint={self.checkpoint}', *args,
+            stdout=StringIO(),
+        )
+
+    def test_public_url_comes_from_settings(self):
+        self.assertTrue(self.qr_codes[0].public_url.startswith('HTTP://OLD.EXAMPLE/L/'))
+
+    @override_settings(QR_PUBLIC_BASE_URL='', QR_PUBLIC_SCHEME='https')
+    def test_public_url_falls_back_to_current_site(self):
+        Site.objects.update_or_create(pk=settings.SITE_ID, defaults={'domain': 'labels.example'})
+        Site.objects.clear_cache()
+        self.assertTrue(QRCode.build_public_url(self.qr_codes[0].linked_product).startswith('HTTPS://LABELS.EXAMPLE/L/'))
+
+    @override_settings(QR_PUBLIC_BASE_URL='https://new.example')
+    def test_regenerates_changed_urls_and_images(self):
+        old_hashes = [qr_code.image_hash for qr_code in self.qr_codes]
+        self.regenerate()
+
+        for qr_code, old_hash in zip(self.qr_codes, old_hashes):
+            qr_code.refresh_from_db()
+            self.assertTrue(qr_code.public_url.startswith('HTTPS://NEW.EXAMPLE/L/'))
+            self.assertNotEqual(qr_code.image_hash, old_hash)
+            self.assertTrue(qr.image_exists(qr_code.image_hash))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    @override_settings(QR_PUBLIC_BASE_URL='https://new.example')
+    def test_resumes_after_checkpoint(self):
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({
+                'base_url': 'https://new.example', 'force': False,
+                'last_pk': self.qr_codes[0].pk, 'regenerated': 1, 'failed': 0,
+            }, checkpoint)
+
+        self.regenerate()
+
+        urls = [QRCode.objects.get(pk=qr_code.pk).public_url for qr_code in self.qr_codes]
+        self.assertTrue(urls[0].startswith('HTTP://OLD.EXAMPLE/'))
+        self.assertTrue(all(url.startswith('HTTPS://NEW.EXAMPLE/') for url in urls[1:]))
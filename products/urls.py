@@ -1,14 +1,41 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import include, path, re_path, register_converter
+from rest_framework.routers import DefaultRouter
+
+from .api import FolderViewSet, ProductViewSet, TemplateViewSet
+from .converters import ShortCodeConverter
 from .views import (
-    DashboardView, ProductCreateView, ProductListenView, home, scan_beacon, 
+    DashboardView, ProductCreateView, ProductListenView, home, scan_beacon, scanner_benchmark, scanner_service_worker,
     ProductDeleteView, FolderCreateView, ProductUpdateView, update_product_folder, 
-    FolderUpdateView, FolderDeleteView, TemplateCreateView, use_template
+    FolderUpdateView, FolderDeleteView, TemplateCreateView, use_template, template_merge, folder_products,
+    qr_image, qr_variant, qr_status, qr_export, product_import, ScanStatsView, product_batch, product_search,
+    listen_timing, AsyncProductListenView, ascan_beacon, afolder_products, aqr_status,
 )
 
+register_converter(ShortCodeConverter, 'short_code')
+
+# Async handlers under ASGI; under WSGI each would pay for a trip through the
+# async adapter
+if settings.ASYNC_VIEWS:
+    listen_view, scan_view, folder_products_view, qr_status_view = (
+        AsyncProductListenView, ascan_beacon, afolder_products, aqr_status
+    )
+else:
+    listen_view, scan_view, folder_products_view, qr_status_view = (
+        ProductListenView, scan_beacon, folder_products, qr_status
+    )
+
+router = DefaultRouter()
+router.register('products', ProductViewSet, basename='api-product')
+router.register('folders', FolderViewSet, basename='api-folder')
+router.register('templates', TemplateViewSet, basename='api-template')
+
 urlpatterns = [
     path('', home, name='home'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('dashboard/stats/', ScanStatsView.as_view(), name='scan_stats'),
     path('products/new/', ProductCreateView.as_view(), name='product_create'),
+    path('products/import/', product_import, name='product_import'),
     path('products/<int:pk>/edit/', ProductUpdateView.as_view(), name='product_edit'),
     path('products/<int:pk>/delete/', ProductDeleteView.as_view(), name='product_delete'),
     path('folders/new/', FolderCreateView.as_view(), name='folder_create'),
@@ -16,7 +43,37 @@ urlpatterns = [
     path('folders/<int:pk>/delete/', FolderDeleteView.as_view(), name='folder_delete'),
     path('templates/new/', TemplateCreateView.as_view(), name='template_create'),
     path('templates/<int:template_id>/use/', use_template, name='use_template'),
-    path('listen/<slug:unique_slug>/', ProductListenView.as_view(), name='product_listen'),
+    path('templates/<int:template_id>/merge/', template_merge, name='template_merge'),
+    path('listen/<slug:unique_slug>/', listen_view.as_view(), name='product_listen'),
+    # What QR codes encode: short, uppercase and without a trailing slash
+    path(
+        'L/<short_code:short_code>',
+        listen_view.as_view(slug_field='short_code', slug_url_kwarg='short_code'),
+        name='product_short_listen',
+    ),
+    path('api/folders/<int:folder_id>/products/', folder_products_view, name='folder_products'),
+    path('api/folders/uncategorized/products/', folder_products_view, name='uncategorized_products'),
+    path('api/qr_status/', qr_status_view, name='qr_status'),
+    path('api/listen_timing/', listen_timing, name='listen_timing'),
+    re_path(r'^folders/(?P<folder_id>[0-9]+)/qr-codes\.(?P<kind>zip|pdf|png)$', qr_export, name='folder_qr_export'),
+    re_path(
+        r'^folders/uncategorized/qr-codes\.(?P<kind>zip|pdf|png)$',
+        qr_export,
+        {'uncategorized': True},
+        name='uncategorized_qr_export',
+    ),
+    re_path(r'^products/qr-codes\.(?P<kind>zip|pdf|png)$', qr_export, name='selection_qr_export'),
+    path('api/v1/', include(router.urls)),
+    path('api/products/batch/', product_batch, name='product_batch'),
+    path('api/products/search/', product_search, name='product_search'),
     path('api/update_product_folder/', update_product_folder, name='update_product_folder'),
-    path('scan/', scan_beacon, name='scan_beacon'),
+    path('scan/', scan_view, name='scan_beacon'),
+    path('scan/benchmark/', scanner_benchmark, name='scanner_benchmark'),
+    path('sw.js', scanner_service_worker, name='scanner_service_worker'),
+    re_path(r'^qr/(?P<digest>[0-9a-f]{64})\.png$', qr_image, name='qr_image'),
+    re_path(
+        r'^qr/(?P<digest>[0-9a-f]{64})/(?P<preset>thumbnail|download|print)\.(?P<fmt>png|svg)$',
+        qr_variant,
+        name='qr_variant',
+    ),
 ]
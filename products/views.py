@@ -1,15 +1,61 @@
+import base64
 import codecs
+import hashlib
 import json
+import os
+from functools import partial
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
-from django.views.decorators.http import require_POST
-from django.views.generic import CreateView, DeleteView, DetailView, ListView, UpdateView
-
-from .models import Folder, Product, QRCode, Template
+from django.contrib.staticfiles import finders
+from django.core.paginator import Paginator
+from django.db.models import Count, F, Max, Sum
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from django.templatetags.static import static
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import patch_cache_control
+from django.utils.text import slugify
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.views.generic import CreateView, DeleteView, ListView, TemplateView, UpdateView, View
+
+from tsa_project import metrics
+
+from . import caching, exports, qr, search
+from .analytics import scan_buffer
+from .batch import apply_batch, parse_batch
+from .forms import ProductImportForm, TemplateMergeForm
+from .importers import ImportReport, detect_format, import_products, preview_products, read_rows
+from .merge import compile_template, merge_rows
+from .models import Folder, Product, QRCode, QRRenderJob, Template
+from .slug_index import slug_index
+
+
+DASHBOARD_PAGE_SIZE = 48
+
+
+def product_card_data(product):
+    try:
+        qr_code = product.qr_code
+    except QRCode.DoesNotExist:
+        # Products added outside the app, e.g. in the admin, may have no code yet
+        qr_code = None
+    return {
+        'pk': product.pk,
+        'name': product.name,
+        'text_description': product.text_description,
+        'image_url': qr_code.image_url if qr_code else '',
+        'thumbnail_url': qr_code.thumbnail_url if qr_code else '',
+        'filename': f"{slugify(product.name)}.png",
+        'edit_url': reverse('product_edit', kwargs={'pk': product.pk}),
+        'delete_url': reverse('product_delete', kwargs={'pk': product.pk}),
+    }
 
 
 # Page routes
@@ -22,27 +68,142 @@ def scan_beacon(request):
     return render(request, 'products/scan.html')
 
 
+async def ascan_beacon(request):
+    return await sync_to_async(render)(request, 'products/scan.html')
+
+
+@staff_member_required
+def scanner_benchmark(request):
+    # A code moving around a canvas stands in for the camera
+    image = qr.render(request.build_absolute_uri('/L/BENCHMRK'))
+    context = {'qr_data_uri': 'data:image/png;base64,' + base64.b64encode(image).decode()}
+    return render(request, 'products/scanner_benchmark.html', context)
+
+
+# Precached by the scanner's service worker along with the scan page
+SCANNER_ASSETS = [
+    'css/main.css', 'js/audio_unlock.js', 'products/css/scanner.css',
+    'js/jsQR.min.js', 'products/js/scanner.js', 'products/js/qr_worker.js',
+]
+OFFLINE_LISTEN_PAGES = 50
+
+
+@require_GET
+def scanner_service_worker(request):
+    # Served from the site root so its scope covers /scan/ and the listen
+    # pages. Any change to an asset, hashed file names or not, gives a new
+    # version, which replaces the old precache.
+    urls = [static(path) for path in SCANNER_ASSETS]
+    version = hashlib.sha1()
+    for path, url in zip(SCANNER_ASSETS, urls):
+        stat = os.stat(finders.find(path))
+        version.update(f'{url}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+
+    context = {
+        'version': version.hexdigest()[:16],
+        'precache': json.dumps([reverse('scan_beacon'), *urls]),
+        'listen_pages': OFFLINE_LISTEN_PAGES,
+    }
+    response = render(request, 'products/service_worker.js', context, content_type='text/javascript')
+    # Browsers check for a new worker on navigation; make sure they ask us
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 # Dashboard and product views
 
-class DashboardView(LoginRequiredMixin, ListView):
-    model = Product
+class DashboardView(LoginRequiredMixin, TemplateView):
+    # Only the uncategorized grid is rendered here; folder contents are
+    # fetched page by page from folder_products when a folder is expanded.
+    # Each part is cached until something it shows changes.
     template_name = 'products/dashboard.html'
-    context_object_name = 'products'
 
     def get_queryset(self):
-        return Product.objects.filter(owner=self.request.user).order_by('-created_at')
+        return (
+            Product.objects.filter(owner=self.request.user, folder__isnull=True)
+            .select_related('qr_code')
+            .defer('qr_code__image_data')
+            .order_by('position', '-created_at', '-pk')
+        )
+
+    def render_folders(self):
+        folders = (
+            Folder.objects.filter(owner=self.request.user)
+            .annotate(product_count=Count('products'))
+            .order_by('name')
+        )
+        return render_to_string('products/dashboard_folders.html', {'folders': folders}, self.request)
+
+    def render_grid(self, page_number):
+        page = Paginator(self.get_queryset(), DASHBOARD_PAGE_SIZE).get_page(page_number)
+        context = {'products': page.object_list, 'page_obj': page}
+        return render_to_string('products/dashboard_grid.html', context, self.request)
+
+    def render_templates(self):
+        templates = Template.objects.all().order_by('name')
+        return render_to_string('products/template_list.html', {'templates': templates})
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        try:
+            page_number = int(self.request.GET.get('page') or 1)
+        except ValueError:
+            raise Http404("Invalid page.")
+
+        user = self.request.user
+        versions = caching.dashboard_versions(user)
+        csrf_key = caching.csrf_key(self.request)
         context.update(
             {
-                'folders': Folder.objects.filter(owner=self.request.user).order_by('name'),
-                'templates': Template.objects.all().order_by('name'),
+                'folders_html': caching.dashboard_fragment(
+                    user.pk, caching.FOLDERS, versions, self.render_folders, csrf_key
+                ),
+                'grid_html': caching.dashboard_fragment(
+                    user.pk, caching.UNCATEGORIZED, versions, partial(self.render_grid, page_number),
+                    page_number, csrf_key,
+                ),
+                'template_list_html': caching.dashboard_fragment(
+                    None, caching.TEMPLATES, versions, self.render_templates
+                ),
             }
         )
         return context
 
 
+class ScanStatsView(LoginRequiredMixin, ListView):
+    model = Product
+    template_name = 'products/stats.html'
+    context_object_name = 'products'
+    paginate_by = 100
+
+    def get_queryset(self):
+        return (
+            Product.objects.filter(owner=self.request.user)
+            .select_related('folder', 'scan_stats')
+            .only('name', 'folder__name', 'scan_stats__scan_count', 'scan_stats__last_scanned_at')
+            .order_by(F('scan_stats__scan_count').desc(nulls_last=True), 'name')
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        folders = (
+            Folder.objects.filter(owner=self.request.user)
+            .annotate(
+                product_count=Count('products'),
+                scan_count=Sum('products__scan_stats__scan_count'),
+                last_scanned_at=Max('products__scan_stats__last_scanned_at'),
+            )
+            .order_by('name')
+        )
+        uncategorized = Product.objects.filter(owner=self.request.user, folder__isnull=True).aggregate(
+            product_count=Count('pk'),
+            scan_count=Sum('scan_stats__scan_count'),
+            last_scanned_at=Max('scan_stats__last_scanned_at'),
+        )
+        context.update({'folders': folders, 'uncategorized': uncategorized})
+        return context
+
+
 class ProductCreateView(LoginRequiredMixin, CreateView):
     model = Product
     fields = ['name', 'text_description']
@@ -60,27 +221,27 @@ class ProductCreateView(LoginRequiredMixin, CreateView):
         form.instance.owner = self.request.user
 
         response = super().form_valid(form)
-        qr_code = QRCode.objects.create(linked_product=self.object)
+        QRCode.objects.create(linked_product=self.object)
 
         if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            return JsonResponse(
-                {
-                    'status': 'ok',
-                    'product': {
-                        'pk': self.object.pk,
-                        'name': self.object.name,
-                        'text_description': self.object.text_description,
-                        'image_data': qr_code.image_data,
-                        'filename': qr_code.get_filename(),
-                        'edit_url': reverse_lazy('product_edit', kwargs={'pk': self.object.pk}),
-                        'delete_url': reverse_lazy('product_delete', kwargs={'pk': self.object.pk}),
-                    },
-                }
-            )
+            return JsonResponse({'status': 'ok', 'product': product_card_data(self.object)})
 
         return response
 
 
+@login_required
+@require_POST
+def product_import(request):
+    # Images are left to the QR worker so the upload returns quickly
+    form = ProductImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    upload = form.cleaned_data['file']
+    report = import_products(request.user, read_rows(upload, detect_format(upload.name)), render=False)
+    return JsonResponse({'status': 'ok', **report.as_dict()})
+
+
 class ProductUpdateView(LoginRequiredMixin, UpdateView):
     model = Product
     fields = ['name', 'text_description']
@@ -93,13 +254,273 @@ class ProductDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('dashboard')
 
 
-class ProductListenView(DetailView):
-    model = Product
+class ProductListenView(View):
     template_name = 'products/listen.html'
-    context_object_name = 'product'
     slug_field = 'unique_slug'
     slug_url_kwarg = 'unique_slug'
 
+    def get_context_data(self, product):
+        return {
+            'product': product,
+            'object': product,
+            # Pages report time to first audio only when something collects it
+            'timing_url': reverse('listen_timing') if settings.METRICS_ENABLED else '',
+        }
+
+    def render_page(self, request, product):
+        response = TemplateResponse(request, self.template_name, self.get_context_data(product))
+        response.render()
+        return response
+
+    def get(self, request, *args, **kwargs):
+        slug = kwargs[self.slug_url_kwarg]
+
+        # A public route: the middleware skips authentication, so everyone,
+        # owners included, gets the same anonymous page
+        if slug_index.is_missing(slug):
+            raise Http404('No product found matching the query')
+
+        entry = caching.get_listen_page(slug)
+        # The slug index follows edits made in other workers, so a page whose
+        # marker is out of date is rendered again without asking the database
+        if not caching.is_current(entry, slug_index.get(slug)):
+            product = get_object_or_404(Product, **{self.slug_field: slug})
+            response = self.render_page(request, product)
+            entry = caching.set_listen_page(slug, product, response)
+            slug_index.remember(product)
+
+        scan_buffer.record(entry['product_id'])
+        return caching.listen_page_response(request, entry)
+
+
+class AsyncProductListenView(ProductListenView):
+    # Served under ASGI, so thousands of slow scanners on mobile data wait
+    # on the event loop rather than each holding a worker thread
+    async def render_page(self, request, product):
+        response = TemplateResponse(request, self.template_name, self.get_context_data(product))
+        await sync_to_async(response.render)()
+        return response
+
+    async def get(self, request, *args, **kwargs):
+        slug = kwargs[self.slug_url_kwarg]
+        if await slug_index.ais_missing(slug):
+            raise Http404('No product found matching the query')
+
+        entry = await caching.aget_listen_page(slug)
+        if not caching.is_current(entry, await slug_index.aget(slug)):
+            product = await aget_object_or_404(Product, **{self.slug_field: slug})
+            response = await self.render_page(request, product)
+            entry = await caching.aset_listen_page(slug, product, response)
+            slug_index.remember(product)
+
+        await scan_buffer.arecord(entry['product_id'])
+        return caching.listen_page_response(request, entry)
+
+
+# Sent with sendBeacon from listen pages, which can't attach a CSRF token
+@csrf_exempt
+@require_POST
+def listen_timing(request):
+    try:
+        seconds = float(json.loads(request.body)['first_audio_ms']) / 1000
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'status': 'error', 'message': 'Expected first_audio_ms.'}, status=400)
+    if not 0 < seconds < 60:
+        return JsonResponse({'status': 'error', 'message': 'first_audio_ms is out of range.'}, status=400)
+
+    if settings.METRICS_ENABLED:
+        metrics.view_stats.record(metrics.CLIENT_PREFIX + 'first_audio', seconds, {})
+    return HttpResponse(status=204)
+
+
+def folder_page(products, page_number):
+    ordered = products.select_related('qr_code').defer('qr_code__image_data').order_by('position', '-created_at', '-pk')
+    page = Paginator(ordered, DASHBOARD_PAGE_SIZE).get_page(page_number)
+    return {
+        'status': 'ok',
+        'products': [product_card_data(product) for product in page],
+        'page': page.number,
+        'next_page': page.next_page_number() if page.has_next() else None,
+    }
+
+
+def page_number_param(request):
+    try:
+        return int(request.GET.get('page') or 1)
+    except ValueError:
+        return 1
+
+
+@login_required
+@require_GET
+def folder_products(request, folder_id=None):
+    products = Product.objects.filter(owner=request.user)
+    if folder_id is None:
+        products = products.filter(folder__isnull=True)
+    else:
+        folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
+        products = products.filter(folder=folder)
+
+    page_number = page_number_param(request)
+    versions = caching.dashboard_versions(request.user)
+    scope = caching.folder_scope(folder_id)
+    render_page = partial(folder_page, products, page_number)
+    return JsonResponse(caching.dashboard_fragment(request.user.pk, scope, versions, render_page, page_number))
+
+
+@login_required
+@require_GET
+async def afolder_products(request, folder_id=None):
+    user = await request.auser()
+    products = Product.objects.filter(owner=user)
+    if folder_id is None:
+        products = products.filter(folder__isnull=True)
+    else:
+        folder = await aget_object_or_404(Folder, pk=folder_id, owner=user)
+        products = products.filter(folder=folder)
+
+    page_number = page_number_param(request)
+    versions = await caching.adashboard_versions(user)
+    scope = caching.folder_scope(folder_id)
+    render_page = partial(folder_page, products, page_number)
+    return JsonResponse(await caching.adashboard_fragment(user.pk, scope, versions, render_page, page_number))
+
+
+@login_required
+@require_GET
+def product_search(request):
+    page = request.GET.get('page', '1')
+    page = max(int(page), 1) if page.isdigit() else 1
+    products, has_next = search.search_products(request.user, request.GET.get('q', ''), page)
+
+    return JsonResponse(
+        {
+            'status': 'ok',
+            'products': [
+                {
+                    **product_card_data(product),
+                    'folder_id': product.folder_id,
+                    'name_html': product.search_name,
+                    'snippet_html': product.search_snippet,
+                }
+                for product in products
+            ],
+            'page': page,
+            'next_page': page + 1 if has_next else None,
+        }
+    )
+
+
+# Stored images never change, so the digest doubles as a strong ETag
+@require_GET
+@condition(etag_func=lambda request, digest: digest)
+def qr_image(request, digest):
+    if not qr.image_exists(digest):
+        raise Http404('No such QR image.')
+
+    response = FileResponse(qr.open_image(digest), content_type='image/png')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def _url_for_digest(digest):
+    return (
+        QRCode.objects.filter(image_hash=digest).values_list('public_url', flat=True).first()
+    )
+
+
+@require_GET
+@condition(etag_func=lambda request, digest, preset, fmt: f'{digest}-{preset}-{fmt}')
+def qr_variant(request, digest, preset, fmt):
+    image = qr.get_variant(digest, preset, fmt, _url_for_digest)
+    if image is None:
+        raise Http404('No such QR image.')
+
+    response = FileResponse(image, content_type=qr.FORMATS[fmt])
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+@require_GET
+def qr_export(request, kind, folder_id=None, uncategorized=False):
+    # A folder, the uncategorized products, or a ?products= selection
+    products = Product.objects.filter(owner=request.user)
+    if folder_id is not None:
+        folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
+        products = products.filter(folder=folder)
+        filename = slugify(folder.name) or 'qr-codes'
+    elif uncategorized:
+        products = products.filter(folder__isnull=True)
+        filename = 'uncategorized'
+    else:
+        product_ids = [pk for pk in request.GET.get('products', '').split(',') if pk.isdigit()]
+        products = products.filter(pk__in=product_ids)
+        filename = 'qr-codes'
+
+    preset = request.GET.get('size', 'download')
+    fmt = request.GET.get('format', 'png')
+    if preset not in qr.PRESETS or fmt not in qr.FORMATS:
+        raise Http404('Unknown size or format.')
+
+    rows = exports.export_rows(products)
+    if kind == 'png':
+        # One sheet page per request
+        page = request.GET.get('page', '1')
+        page = max(int(page), 1) if page.isdigit() else 1
+        rows = rows[(page - 1) * exports.SHEET_PAGE_SIZE:page * exports.SHEET_PAGE_SIZE]
+        filename = f'{filename}-page-{page}'
+    if not rows:
+        raise Http404('No QR codes to export.')
+
+    name = exports.export_name(rows, kind, preset, fmt)
+    stored = exports.open_export(name)
+    if stored is not None:
+        response = FileResponse(stored, content_type=exports.CONTENT_TYPES[kind])
+    else:
+        chunks = exports.build_export(rows, kind, preset, fmt)
+        response = StreamingHttpResponse(
+            exports.stream_export(name, chunks), content_type=exports.CONTENT_TYPES[kind]
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{kind}"'
+    return response
+
+
+def qr_status_querysets(request, user):
+    product_ids = [pk for pk in request.GET.get('products', '').split(',') if pk.isdigit()]
+    codes = QRCode.objects.filter(linked_product__in=product_ids, linked_product__owner=user)
+    ready = codes.exclude(image_hash='').defer('image_data')
+    # Jobs that gave up; the dashboard stops waiting for these
+    failed = codes.filter(image_hash='', render_job__status=QRRenderJob.FAILED).values_list('linked_product_id', flat=True)
+    return ready, failed
+
+
+def qr_status_data(ready, failed):
+    return {
+        'status': 'ok',
+        'images': {
+            qr_code.linked_product_id: {
+                'image_url': qr_code.image_url,
+                'thumbnail_url': qr_code.thumbnail_url,
+            }
+            for qr_code in ready
+        },
+        'failed': list(failed),
+    }
+
+
+@login_required
+@require_GET
+def qr_status(request):
+    return JsonResponse(qr_status_data(*qr_status_querysets(request, request.user)))
+
+
+@login_required
+@require_GET
+async def aqr_status(request):
+    ready, failed = qr_status_querysets(request, await request.auser())
+    return JsonResponse(qr_status_data([qr_code async for qr_code in ready], [pk async for pk in failed]))
+
 
 # Folder views
 
@@ -121,6 +542,9 @@ class FolderCreateView(LoginRequiredMixin, CreateView):
                         'name': self.object.name,
                         'edit_url': reverse_lazy('folder_edit', kwargs={'pk': self.object.pk}),
                         'delete_url': reverse_lazy('folder_delete', kwargs={'pk': self.object.pk}),
+                        'sheet_url': reverse('folder_qr_export', kwargs={'folder_id': self.object.pk, 'kind': 'pdf'}),
+                        'zip_url': reverse('folder_qr_export', kwargs={'folder_id': self.object.pk, 'kind': 'zip'}),
+                        'products_url': reverse('folder_products', kwargs={'folder_id': self.object.pk}),
                     },
                 }
             )
@@ -137,12 +561,9 @@ class FolderUpdateView(LoginRequiredMixin, UpdateView):
 
 class FolderDeleteView(LoginRequiredMixin, DeleteView):
     model = Folder
+    # Its products are uncategorized by the pre_delete signal
     success_url = reverse_lazy('dashboard')
 
-    def form_valid(self, form):
-        Product.objects.filter(folder=self.object).update(folder=None)
-        return super().form_valid(form)
-
 
 # Template views
 
@@ -170,26 +591,50 @@ class TemplateCreateView(LoginRequiredMixin, CreateView):
 
 def use_template(request, template_id):
     template = get_object_or_404(Template, pk=template_id)
-    return render(request, 'products/use_template.html', {'template': template})
+    fields = compile_template(template.content).fields
+    return render(request, 'products/use_template.html', {'template': template, 'fields': fields})
+
+
+@login_required
+@require_POST
+def template_merge(request, template_id):
+    # Images are left to the QR worker, as with a plain import
+    template = get_object_or_404(Template, pk=template_id)
+    form = TemplateMergeForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+
+    upload = form.cleaned_data['file']
+    report = ImportReport()
+    rows = merge_rows(template, read_rows(upload, detect_format(upload.name)), report)
+
+    if form.cleaned_data['dry_run']:
+        return JsonResponse({'status': 'ok', 'dry_run': True, **preview_products(rows, report=report)})
+
+    report = import_products(request.user, rows, render=False, report=report)
+    return JsonResponse({'status': 'ok', 'dry_run': False, **report.as_dict()})
 
 
-# Update folder when card is moved
+# Move, reorder and delete cards
 
 @login_required
 @require_POST
-def update_product_folder(request):
+def product_batch(request):
     try:
-        data = json.loads(request.body)
-        product_id = data.get('product_id')
-        folder_id = data.get('folder_id')
-
-        product = Product.objects.get(id=product_id, owner=request.user)
+        moves, delete_ids = parse_batch(json.loads(request.body))
+        apply_batch(request.user, moves, delete_ids)
+        return JsonResponse({'status': 'ok', 'moved': len(moves), 'deleted': len(delete_ids)})
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
-        product.folder = None
-        if folder_id:
-            product.folder = Folder.objects.get(id=folder_id, owner=request.user)
 
-        product.save()
+@login_required
+@require_POST
+def update_product_folder(request):
+    try:
+        data = json.loads(request.body)
+        moves, _ = parse_batch({'moves': [{'product_id': data.get('product_id'), 'folder_id': data.get('folder_id')}]})
+        apply_batch(request.user, moves, set())
         return JsonResponse({'status': 'ok'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
@@ -0,0 +1,96 @@
+// Keeps the scanner usable on a poor or missing connection. The scan page
+// and its scripts are precached, so the scanner starts from the cache, and
+// listen pages are kept as they are heard, so a label scanned again offline
+// still plays.
+
+const VERSION = '{{ version }}';
+const SCANNER_CACHE = `scanner-${VERSION}`;
+const LISTEN_CACHE = 'listen-pages';
+// The scan page first, then its assets
+const PRECACHE = {{ precache|safe }};
+const SCAN_URL = PRECACHE[0];
+const LISTEN_PAGES = {{ listen_pages }};
+// Fall back to a cached listen page if the network takes longer than this
+const NETWORK_TIMEOUT = 3000;
+const LISTEN_PATH = /^\/(listen\/[^/]+\/|L\/[^/]+)$/;
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(SCANNER_CACHE)
+            .then(cache => cache.addAll(PRECACHE.map(url => new Request(url, { cache: 'reload' }))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('scanner-') && name !== SCANNER_CACHE)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (url.pathname === SCAN_URL) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    } else if (PRECACHE.includes(url.pathname)) {
+        event.respondWith(cacheFirst(request));
+    } else if (LISTEN_PATH.test(url.pathname)) {
+        event.respondWith(networkFirst(event, request));
+    }
+});
+
+// The scan page: answer from the cache and refresh it for next time
+async function staleWhileRevalidate(event, request) {
+    const cache = await caches.open(SCANNER_CACHE);
+    const cached = await cache.match(SCAN_URL);
+    const network = fetch(request).then(async response => {
+        if (response.ok) await cache.put(SCAN_URL, response.clone());
+        return response;
+    });
+    if (!cached) return network;
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+}
+
+// Scanner assets, which only change along with VERSION
+async function cacheFirst(request) {
+    const cached = await caches.match(request, { cacheName: SCANNER_CACHE });
+    return cached || fetch(request);
+}
+
+// Listen pages: the latest text when the network answers in time, the
+// last one heard otherwise
+async function networkFirst(event, request) {
+    const cache = await caches.open(LISTEN_CACHE);
+    const network = fetch(request).then(async response => {
+        if (response.ok) {
+            // Re-adding keeps the cache in least recently heard order
+            await cache.delete(request);
+            await cache.put(request, response.clone());
+            await trim(cache);
+        } else if (response.status === 404) {
+            await cache.delete(request);
+        }
+        return response;
+    });
+    event.waitUntil(network.catch(() => {}));
+
+    const cached = await cache.match(request);
+    if (!cached) return network;
+    const timeout = new Promise(resolve => setTimeout(() => resolve(cached), NETWORK_TIMEOUT));
+    return Promise.race([network.catch(() => cached), timeout]);
+}
+
+async function trim(cache) {
+    const keys = await cache.keys();
+    await Promise.all(keys.slice(0, Math.max(keys.length - LISTEN_PAGES, 0)).map(key => cache.delete(key)));
+}
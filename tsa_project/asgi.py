@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tsa_project.settings')
+# Serve the hot public views with their async handlers
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+from products.analytics import enable_background_flush  # noqa: E402
+from products.slug_index import slug_index  # noqa: E402
+
+enable_background_flush()
+slug_index.warm()
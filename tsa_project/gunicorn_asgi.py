@@ -0,0 +1,18 @@
+"""Gunicorn settings for serving tsa_project.asgi with uvicorn workers.
+
+    gunicorn -c python:tsa_project.gunicorn_asgi tsa_project.asgi:application
+
+Each worker runs one event loop, so a slow client on a phone connection
+holds a socket rather than a worker. Views that are still sync run in the
+worker's thread pool. Everything else, preloading and warm-up included, is
+shared with tsa_project.gunicorn_wsgi.
+"""
+from tsa_project.gunicorn_wsgi import *  # noqa: F401,F403
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+
+def post_worker_init(worker):
+    # Queries run on Django's sync thread under ASGI, not on the thread that
+    # calls this, so connections opened here would go unused
+    pass
@@ -0,0 +1,55 @@
+"""Gunicorn settings for serving tsa_project.wsgi.
+
+    gunicorn -c python:tsa_project.gunicorn_wsgi tsa_project.wsgi
+
+The app is loaded and warmed up once in the master, before any worker is
+forked, so workers start with URL patterns, compiled templates and the slug
+index in memory shared copy-on-write, and new workers are ready at once
+when old ones are recycled. Code changes need a full restart, not a HUP.
+"""
+import os
+
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+preload_app = True
+
+# Scanners often reuse the connection for the page's static files
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+# Recycle workers now and then, staggered so they don't all restart at once
+max_requests = 10000
+max_requests_jitter = 1000
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before the first fork
+    from tsa_project import warmup
+
+    warmup.prime()
+
+
+def post_worker_init(worker):
+    from tsa_project import warmup
+
+    warmup.connect()
+
+
+def worker_exit(server, worker):
+    # Runs in the worker as it stops, so its last requests are counted
+    from django.conf import settings
+
+    from tsa_project import metrics
+
+    if settings.METRICS_ENABLED:
+        metrics.view_stats.flush()
+
+
+def child_exit(server, worker):
+    # Runs in the master once the worker is gone
+    from django.conf import settings
+
+    from tsa_project import metrics
+
+    if settings.METRICS_ENABLED:
+        metrics.retire(worker.pid)
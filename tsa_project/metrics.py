@@ -0,0 +1,287 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse
+
+# Per-view request timings and dashboard fragment cache hits. Each process
+# adds up its own counters and writes them to a snapshot file in METRICS_DIR
+# every METRICS_FLUSH_INTERVAL seconds; the metrics endpoint sums every
+# process's snapshot. When a worker exits, gunicorn's master folds its
+# snapshot into RETIRED, so counters only grow and Prometheus can turn them
+# into rates over any window.
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CLIENT_PREFIX = 'client:'
+
+# Summed snapshots of workers that have exited
+RETIRED = 'retired.json'
+
+# Time spent in each phase, in seconds, for the request being handled
+request_phases = ContextVar('request_phases', default=None)
+
+_installed = False
+
+
+def add_time(phase, seconds):
+    phases = request_phases.get()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def _timed(phase, func):
+    def wrapper(*args, **kwargs):
+        if request_phases.get() is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            add_time(phase, time.perf_counter() - start)
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def install():
+    """Time template and QR rendering. Only called when metrics are on."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.template.backends.django import Template
+
+    from products import qr
+
+    # Only top-level renders: includes go through the engine's own
+    # Template, so nothing is counted twice
+    Template.render = _timed('template', Template.render)
+    # Every render, inline in QRCode.save or for a variant, goes through here
+    qr.render = _timed('qr', qr.render)
+
+
+class ViewStats:
+    """This process's counters, by view name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Unique per process, so a recycled pid can't overwrite a snapshot
+        # that hasn't been folded into RETIRED yet
+        self._name = f'{self._pid}-{uuid.uuid4().hex}.json'
+        self._views = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, view, seconds, phases):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since the stats were created: drop the parent's.
+                self._reset()
+
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                    'count': 0,
+                    'seconds': 0.0,
+                    'queries': 0,
+                    'db': 0.0,
+                    'template': 0.0,
+                    'qr': 0.0,
+                }
+            stats['buckets'][bisect_left(BUCKETS, seconds)] += 1
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['queries'] += phases.get('queries', 0)
+            for phase in ('db', 'template', 'qr'):
+                stats[phase] += phases.get(phase, 0.0)
+
+            due = time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        from products.caching import fragment_stats
+
+        with self._lock:
+            snapshot = json.dumps({
+                'views': self._views,
+                'fragments': [[kind, outcome, count] for (kind, outcome), count in fragment_stats.items()],
+            })
+            self._last_flush = time.monotonic()
+
+        _write(Path(settings.METRICS_DIR), self._name, snapshot)
+
+
+view_stats = ViewStats()
+
+
+def _write(directory, name, content):
+    directory.mkdir(parents=True, exist_ok=True)
+    # Written aside and renamed, so readers never see half a file
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+        f.write(content)
+    os.replace(f.name, directory / name)
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(totals, fragments, snapshot):
+    for kind, outcome, count in snapshot.get('fragments', []):
+        fragments[kind, outcome] += count
+    for view, stats in snapshot.get('views', {}).items():
+        total = totals.get(view)
+        if total is None:
+            totals[view] = stats
+            continue
+        total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+        for key in ('count', 'seconds', 'queries', 'db', 'template', 'qr'):
+            total[key] += stats[key]
+
+
+def retire(pid):
+    """Fold the snapshots of an exited process into RETIRED.
+
+    Called by the gunicorn master, one worker at a time. RETIRED lists the
+    files it already counts, so a reader that still sees one before it is
+    removed skips it rather than counting it twice.
+    """
+    directory = Path(settings.METRICS_DIR)
+    exited = list(directory.glob(f'{pid}-*.json'))
+    if not exited:
+        return
+
+    retired = _read(directory / RETIRED) or {}
+    totals = retired.get('views', {})
+    fragments = Counter({(kind, outcome): count for kind, outcome, count in retired.get('fragments', [])})
+    folded = {name for name in retired.get('folded', []) if (directory / name).exists()}
+    for path in exited:
+        snapshot = _read(path)
+        if path.name not in folded and snapshot is not None:
+            _merge(totals, fragments, snapshot)
+        folded.add(path.name)
+
+    _write(directory, RETIRED, json.dumps({
+        'views': totals,
+        'fragments': [[kind, outcome, count] for (kind, outcome), count in fragments.items()],
+        'folded': sorted(folded),
+    }))
+    for path in exited:
+        path.unlink(missing_ok=True)
+
+
+def collect():
+    """Every process's counters: stats by view, and fragment lookups by (kind, outcome)."""
+    view_stats.flush()
+    directory = Path(settings.METRICS_DIR)
+    snapshots = {path.name: _read(path) for path in directory.glob('*.json') if path.name != RETIRED}
+    # Read last, so a snapshot folded in meanwhile is counted exactly once
+    retired = _read(directory / RETIRED) or {}
+
+    totals = {}
+    fragments = Counter()
+    _merge(totals, fragments, retired)
+    for name, snapshot in snapshots.items():
+        if snapshot is not None and name not in retired.get('folded', []):
+            _merge(totals, fragments, snapshot)
+    return totals, fragments
+
+
+def _label(view):
+    return view.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _histogram(lines, name, label_name, label, stats):
+    cumulative = 0
+    for bound, count in zip((*map(str, BUCKETS), '+Inf'), stats['buckets']):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{label_name}="{label}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{label_name}="{label}"}} {stats["seconds"]}')
+    lines.append(f'{name}_count{{{label_name}="{label}"}} {stats["count"]}')
+
+
+def prometheus_text(totals, fragments):
+    # Timings reported by browsers are recorded as "client:<timing>" views
+    client = {
+        view.removeprefix(CLIENT_PREFIX): stats for view, stats in totals.items() if view.startswith(CLIENT_PREFIX)
+    }
+    totals = {view: stats for view, stats in totals.items() if not view.startswith(CLIENT_PREFIX)}
+
+    lines = [
+        '# HELP tsa_request_duration_seconds Time from the first middleware to the response.',
+        '# TYPE tsa_request_duration_seconds histogram',
+    ]
+    for view, stats in sorted(totals.items()):
+        _histogram(lines, 'tsa_request_duration_seconds', 'view', _label(view), stats)
+
+    lines.append('# HELP tsa_client_seconds Timings measured in the browser, such as time to first audio.')
+    lines.append('# TYPE tsa_client_seconds histogram')
+    for timing, stats in sorted(client.items()):
+        _histogram(lines, 'tsa_client_seconds', 'timing', _label(timing), stats)
+
+    for name, key, description in (
+        ('tsa_db_queries_total', 'queries', 'Database queries run.'),
+        ('tsa_db_seconds_total', 'db', 'Time spent in database queries.'),
+        ('tsa_template_seconds_total', 'template', 'Time spent rendering templates.'),
+        ('tsa_qr_render_seconds_total', 'qr', 'Time spent rendering QR codes.'),
+    ):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for view, stats in sorted(totals.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {stats[key]}')
+
+    lines.append('# HELP tsa_dashboard_fragments_total Dashboard fragment cache lookups.')
+    lines.append('# TYPE tsa_dashboard_fragments_total counter')
+    for (kind, outcome), count in sorted(fragments.items()):
+        lines.append(f'tsa_dashboard_fragments_total{{kind="{_label(kind)}",outcome="{outcome}"}} {count}')
+
+    return '\n'.join(lines) + '\n'
+
+
+@staff_member_required
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404('Metrics are disabled.')
+    return HttpResponse(prometheus_text(*collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        phases = request_phases.get()
+        if phases is not None:
+            phases['db'] = phases.get('db', 0.0) + time.perf_counter() - start
+            phases['queries'] = phases.get('queries', 0) + 1
+
+
+def server_timing(seconds, phases):
+    entries = [f'total;dur={seconds * 1000:.1f}']
+    if phases.get('queries'):
+        entries.append(f'db;dur={phases["db"] * 1000:.1f};desc="{phases["queries"]} queries"')
+    for phase in ('template', 'qr'):
+        if phases.get(phase):
+            entries.append(f'{phase};dur={phases[phase] * 1000:.1f}')
+    return ', '.join(entries)
@@ -1,8 +1,147 @@
-class SecurityHeadersMiddleware:
+import time
+from contextlib import ExitStack
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.middleware.csrf import CsrfViewMiddleware as BaseCsrfViewMiddleware
+from django.urls import Resolver404, resolve
+
+from . import metrics
+
+
+class DualModeMiddleware:
+    """Middleware that runs in the server's own mode.
+
+    Under ASGI, Django would otherwise hand sync-only middleware to a thread
+    on every request. Subclasses implement process_request and
+    process_response, which must not block.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def process_request(self, request):
+        pass
+
+    def process_response(self, request, response):
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+
+class MetricsMiddleware:
+    """Time each request and add a Server-Timing header (settings.METRICS_ENABLED).
+
+    Left out of the stack entirely when metrics are off. Sync only: query
+    wrappers are per-thread, and under ASGI the queries run on Django's
+    sync thread rather than the one this would be called on.
+    """
+
     def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        metrics.install()
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
+        phases = {}
+        token = metrics.request_phases.set(phases)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.time_query))
+                response = self.get_response(request)
+        finally:
+            metrics.request_phases.reset(token)
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        metrics.view_stats.record(match.view_name if match else '<unmatched>', seconds, phases)
+        response['Server-Timing'] = metrics.server_timing(seconds, phases)
+        return response
+
+
+class SecurityHeadersMiddleware(DualModeMiddleware):
+    def process_response(self, request, response):
         response['Permissions-Policy'] = 'camera=("self")'
         return response
+
+
+# Public routes (settings.PUBLIC_ROUTES) are safe GETs that never need a
+# session, so the session, CSRF, auth and messages middleware below step
+# aside for them instead of loading and re-saving session state.
+
+@lru_cache(maxsize=4096)
+def is_public_path(path):
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return False
+    return match.url_name in settings.PUBLIC_ROUTES
+
+
+@receiver(setting_changed)
+def clear_public_path_cache(setting, **kwargs):
+    if setting in ('PUBLIC_ROUTES', 'ROOT_URLCONF'):
+        is_public_path.cache_clear()
+
+
+class PublicRouteMiddleware(DualModeMiddleware):
+    def process_request(self, request):
+        request.is_public_route = request.method in ('GET', 'HEAD') and is_public_path(request.path_info)
+
+
+class PublicRouteBypassMixin:
+    def skip_public_route(self, request):
+        pass
+
+    def __call__(self, request):
+        if getattr(request, 'is_public_route', False):
+            self.skip_public_route(request)
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(PublicRouteBypassMixin, BaseSessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(PublicRouteBypassMixin, BaseCsrfViewMiddleware):
+    pass
+
+
+async def anonymous_user():
+    return AnonymousUser()
+
+
+class AuthenticationMiddleware(PublicRouteBypassMixin, BaseAuthenticationMiddleware):
+    def skip_public_route(self, request):
+        request.user = AnonymousUser()
+        request.auser = anonymous_user
+
+
+class MessageMiddleware(PublicRouteBypassMixin, BaseMessageMiddleware):
+    pass
@@ -0,0 +1,44 @@
+"""Work done before a server takes traffic, so first requests don't pay for it.
+
+With gunicorn's preload_app, prime() runs once in the master and every
+forked worker starts with the result; connect() then runs in each worker.
+"""
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.template.loader import get_template
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+
+def prime():
+    """Build the URL resolver and compile the project's templates.
+
+    The slug index is already built when tsa_project.wsgi or .asgi is
+    imported. Database connections are closed afterwards, since forked
+    workers must not share them.
+    """
+    # The first reverse() compiles every pattern and builds the lookup tables
+    reverse('home')
+
+    # The cached loader keeps compiled templates for the life of the process
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for path in sorted(Path(directory).rglob('*.html')):
+            get_template(path.relative_to(directory).as_posix())
+
+    connections.close_all()
+
+
+def connect():
+    """Open this worker's database and cache connections."""
+    for connection in connections.all():
+        try:
+            connection.ensure_connection()
+        except DatabaseError:
+            logger.exception("Could not connect to the %r database during warm-up.", connection.alias)
+    for cache in caches.all():
+        cache.get('warmup')
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tsa_project.settings')
 
 application = get_wsgi_application()
+
+from products.analytics import enable_background_flush  # noqa: E402
+from products.slug_index import slug_index  # noqa: E402
+
+enable_background_flush()
+slug_index.warm()